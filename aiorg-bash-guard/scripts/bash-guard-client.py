@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Thin PreToolUse hook client for a running `bash-guard.py --daemon`.
+
+Forwards the hook input to the daemon over its Unix socket and prints the
+daemon's answer. If no daemon is reachable (or it refuses the request),
+evaluates in-process by running bash-guard.py, so the hook output is the
+same either way. Input over the guard's size limit is never read whole:
+it goes straight to the in-process guard, which reads it in chunks.
+
+Deliberately imports almost nothing: the point is to skip the interpreter
+work the full guard does on every call. This is also the plugin's hook
+entry point without a daemon: bash-guard.py is loaded with its bytecode
+cached in __pycache__, where `python3 bash-guard.py` would recompile the
+whole script on every call.
+
+https://github.com/aiorgdev/claude-plugins
+"""
+
+import os
+import sys
+
+GUARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bash-guard.py')
+
+# Give up on the daemon quickly -- in-process evaluation is always available
+TIMEOUT = 2.0
+# Same defaults as INPUT_LIMIT and INPUT_READ in bash-guard.py
+INPUT_LIMIT = 4 * 1024 * 1024
+INPUT_READ = 64 * 1024
+
+
+def input_limit():
+    """Same resolution as input_limit() in bash-guard.py."""
+    try:
+        return int(os.environ.get('BASH_GUARD_MAX_INPUT') or INPUT_LIMIT)
+    except ValueError:
+        return INPUT_LIMIT
+
+
+def read_head(stream, limit):
+    """Up to limit + 1 bytes of stream, read a piece at a time like read_input() does."""
+    parts = []
+    size = 0
+    while size <= limit:
+        wanted = min(INPUT_READ, limit + 1 - size)
+        part = stream.read(wanted)
+        parts.append(part)
+        size += len(part)
+        if len(part) < wanted:
+            break
+    return b''.join(parts) if len(parts) > 1 else parts[0]
+
+
+def replay_stdin(head, rest):
+    """Make sys.stdin yield head and then whatever is left in rest."""
+    import io
+
+    class Replayed(io.RawIOBase):
+        def __init__(self):
+            self.head = memoryview(head)
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            if not self.head:
+                return rest.readinto(buffer)
+            n = min(len(buffer), len(self.head))
+            buffer[:n] = self.head[:n]
+            self.head = self.head[n:]
+            return n
+
+    sys.stdin = io.TextIOWrapper(io.BufferedReader(Replayed()), encoding='utf-8')
+
+
+def default_socket_path():
+    """Same resolution as default_socket_path() in bash-guard.py."""
+    path = os.environ.get('BASH_GUARD_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'aiorg-bash-guard.sock')
+    tmp = os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(tmp, f'aiorg-bash-guard-{os.getuid()}', 'guard.sock')
+
+
+def is_private(path):
+    """Only trust a socket owned by us that nobody else can write to."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def ask_daemon(data):
+    """Return the daemon's output bytes, or None if it cannot answer."""
+    path = default_socket_path()
+    # A socket someone else could have bound would let them approve anything
+    if not is_private(path) or not is_private(os.path.dirname(path) or '.'):
+        return None
+
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(TIMEOUT)
+        sock.connect(path)
+        # The project rule files come from, resolved as bash-guard.py does in-process
+        project = os.environ.get('CLAUDE_PROJECT_DIR') or os.getcwd()
+        sock.sendall(b'PROJECT ' + os.fsencode(project) + b'\0' + data)
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    reply = b''.join(chunks)
+    if not reply.startswith(b'OK\n'):
+        return None
+    return reply[3:]
+
+
+def load_guard():
+    """Execute bash-guard.py (not as __main__) and return its namespace.
+
+    SourceFileLoader reads and writes the same __pycache__ bytecode an
+    import would, keyed on the script's mtime and size.
+    """
+    from importlib.machinery import SourceFileLoader
+
+    code = SourceFileLoader('bash_guard', GUARD).get_code('bash_guard')
+    namespace = {'__name__': 'bash_guard', '__file__': GUARD, '__builtins__': __builtins__}
+    exec(code, namespace)
+    return namespace
+
+
+def main():
+    limit = input_limit()
+    data = read_head(sys.stdin.buffer, limit)
+    out = None
+    # Oversized input is never sent whole: the in-process guard streams it
+    if len(data) <= limit and hasattr(os, 'getuid'):
+        try:
+            out = ask_daemon(data)
+        except OSError:
+            pass
+
+    if out is None:
+        # No daemon -- run the full guard in-process on the same input
+        replay_stdin(data, sys.stdin.buffer)
+        load_guard()['main']()
+        return
+
+    sys.stdout.buffer.write(out)
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
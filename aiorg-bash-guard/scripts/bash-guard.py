@@ -39,6 +39,34 @@ ZERO_ACCESS_PATHS = [
     r'firebase-adminsdk.*\.json',            # Firebase admin SDK
 ]
 
+# Protected locations (Damage Control tiers), checked against every path a
+# command names once it is spelled out: quotes removed, ~ and $HOME
+# expanded, . and .. resolved. A trailing / protects a directory and all
+# it holds, otherwise just that path; a location not starting with / or ~
+# matches at any depth. Deleting or moving a directory deletes the
+# protected locations inside it, so that is blocked too.
+
+# Zero-access: any reference is blocked
+ZERO_ACCESS_LOCATIONS = [
+    '.ssh/', '.aws/', '.gnupg/', '.docker/config.json', '.kube/config',
+    '.netrc', '.npmrc', '.pypirc', '.git-credentials',
+    '/etc/shadow', '/etc/gshadow', '/etc/passwd',
+]
+
+# Read-only: may be read, never written, moved or deleted
+READ_ONLY_LOCATIONS = [
+    '/etc/', '/bin/', '/sbin/', '/usr/bin/', '/usr/sbin/', '/usr/lib/', '/boot/', '/System/',
+    '~/.bashrc', '~/.bash_profile', '~/.zshrc', '~/.zprofile', '~/.profile',
+    '~/.claude/settings.json',               # where a manual install registers this hook
+]
+
+# No-delete: anything but deleting or moving it away
+NO_DELETE_LOCATIONS = [
+    '~',                                     # the home directory itself
+    '~/.claude',
+    '.git',                                  # a repository's history (files inside may go)
+]
+
 # Patterns that are ALWAYS denied
 DENY_PATTERNS = [
     # --- Filesystem destruction ---
@@ -128,18 +156,607 @@ ALLOW_PATTERNS = [
     r'^(systemctl|launchctl|service)\s+(status|list|show)\b',
     r'^(claude|gemini)\b',
     r'^(readlink|realpath|basename|dirname|stat|md5|sha\d+sum|shasum)\b',
-    r'rm\s+(-[rfv]+\s+)*(\S+/)*(node_modules|dist|build|lib|\.next|\.cache|\.turbo|coverage|\.parcel-cache|__pycache__|\.pytest_cache|\.mypy_cache|\.venv|venv|out|\.output|\.nuxt|\.svelte-kit|\.angular|target/debug|target/release)\b',
+    r'rm\s+(-[rfv]+\s+)*(\S+/)?(node_modules|dist|build|lib|\.next|\.cache|\.turbo|coverage|\.parcel-cache|__pycache__|\.pytest_cache|\.mypy_cache|\.venv|venv|out|\.output|\.nuxt|\.svelte-kit|\.angular|target/debug|target/release)\b',
     r'rm\s+(-[fv]+\s+)*[^-\s]',             # rm without -r (single file deletion)
 ]
 
 
+# --- Matcher engine ---
+
+# Leading single-character literal of a rule (not quantified)
+LEADING_LITERAL = re.compile(r'(\\[^\w\s]|[^\\\[\](){}.*+?^$|\s#])(?![?*+{])')
+
+# Non-ASCII characters that re.IGNORECASE also folds onto an ASCII letter
+CASE_FOLDS = {'i': '\u0130\u0131', 'k': '\u212a', 's': '\u017f'}
+
+
+def has_top_level_alternation(pattern):
+    """Check if a regex has a '|' outside any group or character class."""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if in_class:
+            if ch == ']':
+                in_class = False
+        elif ch == '[':
+            in_class = True
+            if pattern.startswith('^', i + 1):
+                i += 1
+            if pattern.startswith(']', i + 1):
+                i += 1
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def build_prefilter(patterns, flags=0):
+    """Compile patterns into one alternation that matches if any of them does.
+
+    See prefilter_source(). Returns None when the set cannot be combined
+    safely.
+    """
+    source = prefilter_source(patterns, flags)
+    if source is None:
+        return None
+    try:
+        return re.compile(source)
+    except re.error:
+        return None
+
+
+def prefilter_source(patterns, flags=0):
+    """Source of one alternation that matches if any of patterns does.
+
+    Rules are grouped by their leading literal character, which is hoisted
+    out of the case-insensitive scope. Every top-level branch then starts
+    with a plain literal, so the regex engine can skip ahead to candidate
+    positions instead of trying every rule at every offset. Named groups and
+    a global IGNORECASE both defeat that skip, so neither is used here.
+
+    Returns None when the set cannot be combined safely (the source may
+    still fail to compile; build_prefilter() checks).
+    """
+    if flags & ~re.IGNORECASE or any(re.search(r'\\[1-9]|\(\?P=', p) for p in patterns):
+        return None
+    scope = '(?i:' if flags & re.IGNORECASE else '(?:'
+
+    by_literal = {}
+    loose = []
+    for pattern in patterns:
+        m = LEADING_LITERAL.match(pattern)
+        if not m or has_top_level_alternation(pattern):
+            loose.append(pattern)
+            continue
+        ch = m.group(1)[-1]
+        rest = pattern[m.end():]
+        variants = {ch}
+        if flags & re.IGNORECASE and ch.isascii() and ch.isalpha():
+            variants.update(ch.lower() + ch.upper() + CASE_FOLDS.get(ch.lower(), ''))
+        for variant in variants:
+            by_literal.setdefault(variant, []).append(rest)
+
+    branches = [
+        re.escape(ch) + scope + '|'.join(f'(?:{rest})' for rest in rests) + ')'
+        for ch, rests in sorted(by_literal.items())
+    ]
+    branches += [f'{scope}{pattern})' for pattern in loose]
+    if not branches:
+        return None
+    return '|'.join(branches)
+
+
+def required_literals(pattern, flags=0):
+    """Lowercase strings one of which every match of pattern must contain.
+
+    Returns a sorted tuple, or None when no such literal can be derived.
+    Picks the longest literal run of the pattern's top-level sequence,
+    descending into groups, alternations (one literal per branch) and
+    repeats that must run at least once. Only ASCII literals are used, so
+    checking them against text.lower() of ASCII text is exact even under
+    IGNORECASE.
+    """
+    parser, c = sre_modules()
+    repeats = (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None))
+
+    def better(a, b):
+        # The longest shortest literal is the rarest; then the fewest alternatives
+        if a is None or b is None:
+            return a or b
+        return min((a, b), key=lambda lits: (-min(map(len, lits)), len(lits)))
+
+    def of_seq(seq):
+        best = None
+        run = []
+        for op, av in list(seq) + [(None, None)]:
+            if op is c.LITERAL and av < 128:
+                run.append(chr(av).lower())
+                continue
+            if run:
+                best = better(best, (''.join(run),))
+                run = []
+            if op is c.SUBPATTERN:
+                best = better(best, of_seq(av[-1]))
+            elif op is getattr(c, 'ATOMIC_GROUP', None):
+                best = better(best, of_seq(av))
+            elif op in repeats and av[0] >= 1:
+                best = better(best, of_seq(av[2]))
+            elif op is c.BRANCH:
+                branches = [of_seq(branch) for branch in av[1]]
+                if all(branches):
+                    best = better(best, tuple(sorted(set().union(*branches))))
+        return best
+
+    return of_seq(parser.parse(pattern, flags))
+
+
+class PatternSet:
+    """Ordered list of regexes with a literal scan in front.
+
+    first_match() answers the same question as looping re.search over the
+    list: which is the first pattern (in list order) that matches anywhere
+    in the text.
+
+    Each rule has literals one of which any match must contain
+    (required_literals()). For ASCII text -- nearly every command -- a
+    lowercased copy is searched for all of them with str's substring
+    search, and only rules whose literal turned up run their regex, so
+    benign text runs no regex at all. Text with other characters, which
+    IGNORECASE may fold onto ASCII letters, goes through one combined
+    prefilter regex instead.
+
+    Everything is built on first use: a hook call that never reaches a
+    matcher does not pay for it, and only rules that get to run are
+    compiled.
+    """
+
+    def __init__(self, patterns, flags=0):
+        self.patterns = list(patterns)
+        self.flags = flags
+        self.literals = None    # per rule: required_literals(), built on first use
+        self.prefilter = None   # combined regex for non-ASCII text; False if there is none
+        self.source = None      # its source, once built
+        self.compiled = [None] * len(self.patterns)
+
+    def state(self):
+        """Plain data from which from_state() rebuilds this set (for marshal)."""
+        self.compile(rules=False)
+        return self.patterns, int(self.flags), self.literals, self.source
+
+    @classmethod
+    def from_state(cls, state):
+        patterns, flags, literals, source = state
+        self = cls(patterns, flags)
+        self.index(literals)
+        self.source = source
+        return self
+
+    def index(self, literals=None):
+        """Set up the literal scan (from required_literals() unless given)."""
+        if literals is None:
+            literals = [required_literals(p, self.flags) for p in self.patterns]
+        self.literals = [tuple(lits) if lits else None for lits in literals]
+        needles = dict.fromkeys(n for lits in self.literals if lits for n in lits)
+        # Any-rule-could-match check: 'bash' is redundant next to 'sh'
+        self.needles = tuple(n for n in needles if not any(o != n and o in n for o in needles))
+        self.always = None in self.literals
+
+    def compile(self, rules=True):
+        """Build the literal scan and combined regex (and with rules, every rule's regex)."""
+        if self.literals is None:
+            self.index()
+        if self.prefilter is None:
+            if self.source is None:
+                self.source = prefilter_source(self.patterns, self.flags)
+            try:
+                self.prefilter = re.compile(self.source) if self.source is not None else False
+            except re.error:
+                self.prefilter = False
+        if rules:
+            for i in range(len(self.patterns)):
+                self.search(i, '')
+
+    def search(self, i, text):
+        """re.search with rule i, compiling it on first use."""
+        compiled = self.compiled[i]
+        if compiled is None:
+            compiled = self.compiled[i] = re.compile(self.patterns[i], self.flags)
+        return compiled.search(text)
+
+    def first_match(self, text):
+        """Return the first pattern in list order that matches text, or None."""
+        if text.isascii():
+            if self.literals is None:
+                self.index()
+            lowered = text.lower()
+            if not self.always and not any(map(lowered.__contains__, self.needles)):
+                return None
+            for i, literals in enumerate(self.literals):
+                if literals is None or any(map(lowered.__contains__, literals)):
+                    if self.search(i, text):
+                        return self.patterns[i]
+            return None
+
+        if self.prefilter is None:
+            self.compile(rules=False)
+        if self.prefilter and not self.prefilter.search(text):
+            return None
+        for i, pattern in enumerate(self.patterns):
+            if self.search(i, text):
+                return pattern
+        return None
+
+
+WORD_RUN = re.compile(r'\w+')
+
+
+def is_word_char(ch):
+    """Same notion of a word character as regex \\w / \\b."""
+    return ch.isalnum() or ch == '_'
+
+
+def split_anchored_alternation(pattern):
+    r"""Return the alternatives of a '^(a|b|c)\b' pattern, or None."""
+    if not (pattern.startswith('^(') and pattern.endswith(r')\b')):
+        return None
+    body = pattern[2:-3]
+    if body.startswith('?') or re.search(r'(?<!\\)[()\[\]]', body):
+        return None
+    return re.split(r'(?<!\\)\|', body)
+
+
+def expand_literal(alt):
+    """Expand a regex alternative into the exact strings it matches.
+
+    Handles plain characters, escaped punctuation (g\\+\\+) and optional
+    single characters (python3?). Returns None for anything else.
+    """
+    variants = ['']
+    i = 0
+    while i < len(alt):
+        ch = alt[i]
+        if ch == '\\':
+            ch = alt[i + 1:i + 2]
+            if not ch or is_word_char(ch):
+                return None  # \d, \w, \1, ...
+            i += 2
+        elif ch in '.^$*+?{}[]()|':
+            return None
+        else:
+            i += 1
+        if alt.startswith('?', i):
+            variants = [v + c for v in variants for c in ('', ch)]
+            i += 1
+        elif i < len(alt) and alt[i] in '*+{':
+            return None
+        else:
+            variants = [v + ch for v in variants]
+    return variants
+
+
+class AllowIndex:
+    r"""ALLOW_PATTERNS split into a command-name lookup plus leftover regexes.
+
+    Nearly every allow rule is '^(word|word|...)\b'. Those words go into a
+    set keyed by the leading word run of the command, so a segment costs one
+    hash lookup. Names with punctuation (docker-compose, g++) are kept per
+    leading word run and checked with startswith plus the same word-boundary
+    rule as \b. Everything else stays a regex.
+    """
+
+    def __init__(self, patterns):
+        self.words = set()
+        self.compound = {}
+        residual = []
+        for pattern in patterns:
+            alts = split_anchored_alternation(pattern)
+            if alts is None:
+                residual.append(pattern)
+                continue
+            leftover = []
+            for alt in alts:
+                literals = expand_literal(alt)
+                if not literals or not all(lit and is_word_char(lit[0]) for lit in literals):
+                    leftover.append(alt)
+                    continue
+                for lit in literals:
+                    if all(is_word_char(c) for c in lit):
+                        self.words.add(lit)
+                    else:
+                        self.compound.setdefault(WORD_RUN.match(lit).group(), []).append(lit)
+            if leftover:
+                residual.append(r'^(' + '|'.join(leftover) + r')\b')
+        self.residual = PatternSet(residual)
+
+    def state(self):
+        """Plain data from which from_state() rebuilds this index (for marshal)."""
+        return self.words, self.compound, self.residual.state()
+
+    @classmethod
+    def from_state(cls, state):
+        words, compound, residual = state
+        self = cls.__new__(cls)
+        self.words = set(words)
+        self.compound = dict(compound)
+        self.residual = PatternSet.from_state(residual)
+        return self
+
+    def matches(self, cmd):
+        """Check if cmd matches any of the indexed allow patterns."""
+        m = WORD_RUN.match(cmd)
+        if m:
+            word = m.group()
+            if word in self.words:
+                return True
+            for lit in self.compound.get(word, ()):
+                if cmd.startswith(lit):
+                    # \b after the literal: word-ness must flip (or text ends)
+                    end = len(lit)
+                    after = end < len(cmd) and is_word_char(cmd[end])
+                    if after != is_word_char(lit[-1]):
+                        return True
+        return self.residual.first_match(cmd) is not None
+
+
+# ZERO_ACCESS_MATCHER, DENY_MATCHER and ALLOW_INDEX are built by
+# apply_rules() (see Rule files), once rule files are merged in.
+
+
+# --- Rule lint ---
+
+# Characters used to compare what regex items can match
+LINT_PROBE = frozenset(map(chr, range(32, 127))) | {'\t', '\n'}
+LINT_SPACE = frozenset(' \t\n\r\f\v')
+
+
+def sre_modules():
+    """The regex parser and its constants (private modules, renamed in 3.11)."""
+    try:
+        from re import _parser as parser, _constants as constants
+    except ImportError:
+        import sre_parse as parser
+        import sre_constants as constants
+    return parser, constants
+
+
+def lint_pattern(pattern, flags=0):
+    """Backtracking hazards in one regex, as a sorted list of (severity, message).
+
+    'error' means exponential backtracking (a repeat nested in a repeat that
+    can hand the same text back and forth). 'warning' means polynomial: work
+    that grows with input length times the number of candidate starts. The
+    analysis is a conservative heuristic over the parsed regex.
+    """
+    parser, c = sre_modules()
+    try:
+        tree = parser.parse(pattern, flags)
+    except re.error as e:
+        return [('error', f'does not compile: {e}')]
+
+    def chars(item):
+        """Probe characters item can start with (all of them when unsure)."""
+        op, av = item
+        if op is c.LITERAL:
+            return frozenset({chr(av)}) & LINT_PROBE
+        if op is c.NOT_LITERAL:
+            return LINT_PROBE - {chr(av)}
+        if op is c.ANY:
+            return LINT_PROBE if flags & re.DOTALL else LINT_PROBE - {'\n'}
+        if op is c.IN:
+            return class_chars(av)
+        if op in (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None)):
+            return first_chars(av[2])
+        if op is c.SUBPATTERN:
+            return first_chars(av[-1])
+        if op is getattr(c, 'ATOMIC_GROUP', None):
+            return first_chars(av)
+        if op is c.BRANCH:
+            return frozenset().union(*(first_chars(seq) for seq in av[1]))
+        if op in (c.AT, c.ASSERT, c.ASSERT_NOT):
+            return frozenset()
+        return LINT_PROBE
+
+    def class_chars(items):
+        matched = set()
+        negate = False
+        for op, av in items:
+            if op is c.NEGATE:
+                negate = True
+            elif op is c.LITERAL:
+                matched.add(chr(av))
+            elif op is c.RANGE:
+                matched.update(ch for ch in LINT_PROBE if av[0] <= ord(ch) <= av[1])
+            elif op is c.CATEGORY:
+                name = str(av).lower()
+                if 'digit' in name:
+                    test = str.isdigit
+                elif 'space' in name:
+                    test = LINT_SPACE.__contains__
+                elif 'word' in name:
+                    test = is_word_char
+                else:
+                    test = bool
+                hit = {ch for ch in LINT_PROBE if test(ch)}
+                matched.update(LINT_PROBE - hit if '_not_' in name else hit)
+            else:
+                matched.update(LINT_PROBE)
+        return frozenset(LINT_PROBE - matched if negate else matched & LINT_PROBE)
+
+    def can_be_empty(item):
+        op, av = item
+        if op in (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None)):
+            return av[0] == 0 or all(map(can_be_empty, av[2]))
+        if op is c.SUBPATTERN:
+            return all(map(can_be_empty, av[-1]))
+        if op is c.BRANCH:
+            return any(all(map(can_be_empty, seq)) for seq in av[1])
+        return op in (c.AT, c.ASSERT, c.ASSERT_NOT)
+
+    def first_chars(seq):
+        result = frozenset()
+        for item in seq:
+            result |= chars(item)
+            if not can_be_empty(item):
+                break
+        return result
+
+    def body_chars(seq):
+        """Every probe character anything in seq can consume."""
+        result = frozenset()
+        for op, av in seq:
+            if op in (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None)):
+                result |= body_chars(av[2])
+            elif op is c.SUBPATTERN:
+                result |= body_chars(av[-1])
+            elif op is c.BRANCH:
+                for branch in av[1]:
+                    result |= body_chars(branch)
+            else:
+                result |= chars((op, av))
+        return result
+
+    def backtracking_repeat(item):
+        op, av = item
+        return op in (c.MAX_REPEAT, c.MIN_REPEAT) and av[1] == c.MAXREPEAT
+
+    def single_char(item):
+        return item[0] in (c.LITERAL, c.NOT_LITERAL, c.ANY, c.IN)
+
+    def tail_repeats(seq):
+        """Unbounded repeats that can also swallow everything after them in seq."""
+        found = []
+        for i, item in enumerate(seq):
+            op, av = item
+            if backtracking_repeat(item):
+                reach = body_chars(av[2])
+                if all(can_be_empty(later) or (single_char(later) and chars(later) <= reach)
+                       for later in seq[i + 1:]):
+                    found.append(item)
+            elif op is c.SUBPATTERN and all(map(can_be_empty, seq[i + 1:])):
+                found.extend(tail_repeats(av[-1]))
+            elif op is c.BRANCH and all(map(can_be_empty, seq[i + 1:])):
+                for branch in av[1]:
+                    found.extend(tail_repeats(branch))
+        return found
+
+    findings = set()
+
+    def walk(seq, top):
+        seq = list(seq)
+        leading = True
+        for i, item in enumerate(seq):
+            op, av = item
+            if op is c.AT and av in (c.AT_BEGINNING, c.AT_BEGINNING_STRING) and leading:
+                top = False  # anchored: no re-scan from every position
+            if backtracking_repeat(item):
+                body = av[2]
+                reach = body_chars(body)
+                # A repeat inside the body that can run on into the next iteration
+                for inner in tail_repeats(body):
+                    if body_chars(inner[1][2]) & first_chars(body):
+                        findings.add(('error', 'nested repeats can split the same text many ways '
+                                               '(exponential backtracking)'))
+                if top and leading:
+                    findings.add(('warning', 'leading repeat is re-scanned from every start '
+                                             'position (quadratic on long runs)'))
+                # What the repeat must give back to: later items it can also match
+                for later in seq[i + 1:]:
+                    if backtracking_repeat(later) and first_chars(later[1][2]) & reach:
+                        findings.add(('warning', 'successive repeats over overlapping characters '
+                                                 '(polynomial backtracking)'))
+                        break
+                    if not chars(later) <= reach or not chars(later):
+                        break
+                rest = [later for later in seq[i + 1:] if not can_be_empty(later)]
+                crosses_words = ' ' in reach and 'a' in reach
+                if crosses_words and rest and chars(rest[0]) & reach:
+                    findings.add(('warning', 'repeat spanning words backtracks into what follows '
+                                             '(quadratic in input length x candidate starts)'))
+            if op is c.SUBPATTERN:
+                walk(av[-1], top and leading)
+            elif op is c.BRANCH:
+                for branch in av[1]:
+                    walk(branch, top and leading)
+            elif op in (c.MAX_REPEAT, c.MIN_REPEAT):
+                walk(av[2], False)
+            if chars(item):
+                leading = False
+
+    walk(tree, True)
+    return sorted(findings)
+
+
+def lint_rules():
+    """Lint findings for every rule table, as (table, index, pattern, severity, message)."""
+    tables = [('ZERO_ACCESS_PATHS', ZERO_ACCESS_PATHS, re.IGNORECASE),
+              ('DENY_PATTERNS', DENY_PATTERNS, re.IGNORECASE),
+              ('ALLOW_PATTERNS', ALLOW_PATTERNS, 0)]
+    return [(table, i, pattern, severity, message)
+            for table, patterns, flags in tables
+            for i, pattern in enumerate(patterns)
+            for severity, message in lint_pattern(pattern, flags)]
+
+
+def report_lint(verbose=False):
+    """Print rule lint errors (and warnings, if verbose) to stderr. Returns the error count."""
+    errors = 0
+    for table, i, pattern, severity, message in lint_rules():
+        errors += severity == 'error'
+        if verbose or severity == 'error':
+            print(f"{table}[{i}] {pattern!r}: {severity}: {message}", file=sys.stderr)
+    return errors
+
+
 # --- Core functions ---
 
-def read_input():
-    """Read hook input JSON from stdin."""
+# Hook input larger than this is never decoded whole (BASH_GUARD_MAX_INPUT overrides)
+INPUT_LIMIT = 4 * 1024 * 1024
+# Bytes read at a time up to the limit: a read allocates its full size up front
+INPUT_READ = 64 * 1024
+
+
+def input_limit():
+    """Limit in bytes from $BASH_GUARD_MAX_INPUT, else INPUT_LIMIT."""
+    import os
     try:
-        return json.load(sys.stdin)
-    except (json.JSONDecodeError, EOFError):
+        return int(os.environ.get('BASH_GUARD_MAX_INPUT') or INPUT_LIMIT)
+    except ValueError:
+        return INPUT_LIMIT
+
+
+def read_input(stream=None, limit=None):
+    """Read hook input JSON from stdin (or stream, a binary file).
+
+    At most limit bytes (default: input_limit()) are read up front. Larger
+    input comes back as an OversizedInput, which reads the rest of the
+    command from the stream in chunks instead of decoding it whole.
+    """
+    stream = stream or sys.stdin.buffer
+    limit = limit or input_limit()
+    parts = []
+    size = 0
+    while size <= limit:
+        wanted = min(INPUT_READ, limit + 1 - size)
+        part = stream.read(wanted)
+        parts.append(part)
+        size += len(part)
+        if len(part) < wanted:
+            break
+    data = b''.join(parts) if len(parts) > 1 else parts[0]
+    if len(data) > limit:
+        return OversizedInput(data, stream, limit)
+    try:
+        return json.loads(data)
+    except ValueError:
         return {}
 
 
@@ -154,126 +771,949 @@ def extract_command(hook_input):
     return tool_input.get("command", "")
 
 
+# --- Lexer ---
+
+# Token kinds produced by lex()
+SEGMENT = 'segment'      # one simple command, stripped
+OPERATOR = 'operator'    # separator after a segment: &&, ||, ;, | or newline
+HEREDOC = 'heredoc'      # heredoc body, kept out of the command text
+INLINE = 'inline'        # code passed to an interpreter via -c/-e/-r
+TEXT = 'text'            # (spans only) command text outside heredoc bodies
+
+# Heredoc start at end of line: cmd << 'DELIM' or << DELIM or <<- "DELIM"
+HEREDOC_START = re.compile(r'<<-?\s*\\?[\'"]?(\w+)[\'"]?\s*$')
+UNQUOTED_SPECIAL = re.compile(r'[\\\'"&|;\n]')
+DOUBLE_QUOTED_SPECIAL = re.compile(r'[\\"]')
+# One part of a shell word: plain text, '...', "...", $'...', a backslash
+# escape, or a lone $ or ` (an unterminated quote runs to the end)
+SHELL_WORD_PART = re.compile(r"""([^\s\\'"$;&|<>()`]+)|'([^']*)'?|"([^"\\]*(?:\\.[^"\\]*)*)"?"""
+                             r"""|\$'([^'\\]*(?:\\.[^'\\]*)*)'?|\\(.?)|([$`])""", re.S)
+# Escapes a backslash keeps inside double quotes; anything else stays as typed
+DOUBLE_QUOTED_ESCAPE = re.compile(r'\\([$`"\\\n])')
+ANSI_C_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'e': '\x1b', 'E': '\x1b',
+                  'f': '\f', 'v': '\v', '\\': '\\', "'": "'", '"': '"', '?': '?'}
+# Interpreter payloads nested deeper than this are scanned as they are, not unwrapped
+INLINE_DEPTH = 8
+
+
+def build_inline_regex(interpreter_flags):
+    r"""One regex for every '\binterpreter [options] <code flag> ' in INTERPRETER_FLAGS.
+
+    Like build_prefilter(), branches are grouped under their first letter so
+    the scan can skip ahead; the leading \b becomes a lookbehind after it.
+    """
+    by_first = {}
+    for interp, flag in interpreter_flags.items():
+        head = re.escape(interp[0])
+        by_first.setdefault(head, []).append(
+            rf'(?<!\w{head}){re.escape(interp[1:])}[\d.]*\s+(?:-\S+\s+)*{re.escape(flag)}\s+')
+    return re.compile('|'.join(
+        head + '(?:' + '|'.join(branches) + ')' for head, branches in sorted(by_first.items())))
+
+
+INLINE_FLAG = build_inline_regex(INTERPRETER_FLAGS)
+
+
+def find_matching_quote(s, start, quote):
+    """Find matching closing quote, handling escapes."""
+    if quote != '"':
+        return s.find(quote, start)
+    while True:
+        m = DOUBLE_QUOTED_SPECIAL.search(s, start)
+        if not m:
+            return -1
+        if m.group() == '"':
+            return m.start()
+        start = m.start() + 2
+
+
+def unescape_ansi_c(body):
+    r"""The text of a $'...' string body: \n, \xHH, \NNN (octal) and the other C escapes resolved."""
+    def replace(m):
+        esc = m.group(1)
+        if esc[0] == 'x':
+            return chr(int(esc[1:], 16))
+        if esc[0] in '01234567':
+            return chr(int(esc, 8) & 0xFF)
+        return ANSI_C_ESCAPES.get(esc, '\\' + esc)
+    return re.sub(r'\\(x[0-9a-fA-F]{1,2}|[0-7]{1,3}|.)', replace, body, flags=re.S)
+
+
+def shell_word(text, start):
+    """Value of the shell word starting at text[start], and the index where it ends.
+
+    Quotes are removed and escapes resolved as bash would: '...' is literal,
+    "..." keeps a backslash only before $ ` " \\ and newline, $'...' takes C
+    escapes, and an unquoted backslash escapes the next character. The word
+    ends at unquoted whitespace or an operator character; an unterminated
+    quote runs to the end of text. Each quoted or plain run is one regex
+    match, so a long payload is never walked in Python.
+    """
+    out = []
+    pos = start
+    while True:
+        m = SHELL_WORD_PART.match(text, pos)
+        if not m:
+            return ''.join(out), pos
+        pos = m.end()
+        plain, single, double, ansi_c, escaped, sigil = m.groups()
+        if double:
+            if '\\' in double:
+                double = DOUBLE_QUOTED_ESCAPE.sub(lambda e: '' if e.group(1) == '\n' else e.group(1), double)
+            out.append(double)
+        elif ansi_c:
+            out.append(unescape_ansi_c(ansi_c))
+        elif escaped != '\n':      # backslash-newline joins lines
+            out.append(plain or single or escaped or sigil or '')
+
+
+def iter_inline_code(text, depth=INLINE_DEPTH):
+    """Yield the code of every interpreter -c/-e flag in text (e.g., python3 -c 'code').
+
+    Each payload is the shell word after the flag, with quotes and escapes
+    resolved, so `bash -c "sh -c \\"rm -rf /\\""` yields `sh -c "rm -rf /"`
+    and then `rm -rf /`. Payloads are themselves scanned for interpreter
+    calls, breadth first: all of text's payloads come first, in order, then
+    theirs, down to depth levels. The scan resumes after each payload, so
+    every level is one pass over its text.
+    """
+    pending = [(text, 1)]
+    for text, level in pending:
+        pos = 0
+        while True:
+            m = INLINE_FLAG.search(text, pos)
+            if not m:
+                break
+            code, pos = shell_word(text, m.end())
+            if code:
+                yield code
+                if level < depth:
+                    pending.append((code, level + 1))
+
+
+def extract_inline_code(command):
+    """Extract the first interpreter -c/-e payload in command, or None."""
+    return next(iter_inline_code(command), None)
+
+
+def iter_spans(command):
+    """Yield (TEXT, start, end) and (HEREDOC, start, end) spans of command.
+
+    TEXT spans are what is left after removing heredoc bodies; consecutive
+    TEXT spans are joined by a newline. A heredoc start line keeps only its
+    command part ('cat << EOF' -> 'cat'), or is dropped if nothing is left.
+    Only lines containing '<<' are inspected, and each body is skipped with
+    a single search for its closing delimiter line.
+    """
+    n = len(command)
+    span_start = pos = 0
+    while True:
+        idx = command.find('<<', pos)
+        if idx < 0:
+            break
+        line_start = command.rfind('\n', 0, idx) + 1
+        line_end = command.find('\n', idx)
+        if line_end < 0:
+            line_end = n
+        m = HEREDOC_START.search(command, line_start, line_end)
+        if not m:
+            pos = line_end
+            continue
+
+        # Keep the command part, strip the heredoc operator
+        cut = m.start()
+        while cut > line_start and command[cut - 1].isspace():
+            cut -= 1
+        if cut > line_start:
+            yield TEXT, span_start, cut
+        elif line_start > span_start:
+            yield TEXT, span_start, line_start - 1
+
+        body_start = min(line_end + 1, n)
+        close_start, close_end = find_closing_line(command, m.group(1), body_start)
+        if close_start < 0:
+            yield HEREDOC, body_start, n
+            return
+        yield HEREDOC, body_start, max(body_start, close_start - 1)
+        if close_end >= n:
+            return
+        span_start = pos = close_end + 1
+    yield TEXT, span_start, n
+
+
+def find_closing_line(command, delim, start):
+    """Find the first line at or after start whose stripped text is delim.
+
+    Returns (line_start, line_end), or (-1, -1). Only lines that contain the
+    delimiter are looked at.
+    """
+    j = command.find(delim, start)
+    while j >= 0:
+        line_start = command.rfind('\n', start, j) + 1 or start
+        line_end = command.find('\n', j)
+        if line_end < 0:
+            line_end = len(command)
+        if command[line_start:line_end].strip() == delim:
+            return line_start, line_end
+        j = command.find(delim, line_end)
+    return -1, -1
+
+
+def lex(command, heredocs=True):
+    """Tokenize a command in one linear pass.
+
+    Returns a list of (kind, text) tokens: SEGMENT for each simple command
+    (split on &&, ||, ;, |, newline -- respecting quotes and escapes),
+    OPERATOR for each separator, HEREDOC for each heredoc body and INLINE
+    for each interpreter payload in the command.
+
+    The scanner jumps between special characters with precompiled regexes
+    and slices segments straight out of the command, so long quoted strings
+    and heredoc bodies are never walked character by character.
+    """
+    return list(iter_tokens(command, heredocs))
+
+
+def iter_tokens(command, heredocs=True, inline=True, bodies=True):
+    """lex() as a generator: each token is yielded as soon as it is complete.
+
+    A consumer that stops early (see check_allow_patterns()) never pays for
+    scanning the rest of the command. INLINE tokens come last; pass
+    inline=False to skip them. bodies=False skips HEREDOC tokens, so a
+    consumer that ignores them never copies a heredoc body out of command.
+    """
+    parts = []          # text of the current segment from earlier spans
+    quote = None        # "'" or '"' while inside a quoted span
+    escaped = False     # the next character is escaped
+    first = True
+
+    def end_segment(text, op):
+        if parts:
+            parts.append(text)
+            text = ''.join(parts)
+            parts.clear()
+        seg = text.strip()
+        tokens = [(SEGMENT, seg)] if seg else []
+        if op:
+            tokens.append((OPERATOR, op))
+        return tokens
+
+    spans = iter_spans(command) if heredocs else ((TEXT, 0, len(command)),)
+    for kind, start, end in spans:
+        if kind == HEREDOC:
+            if bodies:
+                yield HEREDOC, command[start:end]
+            continue
+
+        if not first:
+            # Newline joining this span to the previous one
+            if escaped or quote:
+                parts.append('\n')
+                escaped = False
+            else:
+                yield from end_segment('', '\n')
+        first = False
+
+        seg_start = pos = start
+        while pos < end:
+            if escaped:
+                escaped = False
+                pos += 1
+                continue
+            if quote == "'":
+                j = command.find("'", pos, end)
+                if j < 0:
+                    break
+                quote = None
+                pos = j + 1
+                continue
+            if quote == '"':
+                m = DOUBLE_QUOTED_SPECIAL.search(command, pos, end)
+                if not m:
+                    break
+                pos = m.end()
+                if m.group() == '"':
+                    quote = None
+                else:
+                    escaped = True
+                continue
+
+            m = UNQUOTED_SPECIAL.search(command, pos, end)
+            if not m:
+                break
+            j = m.start()
+            ch = command[j]
+            pos = j + 1
+            if ch == '\\':
+                escaped = True
+            elif ch == "'" or ch == '"':
+                quote = ch
+            elif ch in '&|' and pos < end and command[pos] == ch:
+                yield from end_segment(command[seg_start:j], ch * 2)
+                seg_start = pos = j + 2
+            elif ch != '&':
+                yield from end_segment(command[seg_start:j], ch)
+                seg_start = pos
+
+        parts.append(command[seg_start:end])
+
+    yield from end_segment('', None)
+
+    # Payloads are taken from the raw text: the line-based heredoc rules above
+    # may cut through a quoted payload, and deny must still see all of it.
+    if inline:
+        for code in iter_inline_code(command):
+            yield INLINE, code
+
+
+def split_shell_commands(command):
+    """Split compound command on &&, ||, ;, |, newline -- respecting quotes."""
+    return [text for kind, text in lex(command, heredocs=False) if kind == SEGMENT]
+
+
+def collapse_heredocs(command):
+    """Remove heredoc bodies from command string before splitting.
+
+    Heredoc content is already scanned by deny patterns (Layer 1).
+    For allow patterns (Layer 2), we only need to check the command itself,
+    not the heredoc body. This prevents heredoc lines (e.g. 'import json')
+    from being treated as separate shell commands during splitting.
+    """
+    return '\n'.join(command[start:end] for kind, start, end in iter_spans(command)
+                     if kind == TEXT)
+
+
+# --- Shell AST (BASH_GUARD_PARSE=ast) ---
+
+# Node kinds produced by parse_shell()
+ROOT = 'root'                  # the command itself
+SUBSTITUTION = 'substitution'  # $(...) or `...`
+PROCESS = 'process'            # <(...) or >(...)
+SUBSHELL = 'subshell'          # ( ... )
+GROUP = 'group'                # { ...; }
+
+# Scanner states that hold text rather than commands
+DOUBLE_QUOTE = '"'
+PARAMETER = '${'
+HEREDOC_BODY = '<<'            # body of a heredoc whose delimiter is unquoted
+ARITHMETIC = '(('
+
+# Token patterns per scanner state, compiled by parse_shell() (AST mode is
+# opt-in, so importing the guard doesn't pay for them)
+PARSE_SPECIAL = {
+    None: r"\\.|\$'|\$\(\(|\$[({]|[<>]\(|[`'\"\n;&|(){}#]",
+    DOUBLE_QUOTE: r'\\.|\$\(\(|\$[({]|["`]',
+    HEREDOC_BODY: r'\\.|\$\(\(|\$[({]|`',
+    PARAMETER: r"\\.|\$\(\(|\$[({]|[`'\"{}]",
+    ARITHMETIC: r"\\.|\$\(\(|\$[({]|[`'\"()]",
+}
+ANSI_C_QUOTED = r"\$'(?:[^'\\]|\\.)*'"
+# Characters after which '#' starts a comment
+WORD_BREAK = frozenset(' \t\n;&|()<>')
+
+
+def heredoc_expands(command, body_start):
+    """Whether the heredoc whose body starts at body_start has an unquoted delimiter.
+
+    bash expands $(...), `...` and ${...} in such a body; 'EOF', "EOF" and
+    \\EOF keep it literal.
+    """
+    header_end = body_start - 1 if command[body_start - 1:body_start] == '\n' else body_start
+    line_start = command.rfind('\n', 0, header_end) + 1
+    m = HEREDOC_START.search(command, line_start, header_end)
+    return m is not None and not any(c in m.group() for c in '\'"\\')
+
+
+class ShellFrame:
+    """A construct parse_shell() is inside of: a command list, or a text state."""
+
+    __slots__ = ('kind', 'closer', 'owner', 'parts', 'segments', 'children', 'start', 'depth')
+
+    def __init__(self, kind, closer=None, owner=None):
+        self.kind = kind
+        self.closer = closer      # ')', '`' or '}' ending a command list; None at the root
+        self.owner = owner        # command list that receives this frame's text or node
+        self.parts = []           # text of the current simple command
+        self.segments = []
+        self.children = []
+        self.start = True         # the current simple command has no words yet
+        self.depth = 0            # unmatched plain '(' (or '{' inside ${...})
+
+    def add(self, text):
+        self.parts.append(text)
+        if self.start and not text.isspace():
+            self.start = False
+
+    def end(self):
+        seg = ''.join(self.parts).strip()
+        if seg:
+            self.segments.append(seg)
+        self.parts.clear()
+        self.start = True
+
+
+def parse_shell(command):
+    """Parse command into a compact AST of nested command lists.
+
+    Returns a list of (kind, segments, children) nodes with the ROOT node
+    last, or None when the command is unbalanced (an unterminated quote,
+    substitution or group) or escapes backticks inside backticks, which
+    this parser does not follow. segments are the simple commands of the
+    list with every nested list cut out, leaving an empty placeholder
+    ('echo $(date)' -> 'echo $()'); children are the indexes of the nodes
+    nested in it. Identical subtrees are stored once, so $(date) repeated a
+    hundred times is one node.
+
+    One pass over the text with an explicit stack: linear time, and no
+    recursion however deep the nesting. Heredoc bodies are taken out
+    first, as for lex(); those with an unquoted delimiter are expanded by
+    bash like double-quoted text, so their substitutions are parsed too and
+    hang off the ROOT node. $((...)) is always arithmetic, and '#' after a
+    word break comments out the rest of the line.
+    """
+    spans = list(iter_spans(command))
+    text = '\n'.join(command[start:end] for kind, start, end in spans if kind == TEXT)
+    bodies = [command[start:end] for kind, start, end in spans
+              if kind == HEREDOC and heredoc_expands(command, start)]
+    special = {state: re.compile(source, re.S) for state, source in PARSE_SPECIAL.items()}
+    ansi_c_quoted = re.compile(ANSI_C_QUOTED, re.S)
+    nodes = []
+    ids = {}
+    stack = [ShellFrame(ROOT)]
+    backticks = 0
+
+    def open_list(kind, closer, owner, placeholder):
+        if placeholder:
+            owner.add(placeholder)
+        stack.append(ShellFrame(kind, closer, owner))
+
+    def close_list(frame):
+        frame.end()
+        node = (frame.kind, tuple(frame.segments), tuple(dict.fromkeys(frame.children)))
+        index = ids.get(node)
+        if index is None:
+            index = ids[node] = len(nodes)
+            nodes.append(node)
+        return index
+
+    def scan(text):
+        """Feed text to the frames on the stack; False if it cannot be followed."""
+        nonlocal backticks
+        pos = 0
+        while True:
+            frame = stack[-1]
+            state = frame.kind if frame.kind in PARSE_SPECIAL else None
+            owner = frame.owner if state else frame
+            m = special[state].search(text, pos)
+            if not m:
+                owner.add(text[pos:])
+                return True
+            if m.start() > pos:
+                owner.add(text[pos:m.start()])
+            tok = m.group()
+            pos = m.end()
+
+            if tok[0] == '\\':
+                if tok == '\\`' and backticks:
+                    return False
+                owner.add(tok)
+            elif tok == "'":
+                end = text.find("'", pos)
+                if end < 0:
+                    return False
+                owner.add(text[pos - 1:end + 1])
+                pos = end + 1
+            elif tok == "$'":
+                quoted = ansi_c_quoted.match(text, pos - 2)
+                if not quoted:
+                    return False
+                owner.add(quoted.group())
+                pos = quoted.end()
+            elif tok == '"':
+                owner.add('"')
+                if state == DOUBLE_QUOTE:
+                    stack.pop()
+                else:
+                    stack.append(ShellFrame(DOUBLE_QUOTE, owner=owner))
+            elif tok == '`':
+                if frame.closer == '`':
+                    stack.pop()
+                    frame.owner.children.append(close_list(frame))
+                    backticks -= 1
+                else:
+                    open_list(SUBSTITUTION, '`', owner, '``')
+                    backticks += 1
+            elif tok == '$((':
+                owner.add(tok)
+                stack.append(ShellFrame(ARITHMETIC, owner=owner))
+            elif tok == '$(':
+                open_list(SUBSTITUTION, ')', owner, '$()')
+            elif tok == '${':
+                owner.add(tok)
+                stack.append(ShellFrame(PARAMETER, owner=owner))
+            elif tok in ('<(', '>('):
+                open_list(PROCESS, ')', owner, tok + ')')
+
+            elif state == ARITHMETIC:
+                if tok == '(':
+                    frame.depth += 1
+                elif frame.depth:
+                    frame.depth -= 1
+                elif text.startswith(')', pos):
+                    pos += 1
+                    tok = '))'
+                    stack.pop()
+                else:
+                    return False
+                owner.add(tok)
+            elif state == PARAMETER:
+                if tok == '{':
+                    frame.depth += 1
+                elif frame.depth:
+                    frame.depth -= 1
+                else:
+                    stack.pop()
+                owner.add(tok)
+
+            # Command list: separators and grouping
+            elif tok in '\n;':
+                frame.end()
+            elif tok == '&':
+                if text.startswith('&', pos):
+                    pos += 1
+                    frame.end()
+                else:
+                    frame.add(tok)
+            elif tok == '|':
+                if text.startswith('|', pos):
+                    pos += 1
+                frame.end()
+            elif tok == '#':
+                if m.start() and text[m.start() - 1] not in WORD_BREAK:
+                    frame.add(tok)
+                else:
+                    end = text.find('\n', pos)
+                    end = len(text) if end < 0 else end
+                    frame.add(text[m.start():end])
+                    pos = end
+            elif tok == '(':
+                if not frame.start:
+                    frame.depth += 1
+                    frame.add(tok)
+                elif text.startswith('(', pos):
+                    pos += 1
+                    frame.add('((')
+                    stack.append(ShellFrame(ARITHMETIC, owner=frame))
+                else:
+                    open_list(SUBSHELL, ')', frame, None)
+            elif tok == ')':
+                if frame.depth:
+                    frame.depth -= 1
+                    frame.add(tok)
+                elif frame.closer == ')':
+                    stack.pop()
+                    frame.owner.children.append(close_list(frame))
+                    if frame.kind == SUBSHELL:
+                        frame.owner.start = False
+                else:
+                    frame.add(tok)
+            elif tok == '{':
+                if frame.start and text[pos:pos + 1].isspace():
+                    open_list(GROUP, '}', frame, None)
+                else:
+                    frame.add(tok)
+            elif tok == '}':
+                if frame.start and frame.closer == '}':
+                    stack.pop()
+                    frame.owner.children.append(close_list(frame))
+                    frame.owner.start = False
+                else:
+                    frame.add(tok)
+
+    if not scan(text) or len(stack) > 1:
+        return None
+    # Substitutions in expanding heredoc bodies run too: they belong to the command
+    body_text = ShellFrame(ROOT)
+    for body in bodies:
+        stack.append(ShellFrame(HEREDOC_BODY, owner=body_text))
+        if not scan(body) or len(stack) > 2:
+            return None
+        stack.pop()
+    stack[0].children.extend(body_text.children)
+    close_list(stack[0])
+    return nodes
+
+
 # --- Layer 1: Deny ---
 
-def check_deny_patterns(command):
-    """Check if command matches any deny pattern (including zero-access paths)."""
+def check_deny_patterns(command, tokens=None, watch=None):
+    """Check if command matches any deny pattern (including zero-access paths).
+
+    tokens is the lex() stream for command; without it, interpreter payloads
+    are read straight from the raw command (the same INLINE tokens lex()
+    would produce). Either way every byte of the command is scanned: deny
+    never stops early. watch, if given, is a Stopwatch that records time
+    per step.
+    """
     # Check zero-access paths first
-    for pattern in ZERO_ACCESS_PATHS:
-        if re.search(pattern, command, re.IGNORECASE):
-            return True, f"zero-access path ({pattern})"
+    pattern = ZERO_ACCESS_MATCHER.first_match(command)
+    if watch:
+        watch.lap('deny.zero_access')
+    if pattern is not None:
+        return True, f"zero-access path ({pattern})"
 
     # Check deny patterns
-    for pattern in DENY_PATTERNS:
-        if re.search(pattern, command, re.IGNORECASE):
-            return True, pattern
+    pattern = DENY_MATCHER.first_match(command)
+    if watch:
+        watch.lap('deny.patterns')
+    if pattern is not None:
+        return True, pattern
 
     # Check inline interpreter code for deny patterns
-    inline_code = extract_inline_code(command)
-    if inline_code:
-        for pattern in DENY_PATTERNS:
-            if re.search(pattern, inline_code, re.IGNORECASE):
+    if tokens is None:
+        tokens = ((INLINE, code) for code in iter_inline_code(command))
+    for kind, code in tokens:
+        if kind == INLINE and code:
+            pattern = DENY_MATCHER.first_match(code)
+            if pattern is not None:
+                if watch:
+                    watch.lap('deny.inline')
                 return True, f"inline code: {pattern}"
+    if watch:
+        watch.lap('deny.inline')
 
     return False, None
 
 
-def extract_inline_code(command):
-    """Extract code from interpreter -c/-e flags (e.g., python3 -c 'code')."""
-    for interp, flag in INTERPRETER_FLAGS.items():
-        # Match: interpreter [options] -c "code" or -c 'code'
-        pattern = rf'\b{re.escape(interp)}[\d.]*\s+(?:-\S+\s+)*{re.escape(flag)}\s+'
-        m = re.search(pattern, command)
-        if m:
-            rest = command[m.end():]
-            # Extract quoted string
-            if rest.startswith(("'", '"')):
-                quote = rest[0]
-                end = find_matching_quote(rest, 1, quote)
-                if end > 0:
-                    return rest[1:end]
-            else:
-                # Unquoted - take until next shell operator
-                m2 = re.match(r'^(\S+)', rest)
-                if m2:
-                    return m2.group(1)
-    return None
+# --- Layer 1: Protected paths ---
 
-
-def find_matching_quote(s, start, quote):
-    """Find matching closing quote, handling escapes."""
-    i = start
-    while i < len(s):
-        if s[i] == '\\' and quote == '"':
-            i += 2
+# Tiers in the order they are reported, and the operations each one blocks
+READ, WRITE, DELETE = 'read', 'write', 'delete'
+TIER_BLOCKS = {
+    'zero-access': (READ, WRITE, DELETE),
+    'read-only': (WRITE, DELETE),
+    'no-delete': (DELETE,),
+}
+# Commands whose path arguments are deleted, or written
+DELETE_COMMANDS = {'rm', 'rmdir', 'unlink', 'shred', 'srm', 'trash'}
+WRITE_COMMANDS = {'touch', 'tee', 'mkdir', 'truncate', 'chmod', 'chown', 'chgrp', 'chattr', 'setfacl'}
+# ... and those that write only their last one (mv also deletes the others)
+COPY_COMMANDS = {'cp', 'ln', 'install', 'rsync', 'scp'}
+# Editors that write their file arguments when given -i
+IN_PLACE_COMMANDS = {'sed', 'perl', 'ruby'}
+
+# Separators between words of a segment; a lone & is a background marker
+WORD_GAP = re.compile(r'[\s()&]*')
+# Redirection operator: [n]>, >>, >|, &>, <, <>, <<<; a trailing & duplicates a descriptor
+REDIRECT = re.compile(r'(?:\d+|&)?(>>?|>\||<<<|<>?)(&?)')
+HOME_VAR = re.compile(r'\$(?:HOME(?!\w)|\{HOME\})')
+# A word of only / and . that starts with / (names / itself)
+ROOT_WORD = re.compile(r'/(?<![^\s=<>(]/)[/.]*(?![^\s;&|)<>])')
+# Quotes and escapes join the pieces of a word: /e"t"c is /etc
+UNQUOTE = str.maketrans('', '', '\'"\\')
+
+
+class PathNode:
+    """One path component in a PathTrie: {tier: location} for what it protects."""
+
+    __slots__ = ('children', 'exact', 'subtree', 'below')
+
+    def __init__(self):
+        self.children = {}
+        self.exact = {}     # locations that are this very path
+        self.subtree = {}   # locations that are this directory and all it holds
+        self.below = {}     # locations further down
+
+
+def path_components(path, base=()):
+    """Case-folded components of path below base, with . and .. resolved and empty ones dropped.
+
+    .. above the start stays there: above / that is where bash stays, and
+    above the start of a relative path nothing a lookup could match is lost.
+    """
+    parts = list(base)
+    for part in path.split('/'):
+        if not part or part == '.':
             continue
-        if s[i] == quote:
-            return i
-        i += 1
-    return -1
+        if part == '..':
+            if parts:
+                parts.pop()
+            continue
+        parts.append(part.casefold())
+    return parts
 
 
-# --- Layer 2: Allow ---
+class PathTrie:
+    """Protected locations as a trie of path components.
 
-def split_shell_commands(command):
-    """Split compound command on &&, ||, ;, |, newline -- respecting quotes."""
-    segments = []
-    current = []
-    i = 0
-    in_single = False
-    in_double = False
-    in_escape = False
+    Locations starting with / or ~ hang off the root. The others hang off
+    a floating root that a lookup enters at every component of the path,
+    so '.ssh/' protects an .ssh directory anywhere. Each node records the
+    locations ending there and those further down, so one walk answers
+    both "is this path protected" and "does it hold something protected".
+    A lookup costs one walk per component, each no deeper than the
+    deepest location: it never grows with the number of locations.
+    Components are compared case-folded (macOS paths are case-insensitive).
 
-    while i < len(command):
-        ch = command[i]
+    Built on first use, like PatternSet; ~ is the home directory then.
+    """
 
-        if in_escape:
-            current.append(ch)
-            in_escape = False
-            i += 1
-            continue
+    def __init__(self, tiers):
+        self.tiers = [(tier, list(locations)) for tier, locations in tiers]
+        self.root = None
+        self.floating = None
+        self.home = None
+        self.names = ()
+
+    def build(self):
+        import os
+        self.home = os.path.expanduser('~')
+        self.root = PathNode()
+        self.floating = PathNode()
+        names = set()
+        for tier, locations in self.tiers:
+            for location in locations:
+                if location == '~' or location.startswith('~/'):
+                    node, parts = self.root, path_components(self.home + location[1:])
+                elif location.startswith('/'):
+                    node, parts = self.root, path_components(location)
+                else:
+                    node, parts = self.floating, path_components(location)
+                    if not parts:
+                        continue
+                names.update(part for part in parts if part != '..')
+                for part in parts:
+                    node.below.setdefault(tier, location)
+                    node = node.children.setdefault(part, PathNode())
+                (node.subtree if location.endswith('/') else node.exact).setdefault(tier, location)
+        self.names = tuple(sorted(names))
+
+    def lookup(self, parts, absolute):
+        """({tier: location} covering the path, {tier: location} inside it) for path_components() parts."""
+        if self.root is None:
+            self.build()
+        covering = {}
+        inside = {}
+        n = len(parts)
+        starts = [(self.root, 0)] if absolute else []
+        starts += [(self.floating, i) for i in range(n) if parts[i] in self.floating.children]
+        for node, i in starts:
+            while i < n:
+                node = node.children.get(parts[i])
+                if node is None:
+                    break
+                for tier, location in node.subtree.items():
+                    covering.setdefault(tier, location)
+                i += 1
+            else:
+                for tier, location in node.exact.items():
+                    covering.setdefault(tier, location)
+                for tier, location in node.below.items():
+                    inside.setdefault(tier, location)
+        return covering, inside
+
+    def mentions(self, text, relative=False):
+        """Whether text could name a protected path, by plain substring checks.
+
+        It must spell out a component of a protected location, or hide one
+        behind ~, $HOME, ANSI-C quoting or a word of just / and . -- or, if
+        relative paths are resolved against a known directory, climb with ..
+        """
+        if "$'" in text:
+            return True
+        text = text.translate(UNQUOTE).lower()
+        if '~' in text or '$home' in text or '${home}' in text or (relative and '..' in text):
+            return True
+        if '/' in text and ROOT_WORD.search(text):
+            return True
+        return any(name in text for name in self.names)
+
+    def may_name(self, command, cwd=None):
+        """Whether command could name a protected path: check_protected_paths() can skip it if not."""
+        if self.root is None:
+            self.build()
+        if not isinstance(cwd, str) or cwd[:1] != '/':
+            return self.mentions(command)
+        absolute, parts = self.resolve(cwd)
+        return any(self.lookup(parts, absolute)) or self.mentions(command, relative=True)
+
+    def resolve(self, word, cwd=None):
+        """(absolute, parts) of the path word names, relative to cwd (an earlier resolve(), or None)."""
+        if word[:1] == '~':
+            head, sep, rest = word.partition('/')
+            if head == '~':
+                word = self.home + sep + rest
+            else:
+                import os
+                try:
+                    word = os.path.expanduser(head) + sep + rest
+                except ValueError:
+                    pass    # not a user name (embedded NUL): stays a relative path
+        elif word[:1] == '$':
+            m = HOME_VAR.match(word)
+            if m:
+                word = self.home + word[m.end():]
+        if word[:1] == '/' or cwd is None:
+            return word[:1] == '/', path_components(word)
+        absolute, base = cwd
+        return absolute, path_components(word, base)
 
-        if ch == '\\' and not in_single:
-            in_escape = True
-            current.append(ch)
-            i += 1
-            continue
 
-        if ch == "'" and not in_double:
-            in_single = not in_single
-            current.append(ch)
-            i += 1
+# PROTECTED_PATHS is built by apply_rules() (see Rule files), once rule files are merged in.
+
+
+def segment_words(segment):
+    """Yield (word, redirect) for each shell word of segment, quotes and escapes resolved.
+
+    redirect is '>' or '<' for the target of a redirection, else None;
+    descriptor duplications (2>&1) are skipped.
+    """
+    n = len(segment)
+    pos = 0
+    redirect = None
+    while True:
+        pos = WORD_GAP.match(segment, pos).end()
+        if pos >= n:
+            return
+        m = REDIRECT.match(segment, pos)
+        if m:
+            pos = m.end()
+            redirect = '' if m.group(2) else '>' if '>' in m.group(1) else '<'
+            continue
+        word, end = shell_word(segment, pos)
+        if end == pos:
+            pos += 1
             continue
+        pos = end
+        if redirect != '':
+            yield word, redirect
+        redirect = None
+
 
-        if ch == '"' and not in_single:
-            in_double = not in_double
-            current.append(ch)
+def command_paths(words):
+    """Yield (operation, word) for the words of one simple command that may name paths.
+
+    words are segment_words() pairs. Redirection targets are written (>)
+    or read (<); arguments are deleted, written or read depending on the
+    command, found past assignments and wrappers (sudo, env, timeout).
+    Option values (--file=PATH) are read.
+    """
+    argv = []
+    for word, redirect in words:
+        if redirect:
+            yield (WRITE if redirect == '>' else READ), word
+        else:
+            argv.append(word)
+    i = 0
+    while i < len(argv):
+        word = argv[i]
+        if VAR_ASSIGNMENT.match(word):
+            yield READ, word.partition('=')[2]
             i += 1
             continue
+        if word.rsplit('/', 1)[-1] not in WRAPPER_COMMANDS | {'env'}:
+            break
+        i += 1
+        while i < len(argv) and (argv[i][:1] == '-' or argv[i][:1].isdigit()):
+            i += 2 if argv[i] in ('-u', '-g', '-C') else 1
+    if i >= len(argv):
+        return
+    yield READ, argv[i]
+    name = argv[i].rsplit('/', 1)[-1]
+    args = []
+    in_place = False
+    options = True
+    for word in argv[i + 1:]:
+        if options and word[:1] == '-' and word != '-':
+            if word == '--':
+                options = False
+            elif word.startswith(('-i', '--in-place')):
+                in_place = True
+            if '=' in word:
+                yield READ, word.partition('=')[2]
+            continue
+        args.append(word)
 
-        if not in_single and not in_double:
-            if i + 1 < len(command) and command[i:i+2] in ('&&', '||'):
-                seg = ''.join(current).strip()
-                if seg:
-                    segments.append(seg)
-                current = []
-                i += 2
-                continue
-            if ch in (';', '|', '\n'):
-                seg = ''.join(current).strip()
-                if seg:
-                    segments.append(seg)
-                current = []
-                i += 1
+    if name == 'dd':
+        for arg in args:
+            key, _, value = arg.partition('=')
+            yield (WRITE if key == 'of' else READ), value
+        return
+    last = len(args) - 1
+    for k, arg in enumerate(args):
+        if name in DELETE_COMMANDS:
+            op = DELETE
+        elif name == 'mv':
+            op = WRITE if k == last and last else DELETE
+        elif name in COPY_COMMANDS:
+            op = WRITE if k == last and last else READ
+        elif name in WRITE_COMMANDS or (in_place and name in IN_PLACE_COMMANDS):
+            op = WRITE
+        else:
+            op = READ
+        yield op, arg
+
+
+def check_protected_paths(tokens, cwd=None):
+    """Check the paths a lexed command names against the protected locations.
+
+    tokens is the lex() stream (only its SEGMENT tokens are used). Segments
+    that PathTrie.mentions() rules out are never split into words nor
+    scanned for interpreter payloads; payloads are lexed and checked after
+    the command's own segments. cwd is the directory the command starts in
+    (the hook's "cwd"), if known; "cd DIR" moves it for the segments after.
+    Returns (True, reason) for the first blocked operation, else (False, None).
+    """
+    trie = PROTECTED_PATHS
+    if trie.root is None:
+        trie.build()
+    here = trie.resolve(cwd) if isinstance(cwd, str) and cwd[:1] == '/' else None
+    # With the cwd at or above a protected location, even a bare name may reach it
+    live = here is not None and any(trie.lookup(here[1], True))
+
+    pending = [text for kind, text in tokens if kind == SEGMENT]
+    top_level = len(pending)
+    for i, segment in enumerate(pending):
+        # A bare cd names no path but still moves to ~
+        if not live and not trie.mentions(segment, here is not None) and \
+                not (segment[:2] == 'cd' and segment[2:3] in ('', ' ', '\t')):
+            continue
+        if i < top_level:
+            # iter_inline_code() already yields nested payloads: only look in the command's own segments
+            for code in iter_inline_code(segment):
+                if trie.mentions(code, True):
+                    pending.extend(text for kind, text in iter_tokens(code, inline=False, bodies=False)
+                                   if kind == SEGMENT)
+        words = list(segment_words(segment))
+        if words and words[0][0] == 'cd' and not words[0][1]:
+            target = words[1][0] if len(words) > 1 else '~'
+            here = None if target == '-' else trie.resolve(target, here)
+            live = here is not None and any(trie.lookup(here[1], here[0]))
+        for op, word in command_paths(words):
+            if not word or not (live or trie.mentions(word, here is not None)):
                 continue
+            absolute, parts = trie.resolve(word, here)
+            covering, inside = trie.lookup(parts, absolute)
+            for tier, blocked in TIER_BLOCKS.items():
+                if tier in covering and op in blocked:
+                    return True, f"{tier} path ({covering[tier]})"
+            if op == DELETE:
+                for tier in TIER_BLOCKS:
+                    if tier in inside:
+                        return True, f"{tier} path ({inside[tier]}) inside {word}"
+    return False, None
 
-        current.append(ch)
-        i += 1
 
-    seg = ''.join(current).strip()
-    if seg:
-        segments.append(seg)
-    return segments
+# --- Layer 2: Allow ---
+
+# Per-segment regexes, compiled once
+VAR_ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+ENV_PREFIX = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=(?:\$\([^)]*\)|"[^"]*"|\'[^\']*\'|\S+)\s+')
+FIRST_WORD = re.compile(r'^(\S+)')
+# The digits only start at the beginning of a digit run: a plain \d*> would
+# re-scan a long run of digits from every position in it (quadratic)
+SAFE_REDIRECT = re.compile(r'(?:(?<!\d)\d+)?>\s*(?:/dev/null|/tmp/\S+|&\d+)')
+ENV_ASSIGNMENT = re.compile(r'^[A-Z_][A-Z0-9_]*=')
 
 
 def strip_wrappers(cmd):
@@ -282,48 +1722,52 @@ def strip_wrappers(cmd):
     if not parts:
         return cmd
 
+    # Index of the first word not yet stripped (popping from the front is
+    # quadratic on a long run of flags)
+    i = 0
     iterations = 0
-    while iterations < 10 and parts:
-        word = parts[0]
+    while iterations < 10 and i < len(parts):
+        word = parts[i]
         # Get basename for path-qualified commands (/usr/bin/sudo -> sudo)
         basename = word.rsplit('/', 1)[-1] if '/' in word else word
 
         if basename not in WRAPPER_COMMANDS:
             break
 
-        parts = parts[1:]
+        i += 1
         iterations += 1
 
         # Skip flags of wrapper commands
-        while parts and parts[0].startswith('-'):
-            flag = parts.pop(0)
+        while i < len(parts) and parts[i].startswith('-'):
+            flag = parts[i]
+            i += 1
             # Flags that consume next arg: sudo -u root, timeout 5
             if basename == 'sudo' and flag in ('-u', '-g', '-C'):
-                if parts:
-                    parts.pop(0)
+                if i < len(parts):
+                    i += 1
             elif basename == 'timeout' and not flag.startswith('--'):
                 break  # Next arg after timeout flags is the duration, then command
             elif basename == 'env' and flag in ('-u', '-C', '--unset', '--chdir'):
-                if parts:
-                    parts.pop(0)
+                if i < len(parts):
+                    i += 1
 
         # For env: also skip VAR=value assignments
         if basename == 'env':
-            while parts and re.match(r'^[A-Z_][A-Z0-9_]*=', parts[0]):
-                parts.pop(0)
+            while i < len(parts) and ENV_ASSIGNMENT.match(parts[i]):
+                i += 1
 
-    return ' '.join(parts) if parts else cmd
+    return ' '.join(parts[i:]) if i < len(parts) else cmd
 
 
 def extract_command_name(cmd):
     """Extract the first command word, skipping env var assignments."""
     cmd = cmd.strip()
     while True:
-        m = re.match(r'^[A-Za-z_][A-Za-z0-9_]*=(?:\$\([^)]*\)|"[^"]*"|\'[^\']*\'|\S+)\s+', cmd)
+        m = ENV_PREFIX.match(cmd)
         if not m:
             break
         cmd = cmd[m.end():]
-    m = re.match(r'^(\S+)', cmd)
+    m = FIRST_WORD.match(cmd)
     return m.group(1) if m else cmd
 
 
@@ -336,90 +1780,102 @@ def check_single_command(cmd):
     # Standalone variable assignment (e.g. TOKEN=$(gcloud auth ...), title="hello")
     # Safe because deny patterns already caught dangerous content in Layer 1
     # Supports both uppercase (TOKEN=) and lowercase (title=) variable names
-    if re.match(r'^[A-Za-z_][A-Za-z0-9_]*=', cmd) and '&&' not in cmd:
+    if VAR_ASSIGNMENT.match(cmd) and '&&' not in cmd:
         return True
 
     # Strip redirections for cleaner matching (2>/dev/null, >/tmp/out, etc.)
-    clean = re.sub(r'\d*>\s*(?:/dev/null|/tmp/\S+|&\d+)', '', cmd).strip()
+    clean = SAFE_REDIRECT.sub('', cmd).strip()
 
     # Try direct match
-    for pattern in ALLOW_PATTERNS:
-        if re.search(pattern, clean):
-            return True
+    if ALLOW_INDEX.matches(clean):
+        return True
 
     # Try after stripping env var prefixes
     name = extract_command_name(clean)
-    if name != clean:
-        for pattern in ALLOW_PATTERNS:
-            if re.search(pattern, name):
-                return True
+    if name != clean and ALLOW_INDEX.matches(name):
+        return True
 
     # Try basename for path-qualified commands (e.g. .venv/bin/python -> python)
     if '/' in name:
         basename_cmd = name.rsplit('/', 1)[-1]
-        for pattern in ALLOW_PATTERNS:
-            if re.search(pattern, basename_cmd):
-                return True
+        if ALLOW_INDEX.matches(basename_cmd):
+            return True
 
     # Try after stripping wrapper commands (sudo, timeout, env, etc.)
     unwrapped = strip_wrappers(clean)
-    if unwrapped != clean:
-        for pattern in ALLOW_PATTERNS:
-            if re.search(pattern, unwrapped):
-                return True
+    if unwrapped != clean and ALLOW_INDEX.matches(unwrapped):
+        return True
 
     return False
 
 
-def collapse_heredocs(command):
-    """Remove heredoc bodies from command string before splitting.
+def check_allow_patterns(command, tokens=None, watch=None):
+    """Check if all commands in a compound command match allow patterns.
 
-    Heredoc content is already scanned by deny patterns (Layer 1).
-    For allow patterns (Layer 2), we only need to check the command itself,
-    not the heredoc body. This prevents heredoc lines (e.g. 'import json')
-    from being treated as separate shell commands during splitting.
+    tokens is the lex() stream for command; if not given, the command is
+    lexed lazily and scanning stops at the first segment that is not
+    allowed. Heredoc bodies are separate tokens, so body lines (e.g.
+    'import json') are never treated as commands of their own. watch, if
+    given, records lexing time under 'lex' and the time of each
+    check_single_command().
     """
-    lines = command.split('\n')
-    result = []
-    heredoc_delim = None
-
-    for line in lines:
-        if heredoc_delim is not None:
-            # Inside heredoc body -- check for closing delimiter
-            if line.strip() == heredoc_delim:
-                heredoc_delim = None
+    if tokens is None:
+        tokens = iter_tokens(command, inline=False, bodies=False)
+    found = False
+    for kind, seg in tokens:
+        if kind != SEGMENT:
             continue
-
-        # Detect heredoc start: cmd << 'DELIM' or << DELIM or <<- "DELIM"
-        m = re.search(r'<<-?\s*\\?[\'"]?(\w+)[\'"]?\s*$', line)
-        if m:
-            heredoc_delim = m.group(1)
-            # Keep the command part, strip the heredoc operator
-            cleaned = line[:m.start()].rstrip()
-            if cleaned:
-                result.append(cleaned)
-            continue
-
-        result.append(line)
-
-    return '\n'.join(result)
-
-
-def check_allow_patterns(command):
-    """Check if all commands in a compound command match allow patterns."""
-    # Collapse heredocs before splitting to prevent heredoc body lines
-    # from being treated as separate commands
-    collapsed = collapse_heredocs(command)
-    segments = split_shell_commands(collapsed.strip())
-    if not segments:
+        if watch:
+            watch.lap('lex')
+        found = True
+        allowed = check_single_command(seg)
+        if watch:
+            watch.segment()
+        if not allowed:
+            return False
+    if watch:
+        watch.lap('lex')
+    return found
+
+
+def parse_mode():
+    """'ast' when $BASH_GUARD_PARSE=ast selects check_allow_ast(), else 'split'."""
+    import os
+    return 'ast' if os.environ.get('BASH_GUARD_PARSE', '').lower() == 'ast' else 'split'
+
+
+def check_allow_ast(command, watch=None):
+    """check_allow_patterns() that also looks inside nested commands.
+
+    Every simple command in the parse_shell() tree must be allowed: the
+    commands inside $(...), backticks, <(...), ( ... ) and { ...; } as well
+    as the ones around them, so 'echo $(rm -rf x)' is not approved for its
+    leading echo. Each distinct command is checked once, however often it
+    recurs. A command that does not parse is not allowed.
+    """
+    nodes = parse_shell(command)
+    if watch:
+        watch.lap('lex')
+    if nodes is None:
         return False
-    return all(check_single_command(seg) for seg in segments)
+    seen = set()
+    for kind, segments, children in nodes:
+        for seg in segments:
+            if seg in seen:
+                continue
+            seen.add(seg)
+            allowed = check_single_command(seg)
+            if watch:
+                watch.segment()
+            if not allowed:
+                return False
+    return bool(seen)
 
 
 # --- Output ---
 
-def output_decision(decision, reason=""):
-    """Output the permission decision JSON."""
+def format_decision(decision, reason=""):
+    """Build the permission decision JSON (one line, no newline)."""
     result = {
         "hookSpecificOutput": {
             "hookEventName": "PreToolUse",
@@ -428,33 +1884,1805 @@ def output_decision(decision, reason=""):
     }
     if reason:
         result["hookSpecificOutput"]["permissionDecisionReason"] = reason
-    print(json.dumps(result))
+    return json.dumps(result)
 
 
-# --- Main ---
+def output_decision(decision, reason=""):
+    """Output the permission decision JSON."""
+    print(format_decision(decision, reason))
+
+
+def decide(hook_input, watch=None):
+    """Evaluate hook input. Returns (decision, reason), or (None, None) for no decision.
+
+    watch, if given, is a Stopwatch that records time per step.
+    """
+    if isinstance(hook_input, OversizedInput):
+        return decide_oversized(hook_input, watch)
 
-def main():
-    hook_input = read_input()
     command = extract_command(hook_input)
 
     if not command:
-        output_decision("allow", "Empty command")
-        return
+        return "allow", "Empty command"
+
+    # Layer 1: Check deny patterns (instant) -- always over the whole command
+    is_denied, pattern = check_deny_patterns(command, watch=watch)
+    if is_denied:
+        return "deny", f"Blocked: {pattern}"
+
+    # Layer 1: Check protected paths -- only lexed when a path could be named
+    cwd = hook_input.get("cwd")
+    if not isinstance(cwd, str):
+        cwd = None
+    tokens = None
+    if PROTECTED_PATHS.may_name(command, cwd):
+        tokens = list(iter_tokens(command, inline=False, bodies=False))
+        is_denied, location = check_protected_paths(tokens, cwd)
+        if is_denied:
+            if watch:
+                watch.lap('deny.paths')
+            return "deny", f"Blocked: {location}"
+    if watch:
+        watch.lap('deny.paths')
+
+    # Layer 2: Check allow patterns (instant) -- lexed lazily, stops at the
+    # first segment that is not allowed
+    if parse_mode() == 'ast':
+        allowed = check_allow_ast(command, watch=watch)
+    else:
+        allowed = check_allow_patterns(command, tokens, watch=watch)
+    if allowed:
+        return "allow", "Matched safe pattern"
+
+    # Layer 3: No decision -- Claude Code falls back to its default permission prompt
+    return None, None
+
+
+# --- Oversized input ---
+
+# Bytes of an oversized command decoded and deny-scanned at a time
+SCAN_CHUNK = 1024 * 1024
+# Characters of each chunk scanned again with the next, so a match across the boundary is seen
+SCAN_OVERLAP = 4096
+# Characters of an oversized command kept as its tool_input (audit log, metrics)
+OVERSIZED_PREVIEW = 4096
+# Start of the command string, and the short top-level fields before it, in raw hook input
+COMMAND_KEY = rb'"command"\s*:\s*"'
+INPUT_FIELD = rb'"(session_id|cwd)"\s*:\s*("[^"\\]*(?:\\.[^"\\]*)*")'
+
+
+def partial_escape_start(text):
+    """Start of a JSON escape cut off at the end of text, else len(text)."""
+    i = text.rfind('\\', max(0, len(text) - 6))
+    if i < 0:
+        return len(text)
+    k = i
+    while k and text[k - 1] == '\\':
+        k -= 1
+    if (i - k) % 2:
+        # The second backslash of an escaped one
+        return len(text)
+    needed = 6 if text[i + 1:i + 2] == 'u' else 2
+    return i if len(text) - i < needed else len(text)
+
+
+class OversizedInput(dict):
+    """Hook input over the size limit, decoded only as far as it is read.
+
+    As a dict it holds the session_id and cwd found before the command and
+    the first OVERSIZED_PREVIEW characters of the command, so
+    extract_command(), the audit log and the daemon's rule lookup work as
+    usual. chunks() decodes the whole command from the stream one piece at
+    a time; only the bytes read up front and one chunk are held at once.
+    If there is no "command" string where one is expected, the raw input is
+    scanned as it is.
+    """
 
-    # Layer 1: Check deny patterns (instant)
-    is_denied, pattern = check_deny_patterns(command)
+    def __init__(self, head, stream, limit):
+        super().__init__()
+        self.stream = stream
+        self.limit = limit
+        self.size = len(head)    # bytes read so far; the total once drained
+        m = re.search(COMMAND_KEY, head)
+        for key, value in re.findall(INPUT_FIELD, head[:m.start() if m else 0]):
+            try:
+                self[key.decode()] = json.loads(value)
+            except ValueError:
+                pass
+        self.head = memoryview(head)[m.end() if m else 0:]
+        self.pieces = self.read_command(string=m is not None)
+        self.first = next(self.pieces, '')
+        self['tool_input'] = {'command': self.first[:OVERSIZED_PREVIEW]}
+
+    def read(self):
+        """Next SCAN_CHUNK bytes: from the bytes read up front, then from the stream."""
+        if self.head:
+            data, self.head = self.head[:SCAN_CHUNK], self.head[SCAN_CHUNK:]
+            return data
+        data = self.stream.read(SCAN_CHUNK)
+        self.size += len(data)
+        return data
+
+    def read_command(self, string=True):
+        """Yield the decoded command piece by piece until its closing quote."""
+        import codecs
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        scanstring = json.decoder.scanstring
+        pending = ''
+        while True:
+            data = self.read()
+            text = pending + decoder.decode(data, final=not data)
+            pending = ''
+            if string:
+                try:
+                    piece, closed = scanstring(text, 0, False)[0], True
+                except ValueError:
+                    # No closing quote yet; finish an escape cut off by the
+                    # chunk boundary with the next chunk
+                    end = partial_escape_start(text) if data else len(text)
+                    pending = text[end:]
+                    try:
+                        piece, closed = scanstring(text[:end] + '"', 0, False)[0], False
+                    except ValueError:
+                        # Malformed JSON: the rest is scanned as it is
+                        string, closed, piece, pending = False, False, text, ''
+                if piece:
+                    yield piece
+                if closed:
+                    return
+            elif text:
+                yield text
+            if not data:
+                return
+
+    def chunks(self):
+        """The command as a sequence of decoded pieces (a one-shot iterator)."""
+        if self.first:
+            yield self.first
+        self.first = None
+        yield from self.pieces
+
+    def drain(self):
+        """Read and discard the rest of the input, so the writer never sees a broken pipe."""
+        self.pieces.close()
+        self.head = None
+        while self.read():
+            pass
+
+
+def check_deny_window(text, cwd=None, watch=None):
+    """Deny rules, then protected paths, over one window of a chunked command."""
+    is_denied, pattern = check_deny_patterns(text, watch=watch)
     if is_denied:
-        output_decision("deny", f"Blocked: {pattern}")
+        return True, pattern
+    if PROTECTED_PATHS.may_name(text, cwd):
+        return check_protected_paths(iter_tokens(text, inline=False, bodies=False), cwd)
+    return False, None
+
+
+def check_deny_chunks(pieces, watch=None, budget=0, cwd=None):
+    """check_deny_patterns() and check_protected_paths() over text that arrives in pieces.
+
+    Each piece is scanned together with the last SCAN_OVERLAP characters
+    of the one before, so a match is only missed if it is longer than the
+    overlap and straddles a boundary. Paths are resolved against cwd in
+    every window: a cd in an earlier window is not carried over. Each scan
+    gets budget seconds (0: unbounded), so the input size alone never runs
+    out the budget.
+    """
+    carry = ''
+    for piece in pieces:
+        window = carry + piece
+        is_denied, reason = run_with_budget(budget, check_deny_window, window, cwd, watch)
+        if is_denied:
+            return True, reason
+        carry = window[-SCAN_OVERLAP:]
+    return False, None
+
+
+def decide_oversized(hook_input, watch=None, budget=0):
+    """decide() for an OversizedInput: deny rules and protected paths, over the command in chunks.
+
+    Allow rules need the whole command at once, so a command no deny rule
+    matches is never approved; the user is asked instead, and the reason
+    says the input was too large to check in full. budget applies to each
+    chunk (see check_deny_chunks()), not to the whole input.
+    """
+    cwd = hook_input.get("cwd")
+    if not isinstance(cwd, str):
+        cwd = None
+    try:
+        is_denied, pattern = check_deny_chunks(hook_input.chunks(), watch, budget, cwd)
+    finally:
+        hook_input.drain()
+    if is_denied:
+        return "deny", f"Blocked: {pattern} (input over {hook_input.limit} bytes, checked in chunks)"
+    return "ask", (f"Input truncated: {hook_input.size} bytes is over the {hook_input.limit}-byte "
+                   "limit, so only deny rules and protected paths were checked; allow rules were not applied")
+
+
+# --- Evaluation budget ---
+
+# Seconds of work allowed per command before giving up (BASH_GUARD_BUDGET overrides)
+EVAL_BUDGET = 1.0
+BUDGET_REASON = "Evaluation budget exceeded; leaving the decision to the user"
+
+
+class BudgetExceeded(Exception):
+    """Raised into rule matching once a command has used up its time budget."""
+
+
+def eval_budget():
+    """Budget in seconds from $BASH_GUARD_BUDGET (0 turns it off), else EVAL_BUDGET."""
+    import os
+    try:
+        return float(os.environ.get('BASH_GUARD_BUDGET') or EVAL_BUDGET)
+    except ValueError:
+        return EVAL_BUDGET
+
+
+def run_with_budget(budget, fn, *args):
+    """Call fn(*args), raising BudgetExceeded if it runs longer than budget seconds.
+
+    Uses a SIGALRM interval timer: the regex engine checks for signals while
+    it backtracks, so even a single runaway re.search() is interrupted.
+    Signals only reach the main thread, so elsewhere (daemon handler
+    threads) or without setitimer (Windows) fn runs unbounded.
+    """
+    import signal
+    # If threading was never imported, this is the only thread
+    threading = sys.modules.get('threading')
+    if budget <= 0 or not hasattr(signal, 'setitimer') or \
+            (threading and threading.current_thread() is not threading.main_thread()):
+        return fn(*args)
+
+    state = {'done': False}
+
+    def expire(signum, frame):
+        if not state['done']:
+            raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    try:
+        result = fn(*args)
+        state['done'] = True
+        return result
+    finally:
+        state['done'] = True
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def decide_within(hook_input, budget, watch=None):
+    """decide(), but a passthrough with BUDGET_REASON once budget seconds are used up."""
+    try:
+        return run_with_budget(budget, decide, hook_input, watch)
+    except BudgetExceeded:
+        return None, BUDGET_REASON
+
+
+# --- Decision cache ---
+
+# Bump when decide() changes in a way the rule tables don't capture
+CACHE_SCHEMA = 2
+CACHE_MAX_ENTRIES = 10_000
+# Shorter commands are decided faster than sqlite3 can even be imported
+CACHE_MIN_LENGTH = 16 * 1024
+# Cap on the summed length of cached commands (heredocs can be large)
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Seconds to wait for another hook process holding the write lock
+CACHE_BUSY_TIMEOUT = 1.0
+# Hits refresh their LRU timestamp at most this often, so most hits stay read-only
+CACHE_TOUCH_INTERVAL = 60
+
+
+def rules_fingerprint():
+    """Everything decide() depends on besides the command itself, as one string.
+
+    That includes this script: an upgrade that changes decision logic
+    must not keep serving decisions the old code made.
+    """
+    import os
+    tables = [CACHE_SCHEMA, file_stamps([os.path.abspath(__file__)]), parse_mode(),
+              ZERO_ACCESS_PATHS, DENY_PATTERNS, ALLOW_PATTERNS,
+              ZERO_ACCESS_LOCATIONS, READ_ONLY_LOCATIONS, NO_DELETE_LOCATIONS,
+              sorted(WRAPPER_COMMANDS), INTERPRETER_FLAGS]
+    return json.dumps(tables, sort_keys=True)
+
+
+def plugin_data_dir():
+    """$CLAUDE_PLUGIN_DATA, else a per-user cache dir, for files the guard writes."""
+    import os
+    data_dir = os.environ.get('CLAUDE_PLUGIN_DATA')
+    if not data_dir:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        data_dir = os.path.join(cache_home, 'aiorg-bash-guard')
+    return data_dir
+
+
+def default_cache_path():
+    import os
+    return os.path.join(plugin_data_dir(), 'decisions.sqlite3')
+
+
+class DecisionCache:
+    """On-disk LRU cache of decide() results, shared by concurrent hook processes.
+
+    Rows are keyed by the command text itself, behind the hook input's cwd
+    if it has one (no hashing, so no hashlib import and no collisions). The rule fingerprint lives in the meta
+    table: the first process to see a different one drops every row, and
+    put() only inserts while the stored fingerprint still matches its own,
+    so a process running older rules can never repopulate the cache.
+    sqlite in WAL mode handles the concurrency: readers never block, and
+    writers wait up to CACHE_BUSY_TIMEOUT for each other. Errors are the
+    caller's to swallow.
+    """
+
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        import os
+        import sqlite3
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            self.db = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, isolation_level=None)
+        finally:
+            os.umask(old_umask)
+        # Cached "allow"s are as good as rules: never trust a file others can write
+        st = os.stat(path)
+        if st.st_mode & 0o022 or (hasattr(os, 'getuid') and st.st_uid != os.getuid()):
+            self.db.close()
+            raise PermissionError(f"decision cache {path} is writable by other users")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fingerprint = rules_fingerprint()
+        try:
+            row = self.db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        except sqlite3.OperationalError:
+            # New file: journal mode is persistent, so this runs once
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS decisions (command TEXT PRIMARY KEY, '
+                            'decision TEXT, reason TEXT, size INTEGER NOT NULL, used REAL NOT NULL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS decisions_used ON decisions (used)')
+            # Running totals, so put() can check the caps without scanning the table
+            self.db.execute('CREATE TABLE IF NOT EXISTS totals (entries INTEGER, bytes INTEGER)')
+            self.db.execute('INSERT INTO totals SELECT 0, 0 WHERE NOT EXISTS (SELECT 1 FROM totals)')
+            self.db.execute('CREATE TRIGGER IF NOT EXISTS decisions_added AFTER INSERT ON decisions '
+                            'BEGIN UPDATE totals SET entries = entries + 1, bytes = bytes + new.size; END')
+            self.db.execute('CREATE TRIGGER IF NOT EXISTS decisions_removed AFTER DELETE ON decisions '
+                            'BEGIN UPDATE totals SET entries = entries - 1, bytes = bytes - old.size; END')
+            row = None
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        if row is None or row[0] != self.fingerprint:
+            with self.db:
+                self.db.execute('BEGIN IMMEDIATE')
+                self.db.execute('DELETE FROM decisions')
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)",
+                                (self.fingerprint,))
+
+    def get(self, command):
+        """Cached (decision, reason) for command, or None on a miss."""
+        import time
+        row = self.db.execute('SELECT decision, reason, used FROM decisions WHERE command = ?',
+                              (command,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > CACHE_TOUCH_INTERVAL:
+            self.db.execute('UPDATE decisions SET used = ? WHERE command = ?', (now, command))
+        return row[0], row[1]
+
+    def put(self, command, decision, reason):
+        """Store a decision, evicting least recently used rows once a cap is exceeded."""
+        import time
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            # Delete + insert rather than REPLACE, so the totals triggers see both
+            self.db.execute('DELETE FROM decisions WHERE command = ?', (command,))
+            self.db.execute('INSERT INTO decisions '
+                            'SELECT ?, ?, ?, ?, ? FROM meta WHERE name = ? AND value = ?',
+                            (command, decision, reason, len(command), time.time(),
+                             'fingerprint', self.fingerprint))
+            entries, size = self.db.execute('SELECT entries, bytes FROM totals').fetchone()
+            if entries <= self.max_entries and size <= self.max_bytes:
+                return
+            # Evict down to 90% of the caps, so this runs on few misses, not every one
+            while entries > self.max_entries * 0.9 or size > self.max_bytes * 0.9:
+                batch = max(1, entries - int(self.max_entries * 0.9))
+                self.db.execute('DELETE FROM decisions WHERE command IN '
+                                '(SELECT command FROM decisions ORDER BY used LIMIT ?)', (batch,))
+                entries, size = self.db.execute('SELECT entries, bytes FROM totals').fetchone()
+
+    def decide(self, hook_input, watch=None):
+        """decide() through the cache; a cache failure never changes the decision."""
+        import sqlite3
+        command = extract_command(hook_input)
+        if not command or not isinstance(command, str):
+            return decide(hook_input, watch)
+        # Relative paths are checked against the cwd, so it is part of the key
+        cwd = hook_input.get("cwd")
+        if isinstance(cwd, str) and cwd:
+            command = f"{cwd}\0{command}"
+        try:
+            hit = self.get(command)
+        except sqlite3.Error:
+            hit = None
+        if watch:
+            watch.lap('cache')
+        if hit is not None:
+            return hit
+        decision, reason = decide(hook_input, watch)
+        try:
+            self.put(command, decision, reason)
+        except sqlite3.Error:
+            pass
+        if watch:
+            watch.lap('cache')
+        return decision, reason
+
+    def close(self):
+        self.db.close()
+
+
+def open_decision_cache():
+    """DecisionCache configured by $BASH_GUARD_CACHE, or None when off or unusable.
+
+    BASH_GUARD_CACHE=1 uses default_cache_path(); any other non-empty value
+    (except 0) is the cache file path. BASH_GUARD_CACHE_SIZE caps the entries.
+    """
+    import os
+    setting = os.environ.get('BASH_GUARD_CACHE', '')
+    if setting in ('', '0'):
+        return None
+    path = default_cache_path() if setting == '1' else setting
+    try:
+        import sqlite3
+    except ImportError:
+        return None
+    try:
+        max_entries = int(os.environ.get('BASH_GUARD_CACHE_SIZE') or CACHE_MAX_ENTRIES)
+        return DecisionCache(path, max_entries)
+    except (ValueError, OSError, sqlite3.Error):
+        return None
+
+
+# --- Rule files ---
+
+# Looked up in the plugin root, ~/.claude and <project>/.claude, in that order
+RULE_FILE_NAMES = ('bash-guard.toml', 'bash-guard.json')
+# Rule file key -> (table it extends, regex flags)
+RULE_FILE_KEYS = {
+    'zero_access': ('ZERO_ACCESS_PATHS', re.IGNORECASE),
+    'deny': ('DENY_PATTERNS', re.IGNORECASE),
+    'allow': ('ALLOW_PATTERNS', 0),
+}
+# Rule file key -> protected location table it extends (plain paths, not regexes)
+RULE_FILE_LOCATION_KEYS = {
+    'zero_access_paths': 'ZERO_ACCESS_LOCATIONS',
+    'read_only_paths': 'READ_ONLY_LOCATIONS',
+    'no_delete_paths': 'NO_DELETE_LOCATIONS',
+}
+# Bump when the cached ruleset layout changes
+RULESET_SCHEMA = 5
+
+BUILTIN_RULES = {
+    'ZERO_ACCESS_PATHS': ZERO_ACCESS_PATHS,
+    'DENY_PATTERNS': DENY_PATTERNS,
+    'ALLOW_PATTERNS': ALLOW_PATTERNS,
+    'ZERO_ACCESS_LOCATIONS': ZERO_ACCESS_LOCATIONS,
+    'READ_ONLY_LOCATIONS': READ_ONLY_LOCATIONS,
+    'NO_DELETE_LOCATIONS': NO_DELETE_LOCATIONS,
+}
+# file_stamps() of the rule files the current matchers were built from
+RULES_STAMP = []
+
+
+def rule_files(project=None):
+    """Candidate rule files in merge order: plugin, user, project.
+
+    $BASH_GUARD_RULES (a os.pathsep-separated list of files; empty for
+    built-in rules only) replaces the search.
+    """
+    import os
+    setting = os.environ.get('BASH_GUARD_RULES')
+    if setting is not None:
+        return [path for path in setting.split(os.pathsep) if path]
+    plugin_root = os.environ.get('CLAUDE_PLUGIN_ROOT') or \
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    project = project or os.environ.get('CLAUDE_PROJECT_DIR') or os.getcwd()
+    dirs = [plugin_root, os.path.join(os.path.expanduser('~'), '.claude'),
+            os.path.join(project, '.claude')]
+    paths = [os.path.join(d, name) for d in dirs for name in RULE_FILE_NAMES]
+    return list(dict.fromkeys(paths))
+
+
+def file_stamps(paths):
+    """[path, mtime_ns, size] for each path that exists -- a change-detection key."""
+    import os
+    stamps = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stamps.append([path, st.st_mtime_ns, st.st_size])
+    return stamps
+
+
+def parse_rule_file(path):
+    """Validated rules one file adds, as {table: [pattern, ...]}.
+
+    Rule files are TOML (Python 3.11+) or JSON objects with optional
+    "zero_access", "deny" and "allow" lists of regexes, and
+    "zero_access_paths", "read_only_paths" and "no_delete_paths" lists of
+    protected locations. Problems are reported on stderr and the offending
+    file or pattern is skipped; patterns the lint rates as exponential are
+    rejected.
+    """
+    def warn(message):
+        print(f"bash-guard: {path}: {message}", file=sys.stderr)
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if path.endswith('.toml'):
+            try:
+                import tomllib
+            except ImportError:
+                warn("TOML rule files need Python 3.11+, skipped")
+                return {}
+            config = tomllib.loads(data.decode('utf-8'))
+        else:
+            config = json.loads(data)
+    except (OSError, ValueError) as e:
+        warn(f"unreadable, skipped ({e})")
+        return {}
+    if not isinstance(config, dict):
+        warn("not a table of rule lists, skipped")
+        return {}
+
+    rules = {}
+    for key, patterns in config.items():
+        if key not in RULE_FILE_KEYS and key not in RULE_FILE_LOCATION_KEYS:
+            warn(f"unknown key {key!r} ignored")
+            continue
+        if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+            warn(f"{key} must be a list of strings, ignored")
+            continue
+        if key in RULE_FILE_LOCATION_KEYS:
+            for location in patterns:
+                if not path_components(location) and location != '/':
+                    warn(f"{key} path {location!r} rejected: names no path")
+                    continue
+                rules.setdefault(RULE_FILE_LOCATION_KEYS[key], []).append(location)
+            continue
+        table, flags = RULE_FILE_KEYS[key]
+        for pattern in patterns:
+            errors = [message for severity, message in lint_pattern(pattern, flags)
+                      if severity == 'error']
+            if errors:
+                warn(f"{key} pattern {pattern!r} rejected: {errors[0]}")
+                continue
+            rules.setdefault(table, []).append(pattern)
+    return rules
+
+
+def build_ruleset(paths):
+    """Merge rule files onto the built-in tables and build the matchers.
+
+    Returns plain data (tables plus matcher state) that marshal can store.
+    Rule files only ever add rules: built-in deny rules cannot be removed.
+    """
+    tables = {name: list(patterns) for name, patterns in BUILTIN_RULES.items()}
+    for path in paths:
+        for table, patterns in parse_rule_file(path).items():
+            tables[table].extend(p for p in patterns if p not in tables[table])
+    tables['matchers'] = (
+        PatternSet(tables['ZERO_ACCESS_PATHS'], re.IGNORECASE).state(),
+        PatternSet(tables['DENY_PATTERNS'], re.IGNORECASE).state(),
+        AllowIndex(tables['ALLOW_PATTERNS']).state(),
+    )
+    return tables
+
+
+def read_ruleset(path, key):
+    """A cached ruleset stored under key, or None."""
+    import marshal
+    import os
+    try:
+        with open(path, 'rb') as f:
+            # A cached ruleset is as good as the rules: never trust a file others can write
+            st = os.fstat(f.fileno())
+            if st.st_mode & 0o022 or (hasattr(os, 'getuid') and st.st_uid != os.getuid()):
+                return None
+            ruleset = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return ruleset if isinstance(ruleset, dict) and ruleset.get('key') == key else None
+
+
+def write_ruleset(path, ruleset):
+    """Store a ruleset atomically, readable only by us. Failures are ignored."""
+    import marshal
+    import os
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(ruleset, f)
+        os.replace(tmp, path)
+    except (OSError, ValueError):
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def load_rules(project=None):
+    """The merged ruleset for project, or None if there are no rule files.
+
+    The ruleset is cached in the plugin data dir, keyed by the size and
+    mtime of every rule file and of this script, so an unchanged setup
+    skips parsing, validation, lint and matcher analysis. Compiled regexes
+    themselves cannot be serialized; apply_rules() still compiles them.
+    """
+    import os
+    stamps = file_stamps(rule_files(project))
+    if not stamps:
+        return None
+    import zlib
+    key = repr((RULESET_SCHEMA, sys.version, file_stamps([os.path.abspath(__file__)]), stamps))
+    name = f"rules-{zlib.crc32(repr([p for p, _, _ in stamps]).encode()):08x}.marshal"
+    path = os.path.join(plugin_data_dir(), name)
+    ruleset = read_ruleset(path, key)
+    if ruleset is None:
+        ruleset = build_ruleset([p for p, _, _ in stamps])
+        ruleset['key'] = key
+        write_ruleset(path, ruleset)
+    ruleset['stamps'] = stamps
+    return ruleset
+
+
+def apply_rules(ruleset=None):
+    """Install a load_rules() ruleset (None: built-ins only) for decide() to use."""
+    global ZERO_ACCESS_PATHS, DENY_PATTERNS, ALLOW_PATTERNS, RULES_STAMP
+    global ZERO_ACCESS_LOCATIONS, READ_ONLY_LOCATIONS, NO_DELETE_LOCATIONS
+    global ZERO_ACCESS_MATCHER, DENY_MATCHER, ALLOW_INDEX, PROTECTED_PATHS
+    tables = ruleset or BUILTIN_RULES
+    ZERO_ACCESS_LOCATIONS = tables['ZERO_ACCESS_LOCATIONS']
+    READ_ONLY_LOCATIONS = tables['READ_ONLY_LOCATIONS']
+    NO_DELETE_LOCATIONS = tables['NO_DELETE_LOCATIONS']
+    PROTECTED_PATHS = PathTrie([('zero-access', ZERO_ACCESS_LOCATIONS),
+                                ('read-only', READ_ONLY_LOCATIONS),
+                                ('no-delete', NO_DELETE_LOCATIONS)])
+    if ruleset is None:
+        ZERO_ACCESS_PATHS = BUILTIN_RULES['ZERO_ACCESS_PATHS']
+        DENY_PATTERNS = BUILTIN_RULES['DENY_PATTERNS']
+        ALLOW_PATTERNS = BUILTIN_RULES['ALLOW_PATTERNS']
+        ZERO_ACCESS_MATCHER = PatternSet(ZERO_ACCESS_PATHS, re.IGNORECASE)
+        DENY_MATCHER = PatternSet(DENY_PATTERNS, re.IGNORECASE)
+        ALLOW_INDEX = AllowIndex(ALLOW_PATTERNS)
+        RULES_STAMP = []
         return
+    ZERO_ACCESS_PATHS = ruleset['ZERO_ACCESS_PATHS']
+    DENY_PATTERNS = ruleset['DENY_PATTERNS']
+    ALLOW_PATTERNS = ruleset['ALLOW_PATTERNS']
+    zero_access, deny, allow = ruleset['matchers']
+    ZERO_ACCESS_MATCHER = PatternSet.from_state(zero_access)
+    DENY_MATCHER = PatternSet.from_state(deny)
+    ALLOW_INDEX = AllowIndex.from_state(allow)
+    RULES_STAMP = ruleset['stamps']
+
+
+def refresh_rules(project=None):
+    """Reload the rules if any rule file for project appeared, changed or went away."""
+    if file_stamps(rule_files(project)) != RULES_STAMP:
+        apply_rules(load_rules(project))
+        compile_rules()
+
+
+def compile_rules():
+    """Compile every matcher now instead of on first use (daemon and batch startup)."""
+    ZERO_ACCESS_MATCHER.compile()
+    DENY_MATCHER.compile()
+    ALLOW_INDEX.residual.compile()
+
+
+apply_rules(load_rules())
+
+
+# --- Metrics ---
+
+# Characters of the command kept in each metrics record
+METRICS_COMMAND_CHARS = 200
+# Percentiles shown by --stats
+STATS_PERCENTILES = (50, 95, 99)
+
+
+class Stopwatch:
+    """Wall time per step of one decision, for BASH_GUARD_METRICS.
 
-    # Layer 2: Check allow patterns (instant)
-    if check_allow_patterns(command):
-        output_decision("allow", "Matched safe pattern")
+    Each lap(name) adds the time since the previous lap to that step, so
+    the instrumented code only pays for a truthiness check when metrics
+    are off (watch is None).
+    """
+
+    def __init__(self):
+        import time
+        self.clock = time.perf_counter
+        self.start = self.last = self.clock()
+        self.spans = {}
+        self.segments = []
+
+    def lap(self, name):
+        now = self.clock()
+        self.spans[name] = self.spans.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def segment(self):
+        """Lap for one check_single_command(), also kept individually."""
+        now = self.clock()
+        self.segments.append(now - self.last)
+        self.spans['allow'] = self.spans.get('allow', 0.0) + now - self.last
+        self.last = now
+
+    def record(self, command, decision):
+        """One metrics record (a JSON-serializable dict) for this decision."""
+        total = self.clock() - self.start
+        import time
+        import zlib
+        return {
+            "ts": round(time.time(), 3),
+            "rules": f"{zlib.crc32(rules_fingerprint().encode()):08x}",
+            "decision": decision or "passthrough",
+            "bytes": len(command),
+            "total_us": round(total * 1e6, 1),
+            "spans_us": {name: round(t * 1e6, 1) for name, t in self.spans.items()},
+            "segments_us": [round(t * 1e6, 1) for t in self.segments],
+            "command": command[:METRICS_COMMAND_CHARS],
+        }
+
+
+def default_metrics_path():
+    import os
+    return os.path.join(plugin_data_dir(), 'metrics.jsonl')
+
+
+def metrics_path():
+    """Metrics file configured by $BASH_GUARD_METRICS, or None when off.
+
+    BASH_GUARD_METRICS=1 uses metrics.jsonl in plugin_data_dir(); any other
+    non-empty value (except 0) is the file path.
+    """
+    import os
+    setting = os.environ.get('BASH_GUARD_METRICS', '')
+    if setting in ('', '0'):
+        return None
+    return default_metrics_path() if setting == '1' else setting
+
+
+def append_metrics(path, record):
+    """Append one JSONL record. A single O_APPEND write, so concurrent hooks don't interleave."""
+    import os
+    line = (json.dumps(record) + '\n').encode('utf-8', 'surrogatepass')
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # Metrics must never break the hook
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = -(-q * len(sorted_values) // 100)
+    return sorted_values[max(rank, 1) - 1]
+
+
+def print_stats(path=None, top=10):
+    """Summarize a metrics file: latency percentiles per step, per rule set, and the slowest commands."""
+    import heapq
+    path = path or metrics_path() or default_metrics_path()
+    spans = {}
+    by_rules = {}
+    decisions = {}
+    slowest = []
+    count = 0
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    total = record["total_us"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # a torn or foreign line
+                count += 1
+                decision = record.get("decision", "?")
+                decisions[decision] = decisions.get(decision, 0) + 1
+                spans.setdefault("total", []).append(total)
+                for name, us in record.get("spans_us", {}).items():
+                    spans.setdefault(name, []).append(us)
+                spans.setdefault("allow.segment", []).extend(record.get("segments_us", []))
+                by_rules.setdefault(record.get("rules", "?"), []).append(total)
+                entry = (total, count, decision, record.get("bytes", 0), record.get("command", ""))
+                if len(slowest) < top:
+                    heapq.heappush(slowest, entry)
+                else:
+                    heapq.heappushpop(slowest, entry)
+    except OSError as e:
+        print(f"bash-guard: cannot read metrics: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{count} decisions in {path}")
+    print("  " + ", ".join(f"{name} {n}" for name, n in sorted(decisions.items())))
+
+    header = "".join(f"{f'p{q} us':>10}" for q in STATS_PERCENTILES)
+    print(f"\n  {'step':<20} {'count':>8}{header} {'max us':>10}")
+    for name, values in spans.items():
+        if not values:
+            continue
+        values.sort()
+        cells = "".join(f"{percentile(values, q):>10.1f}" for q in STATS_PERCENTILES)
+        print(f"  {name:<20} {len(values):>8}{cells} {values[-1]:>10.1f}")
+
+    if len(by_rules) > 1:
+        print(f"\n  {'rules':<20} {'count':>8}{header}")
+        for rules, values in by_rules.items():
+            values.sort()
+            cells = "".join(f"{percentile(values, q):>10.1f}" for q in STATS_PERCENTILES)
+            print(f"  {rules:<20} {len(values):>8}{cells}")
+
+    print(f"\n  slowest {len(slowest)}:")
+    for total, _, decision, size, command in sorted(slowest, reverse=True):
+        preview = command.replace('\n', '\\n')[:60]
+        print(f"  {total:>10.1f} us  {decision:<11} {size:>9} B  {preview}")
+    return 0
+
+
+# --- Audit log ---
+
+AUDIT_MAGIC = b'BGAUDIT\0'
+AUDIT_VERSION = 1
+# Rotate the log once it is this large; rotated segments are kept
+AUDIT_MAX_BYTES = 16 * 1024 * 1024
+# Decisions held in memory before a write (hook processes write once, at exit)
+AUDIT_BUFFER = 256
+# Longest a buffered decision waits in a long-running process, in seconds
+AUDIT_FLUSH_INTERVAL = 1.0
+AUDIT_DECISIONS = (None, "allow", "deny", "ask")
+# Text kinds stored in string records
+AUDIT_COMMAND, AUDIT_RULE, AUDIT_SESSION = b'c', b'r', b's'
+
+
+def audit_id(text, size):
+    """Stable id of a string: size bytes of its BLAKE2b digest, all zero for no text.
+
+    _blake2 directly, since importing hashlib (OpenSSL) alone costs more
+    than a hook call.
+    """
+    if not text:
+        return bytes(size)
+    try:
+        from _blake2 import blake2b
+    except ImportError:
+        from hashlib import blake2b
+    return blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=size).digest()
+
+
+def audit_key(kind, ident):
+    """A string record's kind and id padded to 8 bytes, as also listed in the index."""
+    return kind + ident.ljust(8, b'\0')
+
+
+class AuditLog:
+    """Append-only binary log of every decision, for BASH_GUARD_AUDIT.
+
+    The file starts with AUDIT_MAGIC and a version, then holds two kinds of
+    records:
+
+      b'S' kind(1) id(8) length(4) text   -- a command, rule or session id
+      b'D' decision(1) time(4) elapsed_us(4) command(8) rule(4) session(4)
+
+    A decision refers to its command by an 8-byte hash and to its rule (the
+    decision reason) and session by 4-byte ids. The text of each id is
+    written once per log file: <path>.idx lists the ids already written,
+    so a hook process checks one small file instead of reading the log.
+    Losing the index, or two writers racing on the same new id, only
+    repeats a string record.
+
+    Decisions are buffered and written with one O_APPEND write per flush,
+    so concurrent writers never interleave within a record. Past
+    max_bytes the log is renamed to <path>.<nanoseconds> and a new one is
+    started, with a fresh index so every segment carries its own strings.
+    """
+
+    def __init__(self, path, max_bytes=AUDIT_MAX_BYTES):
+        import time
+        self.path = path
+        self.index_path = path + '.idx'
+        self.max_bytes = max_bytes
+        self.clock = time.time
+        self.pending = []
+        self.flushed = self.clock()
+        self.fd = None
+        self.known = None
+        self.written = set()
+        self.ids = {}
+
+    def record(self, hook_input, decision, reason, elapsed):
+        """Buffer one decision; elapsed is the evaluation time in seconds."""
+        command = extract_command(hook_input)
+        session = hook_input.get('session_id') if isinstance(hook_input, dict) else None
+        self.pending.append((AUDIT_DECISIONS.index(decision), int(self.clock()),
+                             min(int(elapsed * 1e6), 0xFFFFFFFF), str(command or ''),
+                             reason or '', str(session or '')))
+        if (len(self.pending) >= AUDIT_BUFFER
+                or self.clock() - self.flushed >= AUDIT_FLUSH_INTERVAL):
+            self.flush()
+
+    def open(self):
+        """Open (creating if needed) the current log for appending."""
+        import os
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not os.path.exists(self.path):
+            # Header first, then link into place, so no writer sees a headless file
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.write(fd, AUDIT_MAGIC + AUDIT_VERSION.to_bytes(4, 'little'))
+            finally:
+                os.close(fd)
+            try:
+                os.link(tmp, self.path)
+            except FileExistsError:
+                pass  # another writer created it first
+            finally:
+                os.unlink(tmp)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.known = None
+        self.written.clear()
+        self.ids.clear()
+
+    def rotate(self):
+        """Start a new segment if the current one is full. Returns True if the log moved."""
+        import os
+        st = os.fstat(self.fd)
+        if st.st_size < self.max_bytes:
+            try:
+                # Another writer may have rotated it under us
+                return os.stat(self.path).st_ino != st.st_ino
+            except FileNotFoundError:
+                return True
+        try:
+            if os.stat(self.path).st_ino == st.st_ino:
+                import time
+                os.rename(self.path, f"{self.path}.{time.time_ns()}")
+                os.unlink(self.index_path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def is_known(self, key):
+        """True if the index lists key (kind + 8-byte id) as already in this segment."""
+        if self.known is None:
+            try:
+                with open(self.index_path, 'rb') as f:
+                    self.known = f.read()
+            except OSError:
+                self.known = b''
+        # Fixed 9-byte entries: only aligned hits count
+        pos = self.known.find(key)
+        while pos >= 0 and pos % 9:
+            pos = self.known.find(key, pos + 1)
+        return pos >= 0
+
+    def encode(self):
+        """The pending decisions as log bytes, plus their new index entries."""
+        out = []
+        index = []
+        for decision, ts, elapsed_us, command, rule, session in self.pending:
+            ids = []
+            for kind, text, size in ((AUDIT_COMMAND, command, 8), (AUDIT_RULE, rule, 4),
+                                     (AUDIT_SESSION, session, 4)):
+                ident = self.ids.get((kind, text))
+                if ident is None:
+                    ident = self.ids[kind, text] = audit_id(text, size)
+                ids.append(ident)
+                key = audit_key(kind, ident)
+                if text and key not in self.written and not self.is_known(key):
+                    data = text.encode('utf-8', 'surrogatepass')
+                    out.append(b'S' + key + len(data).to_bytes(4, 'little') + data)
+                    index.append(key)
+                    self.written.add(key)
+            out.append(b'D' + bytes((decision,)) + ts.to_bytes(4, 'little')
+                       + elapsed_us.to_bytes(4, 'little') + b''.join(ids))
+        return b''.join(out), b''.join(index)
+
+    def flush(self):
+        import os
+        self.flushed = self.clock()
+        if not self.pending:
+            return
+        try:
+            if self.fd is None:
+                self.open()
+            if self.rotate():
+                os.close(self.fd)
+                self.fd = None
+                self.open()
+            records, index = self.encode()
+            os.write(self.fd, records)
+            # After the records: a missing index entry only repeats a string later
+            if index:
+                fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(fd, index)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"bash-guard: audit log not written: {e}", file=sys.stderr)
+        self.pending.clear()
+
+    def close(self):
+        import os
+        self.flush()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def default_audit_path():
+    import os
+    return os.path.join(plugin_data_dir(), 'audit.log')
+
+
+def audit_path():
+    """Audit log configured by $BASH_GUARD_AUDIT, or None when off.
+
+    BASH_GUARD_AUDIT=1 uses audit.log in plugin_data_dir(); any other
+    non-empty value (except 0) is the file path.
+    """
+    import os
+    setting = os.environ.get('BASH_GUARD_AUDIT', '')
+    if setting in ('', '0'):
+        return None
+    return default_audit_path() if setting == '1' else setting
+
+
+def audit_segments(path):
+    """The files of an audit log, oldest first: rotated segments, then the current one."""
+    import os
+    directory, name = os.path.split(path)
+    rotated = []
+    try:
+        for entry in os.listdir(directory or '.'):
+            suffix = entry[len(name) + 1:]
+            if entry.startswith(name + '.') and suffix.isdigit():
+                rotated.append((int(suffix), os.path.join(directory, entry)))
+    except OSError:
+        pass
+    segments = [p for _, p in sorted(rotated)]
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+
+def iter_audit(path):
+    """Yield the records of one audit segment.
+
+    String records come out as ('S', kind, id, text) and decisions as
+    ('D', decision, time, elapsed_us, command_id, rule_id, session_id),
+    with decision None for passthrough. The segment is memory-mapped and
+    read in one pass. A torn record at the end (a writer that died
+    mid-write) ends the segment.
+    """
+    import mmap
+    import struct
+    string = struct.Struct('<c8sI')
+    decision = struct.Struct('<BII8s4s4s')
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file
+    with data:
+        if data[:len(AUDIT_MAGIC)] != AUDIT_MAGIC:
+            raise ValueError(f"{path} is not a bash-guard audit log")
+        pos = len(AUDIT_MAGIC) + 4
+        end = len(data)
+        while pos < end:
+            tag = data[pos:pos + 1]
+            pos += 1
+            if tag == b'S' and pos + string.size <= end:
+                kind, ident, length = string.unpack_from(data, pos)
+                pos += string.size
+                if pos + length > end:
+                    return
+                text = data[pos:pos + length].decode('utf-8', 'surrogatepass')
+                pos += length
+                yield 'S', kind, ident, text
+            elif tag == b'D' and pos + decision.size <= end:
+                code, ts, elapsed_us, command, rule, session = decision.unpack_from(data, pos)
+                pos += decision.size
+                yield 'D', AUDIT_DECISIONS[code], ts, elapsed_us, command, rule, session
+            else:
+                return
+
+
+def print_audit(path=None, top=10):
+    """Summarize an audit log: decisions, top denied rules, top passthrough commands.
+
+    Streams every segment twice and keeps only counts per id: the first
+    pass counts decisions, the second looks up the text of the ids worth
+    showing. Passthrough commands are also grouped by command name, the
+    candidates for new ALLOW_PATTERNS.
+    """
+    path = path or audit_path() or default_audit_path()
+    segments = audit_segments(path)
+    if not segments:
+        print(f"bash-guard: no audit log at {path}", file=sys.stderr)
+        return 1
+    decisions = {}
+    denied = {}
+    passthrough = {}
+    sessions = set()
+    elapsed = []
+    try:
+        for segment in segments:
+            for record in iter_audit(segment):
+                if record[0] != 'D':
+                    continue
+                _, decision, _, elapsed_us, command, rule, session = record
+                decision = decision or "passthrough"
+                decisions[decision] = decisions.get(decision, 0) + 1
+                elapsed.append(elapsed_us)
+                sessions.add(session)
+                if decision == "deny":
+                    denied[rule] = denied.get(rule, 0) + 1
+                elif decision == "passthrough":
+                    passthrough[command] = passthrough.get(command, 0) + 1
+
+        top_denied = sorted(denied.items(), key=lambda item: -item[1])[:top]
+        top_passthrough = sorted(passthrough.items(), key=lambda item: -item[1])[:top]
+        wanted = {audit_key(AUDIT_RULE, rule) for rule, _ in top_denied}
+        texts = {}
+        names = {}
+        for segment in segments:
+            for record in iter_audit(segment):
+                if record[0] != 'S':
+                    continue
+                _, kind, ident, text = record
+                key = kind + ident
+                if key in texts:
+                    continue
+                if kind == AUDIT_COMMAND and ident in passthrough:
+                    texts[key] = text
+                    commands = split_shell_commands(text)
+                    name = extract_command_name(strip_wrappers(commands[0])) if commands else ''
+                    names[name] = names.get(name, 0) + passthrough[ident]
+                elif key in wanted:
+                    texts[key] = text
+    except (OSError, ValueError) as e:
+        print(f"bash-guard: cannot read audit log: {e}", file=sys.stderr)
+        return 1
+
+    total = sum(decisions.values())
+    elapsed.sort()
+    print(f"{total} decisions from {len(sessions - {bytes(4)})} sessions in {len(segments)} file(s) at {path}")
+    print("  " + ", ".join(f"{name} {n}" for name, n in sorted(decisions.items())))
+    if elapsed:
+        cells = ", ".join(f"p{q} {percentile(elapsed, q)} us" for q in STATS_PERCENTILES)
+        print(f"  evaluation: {cells}, max {elapsed[-1]} us")
+
+    print("\n  top denied rules:")
+    for rule, count in top_denied:
+        print(f"  {count:>8}  {texts.get(audit_key(AUDIT_RULE, rule), rule.hex())}")
+    print("\n  top passthrough commands:")
+    for command, count in top_passthrough:
+        preview = texts.get(AUDIT_COMMAND + command, command.hex()).replace('\n', '\\n')[:80]
+        print(f"  {count:>8}  {preview}")
+    print("\n  passthrough by command name (ALLOW_PATTERNS candidates):")
+    for name, count in sorted(names.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {count:>8}  {name}")
+    return 0
+
+
+def open_audit_log():
+    """AuditLog for $BASH_GUARD_AUDIT, or None when auditing is off."""
+    path = audit_path()
+    return AuditLog(path) if path else None
+
+
+# --- Daemon ---
+
+def default_socket_path():
+    """Socket path shared by the daemon and scripts/bash-guard-client.py."""
+    import os
+    path = os.environ.get('BASH_GUARD_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'aiorg-bash-guard.sock')
+    tmp = os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(tmp, f'aiorg-bash-guard-{os.getuid()}', 'guard.sock')
+
+
+# Sent by the client ahead of the hook input: b'PROJECT ' + path + b'\0'
+PROJECT_HEADER = b'PROJECT '
+
+
+def read_project(stream):
+    """The project a client resolved for its rule files, or None if it sent none."""
+    import os
+    if stream.peek(len(PROJECT_HEADER))[:len(PROJECT_HEADER)] != PROJECT_HEADER:
+        return None
+    stream.read(len(PROJECT_HEADER))
+    path = bytearray()
+    while True:
+        ch = stream.read(1)
+        if not ch or ch == b'\0':
+            return os.fsdecode(bytes(path))
+        path += ch
+
+
+def serve(socket_path=None):
+    """Serve decisions over a Unix socket with the rules compiled once.
+
+    Protocol: the client sends a PROJECT_HEADER line, then the raw hook
+    input, and shuts down its write side. The reply is b'OK\\n' followed by exactly the bytes main() would
+    print (empty for no decision). Any other reply -- including the daemon
+    going away because bash-guard.py changed on disk -- tells the client to
+    evaluate in-process instead.
+
+    Rule files are re-checked on every request, for the project the client
+    would load them for in-process (its $CLAUDE_PROJECT_DIR or working
+    directory; the hook input's cwd if it sent none), and reloaded when
+    they change. Switching rulesets swaps
+    module globals, so requests are decided one at a time under a lock.
+    """
+    import os
+    import signal
+    import socket
+    import socketserver
+    import threading
+    import time
+
+    socket_path = socket_path or default_socket_path()
+    socket_dir = os.path.dirname(socket_path)
+    if socket_dir:
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+    # Refuse to start twice; clear a stale socket file left by a dead daemon
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            print(f"bash-guard daemon already running on {socket_path}", file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(socket_path)
+        finally:
+            probe.close()
+
+    script = os.path.abspath(__file__)
+    script_mtime = os.stat(script).st_mtime_ns
+    rules_lock = threading.Lock()
+    audit = open_audit_log()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            project = read_project(self.rfile)
+            hook_input = read_input(self.rfile)
+            # Never answer with rules older than the script on disk
+            if os.stat(script).st_mtime_ns != script_mtime:
+                self.wfile.write(b'STALE\n')
+                threading_shutdown()
+                return
+            try:
+                with rules_lock:
+                    refresh_rules(project or hook_input.get('cwd'))
+                    started = time.perf_counter()
+                    decision, reason = decide(hook_input)
+                    if audit:
+                        audit.record(hook_input, decision, reason, time.perf_counter() - started)
+            except Exception:
+                self.wfile.write(b'ERROR\n')
+                return
+            out = format_decision(decision, reason) + '\n' if decision else ''
+            self.wfile.write(b'OK\n' + out.encode())
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(old_umask)
+
+    def threading_shutdown(*_):
+        # shutdown() blocks until serve_forever() returns; never call it on that thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, threading_shutdown)
+    signal.signal(signal.SIGINT, threading_shutdown)
+    report_lint()
+    compile_rules()
+    print(f"bash-guard daemon listening on {socket_path}", file=sys.stderr)
+    stopped = threading.Event()
+
+    def flush_audit():
+        # Buffered decisions reach the log even while the daemon is idle
+        while not stopped.wait(AUDIT_FLUSH_INTERVAL):
+            with rules_lock:
+                audit.flush()
+
+    if audit:
+        threading.Thread(target=flush_audit, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        stopped.set()
+        if audit:
+            with rules_lock:
+                audit.close()
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+# --- Batch ---
+
+# Commands per unit of work handed to a worker process
+BATCH_CHUNK = 500
+
+
+def parse_batch_line(line):
+    """Hook input for one batch line.
+
+    Accepts a full hook input as JSON, a bare {"command": ...} object, or a
+    raw command. Lines that are not a JSON object (e.g. `{ a; b; }`) are raw
+    commands; multi-line commands need the JSON forms.
+    """
+    line = line.rstrip('\r\n')
+    if line.lstrip().startswith('{'):
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict):
+            return obj if 'tool_input' in obj else {'tool_input': obj}
+    return {'tool_input': {'command': line}}
+
+
+def evaluate_chunk(items):
+    """decide_within() over a list of hook inputs or raw command strings."""
+    budget = eval_budget()
+    return [decide_within(item if isinstance(item, dict) else {'tool_input': {'command': item}}, budget)
+            for item in items]
+
+
+def evaluate_many(items, workers=1, chunksize=BATCH_CHUNK):
+    """Yield decide()'s (decision, reason) for each hook input or raw command, in order.
+
+    Items are consumed lazily in chunks. With workers > 1 the chunks are
+    spread over a process pool, with at most 2 * workers chunks in flight,
+    so memory stays bounded however long the input is.
+    """
+    import itertools
+    items = iter(items)
+    chunks = iter(lambda: list(itertools.islice(items, chunksize)), [])
+    if workers <= 1:
+        for chunk in chunks:
+            yield from evaluate_chunk(chunk)
         return
 
-    # Layer 3: No decision -- Claude Code falls back to its default permission prompt
-    pass
+    import collections
+    import multiprocessing
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(evaluate_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def run_batch(path='-', workers=1):
+    """Evaluate one command per line of path (or stdin) and print one JSON decision per line.
+
+    Blank lines are skipped. A summary with the throughput goes to stderr.
+    """
+    import itertools
+    import os
+    import time
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    report_lint()
+    # Before the worker processes fork, so they share the compiled rules
+    compile_rules()
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+    counts = {"allow": 0, "deny": 0, "passthrough": 0}
+    start = time.perf_counter()
+    try:
+        hook_inputs = map(parse_batch_line, (line for line in source if line.strip()))
+        # tee only buffers the chunks evaluate_many() has read ahead
+        shown, evaluated = itertools.tee(hook_inputs)
+        for hook_input, (decision, reason) in zip(shown, evaluate_many(evaluated, workers)):
+            decision = decision or "passthrough"
+            counts[decision] = counts.get(decision, 0) + 1
+            sys.stdout.write(json.dumps({"decision": decision, "reason": reason or "",
+                                         "command": extract_command(hook_input)}) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    sys.stdout.flush()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    summary = ", ".join(f"{name} {count}" for name, count in counts.items())
+    print(f"bash-guard: {total} commands in {elapsed:.2f}s ({rate:,.0f} commands/s); {summary}",
+          file=sys.stderr)
+    return 0
+
+
+# --- Passthrough miner ---
+
+# Command names tracked at once; counts are exact for anything seen more
+# than total / MINE_CAPACITY times
+MINE_CAPACITY = 1000
+# Example commands kept per tracked name
+MINE_EXAMPLES = 3
+# Names seen fewer times than this are never proposed
+MINE_MIN_COUNT = 2
+# Names a rule can be proposed for: no quotes, $, globs or other shell syntax
+PROPOSABLE_NAME = r'\w[\w.+-]*'
+
+
+class SpaceSaving:
+    """Most frequent items of a stream in fixed memory (Space-Saving, Metwally et al.).
+
+    At most capacity items are counted. A new item takes the place of the
+    one with the smallest count and starts from that count, recorded as
+    its error: an item's true count lies in [count - error, count], and any
+    item making up more than 1 / capacity of the stream is always kept.
+    """
+
+    def __init__(self, capacity=MINE_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []      # one (count, item) per item; a count may lag behind self.counts
+        self.total = 0
+
+    def add(self, item, weight=1):
+        """Count item. Returns the item it replaced, if any."""
+        self.total += weight
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+            return None
+        import heapq
+        evicted = None
+        floor = 0
+        if len(counts) >= self.capacity:
+            heap = self.heap
+            # Counts only grow, so a lagging entry is re-pushed until the top is exact
+            while heap[0][0] != counts[heap[0][1]]:
+                heapq.heapreplace(heap, (counts[heap[0][1]], heap[0][1]))
+            floor, evicted = heapq.heappop(heap)
+            del counts[evicted]
+            del self.errors[evicted]
+        counts[item] = floor + weight
+        self.errors[item] = floor
+        heapq.heappush(self.heap, (counts[item], item))
+        return evicted
+
+    def top(self, n=None):
+        """[(item, count, error)] for the n largest counts, largest first."""
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+        return [(item, count, self.errors[item]) for item, count in ranked]
+
+
+def command_name(segment):
+    """The name an allow rule would have to match for segment, without path or wrappers."""
+    clean = SAFE_REDIRECT.sub('', segment.strip()).strip()
+    return extract_command_name(strip_wrappers(clean)).rsplit('/', 1)[-1]
+
+
+def name_rule(name):
+    r"""A '^(name)\b' allow rule for a command name, in the form AllowIndex looks up by name."""
+    boundary = r'\b' if is_word_char(name[-1]) else r'(?!\S)'
+    return '^(' + re.escape(name) + ')' + boundary
+
+
+def load_test_corpus(path):
+    """The (command, expected) pairs of the t() cases in a test file such as tests/test_bash_guard.py.
+
+    Only calls whose arguments are plain string literals are read; the file
+    is parsed, never run.
+    """
+    import ast
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    corpus = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 't'
+                and len(node.args) == 3
+                and all(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in node.args)):
+            corpus.append((node.args[1].value, node.args[2].value))
+    return corpus
+
+
+class PassthroughMiner:
+    """Counts which commands leave hook inputs to the user, to propose new allow rules.
+
+    Every segment that no allow rule approves is reduced to its command
+    name (command_name()); a hook input counts once for each such name.
+    Names are counted in a SpaceSaving sketch, so memory stays bounded
+    however many inputs stream through. Per tracked name it also keeps how
+    many inputs that name was the only blocker for (the prompts an allow
+    rule for it would remove outright) and a few example commands.
+    """
+
+    def __init__(self, capacity=MINE_CAPACITY):
+        self.names = SpaceSaving(capacity)
+        self.sole = {}
+        self.examples = {}
+        self.decisions = {"allow": 0, "deny": 0, "passthrough": 0}
+
+    def blocking_names(self, hook_input):
+        """Names of the command's unapproved segments; None if decide() denies or allows it.
+
+        The decision itself always comes from decide(), so the miner agrees
+        with the hook on every layer (protected paths, parse mode, oversized
+        input) and never proposes a command the hook would deny.
+        """
+        decision, _ = decide(hook_input)
+        if decision is not None:
+            self.decisions[decision] += 1
+            return None
+        self.decisions["passthrough"] += 1
+        if isinstance(hook_input, OversizedInput):
+            # Only a preview of the command is at hand
+            return []
+        return [command_name(seg) for kind, seg in iter_tokens(extract_command(hook_input), inline=False)
+                if kind == SEGMENT and not check_single_command(seg)]
+
+    def add(self, hook_input):
+        command = extract_command(hook_input)
+        if not isinstance(command, str):
+            return
+        try:
+            names = run_with_budget(eval_budget(), self.blocking_names, hook_input)
+        except BudgetExceeded:
+            self.decisions["passthrough"] += 1
+            return
+        if names is None:
+            return
+        unique = dict.fromkeys(names)
+        for name in unique:
+            evicted = self.names.add(name)
+            if evicted is not None:
+                self.sole.pop(evicted, None)
+                self.examples.pop(evicted, None)
+            if len(unique) == 1:
+                self.sole[name] = self.sole.get(name, 0) + 1
+            examples = self.examples.setdefault(name, [])
+            if len(examples) < MINE_EXAMPLES and command not in examples:
+                examples.append(command[:METRICS_COMMAND_CHARS])
+
+    def candidates(self, corpus=(), top=20):
+        """Proposed allow rules for the most frequent blocking names.
+
+        Returns [(name, count, error, sole, rule, conflicts)], most frequent
+        first. rule is None for names that can't be written as a plain rule.
+        conflicts are the corpus commands expected to be denied or prompted
+        that the allow layer would approve once rule is added; a rule with
+        conflicts is too broad to take as is.
+        """
+        global ALLOW_INDEX
+        results = []
+        for name, count, error in self.names.top():
+            if len(results) >= top:
+                break
+            if count < MINE_MIN_COUNT:
+                continue
+            rule = name_rule(name) if re.fullmatch(PROPOSABLE_NAME, name) else None
+            conflicts = []
+            if rule:
+                index = ALLOW_INDEX
+                try:
+                    ALLOW_INDEX = AllowIndex(ALLOW_PATTERNS + [rule])
+                    widened = [(cmd, expected) for cmd, expected in corpus
+                               if expected != 'allow' and check_allow_patterns(cmd)]
+                finally:
+                    ALLOW_INDEX = index
+                conflicts = [(cmd, expected) for cmd, expected in widened if not check_allow_patterns(cmd)]
+            results.append((name, count, error, self.sole.get(name, 0), rule, conflicts))
+        return results
+
+
+def default_corpus_path():
+    import os
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'test_bash_guard.py')
+
+
+def run_mine(path='-', corpus_path=None, top=20):
+    """Rank the commands behind passthrough decisions in path (or stdin) and propose allow rules.
+
+    Input lines take the same forms as --batch. Candidates are checked
+    against the deny and passthrough cases of corpus_path (by default the
+    test suite next to the script), and only conflict-free ones go into
+    the rule-file snippet printed at the end.
+    """
+    import os
+    corpus_path = corpus_path or default_corpus_path()
+    corpus = []
+    if os.path.exists(corpus_path):
+        try:
+            corpus = load_test_corpus(corpus_path)
+        except (OSError, SyntaxError, ValueError) as e:
+            print(f"bash-guard: cannot read corpus {corpus_path}: {e}", file=sys.stderr)
+            return 1
+    else:
+        print(f"bash-guard: no corpus at {corpus_path}; candidates are not checked", file=sys.stderr)
+
+    miner = PassthroughMiner()
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+    try:
+        for line in source:
+            if line.strip():
+                miner.add(parse_batch_line(line))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    counts = miner.decisions
+    print(f"{sum(counts.values())} commands: " + ", ".join(f"{name} {n}" for name, n in counts.items()))
+    tracked = len(miner.names.counts)
+    print(f"  {tracked} command names tracked (capacity {miner.names.capacity}); "
+          f"counts are upper bounds, within the error shown")
+    print(f"\n  {'prompts':>8} {'error':>6} {'only':>6}  {'name':<20} example")
+    candidates = miner.candidates(corpus, top)
+    for name, count, error, sole, _, _ in candidates:
+        example = miner.examples.get(name, [''])[0].replace('\n', '\\n')[:60]
+        print(f"  {count:>8} {error:>6} {sole:>6}  {name:<20} {example}")
+
+    accepted = []
+    print(f"\n  candidate rules (checked against {len(corpus)} test cases):")
+    for name, count, _, _, rule, conflicts in candidates:
+        if rule is None:
+            status = "skipped: not a plain command name"
+        elif conflicts:
+            cmd, expected = conflicts[0]
+            status = f"REJECTED: would approve {cmd[:50]!r} ({expected} in tests)"
+        else:
+            status = "ok"
+            accepted.append(name)
+        print(f"  {rule or name!s:<28} {status}")
+    if accepted:
+        # One rule for the plain names, like the built-in ones
+        words = [re.escape(name) for name in accepted if is_word_char(name[-1])]
+        rules = ['^(' + '|'.join(words) + r')\b'] if words else []
+        rules += [name_rule(name) for name in accepted if not is_word_char(name[-1])]
+        print("\n# bash-guard.toml")
+        print("allow = [" + ", ".join(f"'{rule}'" for rule in rules) + "]")
+    return 0
+
+
+# --- Main ---
+
+def main():
+    metrics = metrics_path()
+    watch = Stopwatch() if metrics else None
+    audit = open_audit_log()
+    hook_input = read_input()
+    if watch:
+        watch.lap('read_input')
+    command = extract_command(hook_input)
+    cache = None
+    if isinstance(command, str) and len(command) >= CACHE_MIN_LENGTH and \
+            not isinstance(hook_input, OversizedInput):
+        cache = open_decision_cache()
+    if audit:
+        import time
+        started = time.perf_counter()
+    try:
+        if isinstance(hook_input, OversizedInput):
+            # Budgeted chunk by chunk: reading and decoding take time in proportion to the size
+            decision, reason = decide_oversized(hook_input, watch, eval_budget())
+        elif cache:
+            decision, reason = run_with_budget(eval_budget(), cache.decide, hook_input, watch)
+        else:
+            decision, reason = run_with_budget(eval_budget(), decide, hook_input, watch)
+    except BudgetExceeded:
+        # No decision is the safe answer: Claude Code asks the user
+        decision, reason = None, BUDGET_REASON
+        print(f"bash-guard: {reason}", file=sys.stderr)
+    if cache:
+        cache.close()
+    if decision:
+        output_decision(decision, reason)
+    if watch:
+        watch.lap('output')
+        append_metrics(metrics, watch.record(str(command), decision))
+    if audit:
+        audit.record(hook_input, decision, reason, time.perf_counter() - started)
+        audit.close()
+
+
+def cli(argv):
+    """Entry point for the non-hook modes (bash-guard.py --daemon, --batch ...)."""
+    import argparse
+    parser = argparse.ArgumentParser(prog='bash-guard.py', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--daemon', action='store_true',
+                        help='serve decisions over a Unix socket (see bash-guard-client.py)')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='daemon socket path (default: $BASH_GUARD_SOCKET or a per-user runtime path)')
+    parser.add_argument('--batch', metavar='FILE', nargs='?', const='-',
+                        help='evaluate one hook input (JSONL) or raw command per line of FILE '
+                             '(default: stdin) and print one JSON decision per line')
+    parser.add_argument('--workers', metavar='N', type=int, default=1,
+                        help='worker processes for --batch (0 = one per CPU; default: 1)')
+    parser.add_argument('--lint', action='store_true',
+                        help='check rule files and the merged rule tables for '
+                             'catastrophic-backtracking constructs (exit 1 on exponential ones)')
+    parser.add_argument('--stats', metavar='FILE', nargs='?', const='',
+                        help='summarize a BASH_GUARD_METRICS file (default: the configured one)')
+    parser.add_argument('--mine', metavar='FILE', nargs='?', const='-',
+                        help='rank the commands behind passthrough decisions in FILE (same input '
+                             'as --batch; default: stdin) and propose allow rules')
+    parser.add_argument('--corpus', metavar='FILE',
+                        help='test file whose deny/passthrough cases --mine checks candidates '
+                             'against (default: tests/test_bash_guard.py)')
+    parser.add_argument('--audit', metavar='FILE', nargs='?', const='',
+                        help='summarize a BASH_GUARD_AUDIT log: top denied rules and '
+                             'passthrough commands (default: the configured one)')
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        return serve(args.socket)
+    if args.batch:
+        return run_batch(args.batch, args.workers)
+    if args.lint:
+        # Cached rulesets skip validation; re-check the files to show their problems
+        for path, _, _ in RULES_STAMP:
+            parse_rule_file(path)
+        errors = report_lint(verbose=True)
+        print(f"bash-guard: {len(lint_rules())} findings, {errors} errors", file=sys.stderr)
+        return 1 if errors else 0
+    if args.stats is not None:
+        return print_stats(args.stats or None)
+    if args.mine:
+        return run_mine(args.mine, args.corpus)
+    if args.audit is not None:
+        return print_audit(args.audit or None)
+    parser.print_help()
+    return 2
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     main()
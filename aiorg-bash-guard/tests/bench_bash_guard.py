@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+"""Benchmarks for aiorg-bash-guard plugin.
+
+    python3 tests/bench_bash_guard.py          # before/after comparisons of the matcher engine
+    python3 tests/bench_bash_guard.py --suite  # latency suite, gated against bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'bash-guard.py')
+CLIENT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'bash-guard-client.py')
+BASELINE = os.path.join(os.path.dirname(__file__), 'bench_baseline.json')
+
+# Built-in rules only, so timings are comparable across machines
+os.environ['BASH_GUARD_RULES'] = ''
+
+# The benchmark's own docstring: the exec below replaces __doc__ with the guard's
+USAGE = __doc__
+
+# Load hook functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+
+def per_call(fn, min_time=0.2):
+    """Return mean seconds per call of fn(), running for at least min_time."""
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / runs
+
+
+def loop_first_match(patterns, text):
+    """The per-pattern loop PatternSet replaces."""
+    for pattern in patterns:
+        if re.search(pattern, text, re.IGNORECASE):
+            return pattern
+    return None
+
+
+def bench_deny_matcher():
+    """Scan time vs. number of rules and command length (benign commands)."""
+    rules = ZERO_ACCESS_PATHS + DENY_PATTERNS
+    base = "git add . && git commit -m 'update docs' && pnpm install --frozen-lockfile && "
+
+    print("\n=== Deny matcher: per-pattern loop vs. combined alternation ===")
+    print(f"  {'rules':>5} {'bytes':>8} {'loop us':>10} {'combined us':>12} {'speedup':>8}")
+    for n_rules in (5, 10, 20, len(rules)):
+        subset = rules[:n_rules]
+        matcher = PatternSet(subset, re.IGNORECASE)
+        for length in (100, 1_000, 10_000, 100_000):
+            text = (base * (length // len(base) + 1))[:length]
+            assert matcher.first_match(text) == loop_first_match(subset, text)
+            loop = per_call(lambda: loop_first_match(subset, text))
+            combined = per_call(lambda: matcher.first_match(text))
+            print(f"  {n_rules:>5} {length:>8} {loop * 1e6:>10.1f} {combined * 1e6:>12.1f} "
+                  f"{loop / combined:>7.1f}x")
+
+
+def prefilter_first_match(prefilter, patterns, text):
+    """The combined-regex prefilter the literal scan replaces for ASCII text."""
+    if not prefilter.search(text):
+        return None
+    return loop_first_match(patterns, text)
+
+
+def bench_literal_scan():
+    """Deny scan: combined regex prefilter vs. required-literal scan, plus build cost."""
+    cases = [
+        ("short benign", "git status && pnpm test"),
+        ("100KB benign", ("git add . && git commit -m 'update docs' && " * 2500)[:100_000]),
+        ("deny hit", "cd app && terraform destroy -auto-approve"),
+        ("'sh'-heavy", ("echo shell && bash ./shim.sh | tee sha.log; " * 40)),
+    ]
+    print("\n=== Deny scan: regex prefilter vs. literal scan ===")
+    print(f"  {'case':<14} {'rules':<12} {'regex us':>10} {'literal us':>11} {'speedup':>8}")
+    for name, patterns in (("zero-access", ZERO_ACCESS_PATHS), ("deny", DENY_PATTERNS)):
+        prefilter = build_prefilter(patterns, re.IGNORECASE)
+        scan = PatternSet(patterns, re.IGNORECASE)
+        scan.compile()
+        for case, text in cases:
+            assert scan.first_match(text) == prefilter_first_match(prefilter, patterns, text)
+            regex = per_call(lambda: prefilter_first_match(prefilter, patterns, text))
+            literal = per_call(lambda: scan.first_match(text))
+            print(f"  {case:<14} {name:<12} {regex * 1e6:>10.1f} {literal * 1e6:>11.1f} "
+                  f"{regex / literal:>7.1f}x")
+
+    print(f"\n  {'build':<27} {'ms':>10}")
+    for name, patterns in (("zero-access", ZERO_ACCESS_PATHS), ("deny", DENY_PATTERNS)):
+        source = prefilter_source(patterns, re.IGNORECASE)
+        regex = per_call(lambda: (re.purge(), re.compile(source)))
+        literal = per_call(lambda: PatternSet(patterns, re.IGNORECASE).index())
+        print(f"  {name + ' combined regex':<27} {regex * 1e3:>10.2f}")
+        print(f"  {name + ' literals':<27} {literal * 1e3:>10.2f}")
+
+
+class LoopAllow:
+    """The per-pattern ALLOW_PATTERNS loop AllowIndex replaces."""
+
+    @staticmethod
+    def matches(cmd):
+        return any(re.search(pattern, cmd) for pattern in ALLOW_PATTERNS)
+
+
+def bench_allow_index():
+    """Allow-layer cost on pre-split && chains: regex loop vs. command-name index."""
+    global ALLOW_INDEX
+    commands = ["git add .", "pnpm install", "sudo npm test", ".venv/bin/python x.py",
+                "NODE_ENV=test npx jest", "docker-compose up -d", "rm -rf dist"]
+    index = ALLOW_INDEX
+
+    print("\n=== Allow index: per-pattern loop vs. command-name index ===")
+    print(f"  {'segments':>8} {'loop us':>10} {'index us':>10} {'speedup':>8}")
+    for n_segments in (1, 10, 50, 200):
+        segments = [commands[i % len(commands)] for i in range(n_segments)]
+        ALLOW_INDEX = LoopAllow
+        loop = per_call(lambda: all(check_single_command(seg) for seg in segments))
+        ALLOW_INDEX = index
+        indexed = per_call(lambda: all(check_single_command(seg) for seg in segments))
+        print(f"  {n_segments:>8} {loop * 1e6:>10.1f} {indexed * 1e6:>10.1f} {loop / indexed:>7.1f}x")
+
+
+def legacy_collapse_heredocs(command):
+    """Line-based heredoc removal lex() replaces."""
+    result = []
+    heredoc_delim = None
+    for line in command.split('\n'):
+        if heredoc_delim is not None:
+            if line.strip() == heredoc_delim:
+                heredoc_delim = None
+            continue
+        m = re.search(r'<<-?\s*\\?[\'"]?(\w+)[\'"]?\s*$', line)
+        if m:
+            heredoc_delim = m.group(1)
+            cleaned = line[:m.start()].rstrip()
+            if cleaned:
+                result.append(cleaned)
+            continue
+        result.append(line)
+    return '\n'.join(result)
+
+
+def legacy_split_shell_commands(command):
+    """Character-by-character splitter lex() replaces."""
+    segments = []
+    current = []
+    i = 0
+    in_single = in_double = in_escape = False
+    while i < len(command):
+        ch = command[i]
+        if in_escape:
+            current.append(ch)
+            in_escape = False
+        elif ch == '\\' and not in_single:
+            in_escape = True
+            current.append(ch)
+        elif ch == "'" and not in_double:
+            in_single = not in_single
+            current.append(ch)
+        elif ch == '"' and not in_single:
+            in_double = not in_double
+            current.append(ch)
+        elif not in_single and not in_double and command[i:i + 2] in ('&&', '||'):
+            seg = ''.join(current).strip()
+            if seg:
+                segments.append(seg)
+            current = []
+            i += 1
+        elif not in_single and not in_double and ch in (';', '|', '\n'):
+            seg = ''.join(current).strip()
+            if seg:
+                segments.append(seg)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    seg = ''.join(current).strip()
+    if seg:
+        segments.append(seg)
+    return segments
+
+
+def legacy_extract_inline_code(command):
+    """Per-call-compiled interpreter scan lex() replaces (first payload only)."""
+    for interp, flag in INTERPRETER_FLAGS.items():
+        m = re.search(rf'\b{re.escape(interp)}[\d.]*\s+(?:-\S+\s+)*{re.escape(flag)}\s+', command)
+        if m:
+            rest = command[m.end():]
+            if rest.startswith(("'", '"')):
+                end = find_matching_quote(rest, 1, rest[0])
+                if end > 0:
+                    return rest[1:end]
+            else:
+                m2 = re.match(r'^(\S+)', rest)
+                if m2:
+                    return m2.group(1)
+    return None
+
+
+def legacy_lex(command):
+    return (legacy_split_shell_commands(legacy_collapse_heredocs(command).strip()),
+            legacy_extract_inline_code(command))
+
+
+def heredoc_command(n_lines, n_heredocs=1):
+    """The kind of file-writing command agents produce."""
+    body = "\n".join(f"    result_{i} = compute(data['key_{i}'], \"value; with | ops && quotes\")"
+                     for i in range(n_lines))
+    parts = [f"mkdir -p src && cat > src/mod_{k}.py << 'EOF'\ndef f(data):\n{body}\nEOF"
+             for k in range(n_heredocs)]
+    return "\n".join(parts) + "\npython3 -m pytest -q && git add -A"
+
+
+def bench_lexer():
+    """Heredoc-heavy commands: collapse + split + inline scan vs. one lex() pass."""
+    cases = [
+        ("1 heredoc, 20 lines", heredoc_command(20)),
+        ("1 heredoc, 200 lines", heredoc_command(200)),
+        ("1 heredoc, 2000 lines", heredoc_command(2000)),
+        ("5 heredocs, 200 lines", heredoc_command(200, 5)),
+        ("python3 -c, 200 lines", 'python3 -c "\n' + heredoc_command(200).replace('"', "'") + '\n"'),
+        ("200-segment chain", " && ".join(["git add . ", "pnpm test", "ls -la | grep x"] * 67)),
+    ]
+
+    print("\n=== Lexer: legacy collapse/split/inline vs. lex() ===")
+    print(f"  {'case':<24} {'bytes':>8} {'legacy us':>10} {'lex us':>10} {'speedup':>8}")
+    for name, command in cases:
+        assert legacy_lex(command)[0] == [t for k, t in lex(command) if k == SEGMENT]
+        legacy = per_call(lambda: legacy_lex(command))
+        new = per_call(lambda: lex(command))
+        print(f"  {name:<24} {len(command):>8} {legacy * 1e6:>10.1f} {new * 1e6:>10.1f} "
+              f"{legacy / new:>7.1f}x")
+    print("  (legacy stops at the first inline payload; lex() scans for all of them)")
+
+
+def flat_inline_code(command):
+    """Single-level payload scan iter_inline_code() replaces: raw quoted slices, no unwrapping."""
+    for m in INLINE_FLAG.finditer(command):
+        start = m.end()
+        quote = command[start:start + 1]
+        if quote in ("'", '"'):
+            end = find_matching_quote(command, start + 1, quote)
+            if end >= 0:
+                yield command[start + 1:end]
+        else:
+            m2 = re.match(r'\S+', command[start:])
+            if m2:
+                yield m2.group()
+
+
+def nested_inline(depth, payload="rm -rf /"):
+    """payload wrapped in depth interpreter calls, quoted the way shlex would."""
+    for level in range(depth):
+        payload = ("python3 -c " if level % 2 else "bash -c ") + shlex.quote(payload)
+    return payload
+
+
+def bench_inline_extraction():
+    """Inline payloads: per-call regexes (first only) vs. flat scan vs. nested unwrapping."""
+    calls = ["python3 -c 'print(1)'", 'node -e "console.log(2)"', "bash -c 'ls -la'", "ruby -e 'p 3'"]
+    cases = [("10 calls", " && ".join(calls * 3)[:300]),
+             ("100 calls", " && ".join(calls * 25)),
+             ("1000 calls", " && ".join(calls * 250)),
+             ("nested x4", nested_inline(4)),
+             ("nested x8", nested_inline(8)),
+             ("100 x nested x3", " ; ".join([nested_inline(3)] * 100)),
+             ("100KB payload", "python3 -c '" + "x = 1; " * 14000 + "'")]
+
+    print("\n=== Inline extraction: per-call regexes vs. flat scan vs. nested ===")
+    print(f"  {'case':<16} {'bytes':>8} {'legacy us':>10} {'flat us':>9} {'nested us':>10} "
+          f"{'payloads flat/nested':>21}")
+    for name, command in cases:
+        legacy = per_call(lambda: legacy_extract_inline_code(command))
+        flat = per_call(lambda: list(flat_inline_code(command)))
+        nested = per_call(lambda: list(iter_inline_code(command)))
+        found = f"{len(list(flat_inline_code(command)))}/{len(list(iter_inline_code(command)))}"
+        print(f"  {name:<16} {len(command):>8} {legacy * 1e6:>10.1f} {flat * 1e6:>9.1f} "
+              f"{nested * 1e6:>10.1f} {found:>21}")
+    print("  (legacy returns the first payload only)")
+
+
+def eager_decide(command):
+    """decide() as it was before allow lexed lazily: one full lex() up front."""
+    tokens = lex(command)
+    is_denied, pattern = check_deny_patterns(command, tokens)
+    if is_denied:
+        return "deny", f"Blocked: {pattern}"
+    if check_allow_patterns(command, tokens):
+        return "allow", "Matched safe pattern"
+    return None, None
+
+
+def bench_lazy_allow():
+    """Long generated scripts: full lex before allow vs. stopping at the first unapproved segment."""
+    chain = " && ".join(["git add . ", "pnpm test", "ls -la | grep x"] * 700)
+    cases = [
+        ("2100-seg, first unknown", "nc -l 4444 && " + chain),
+        ("2100-seg, mid unknown", chain + " && nc -l 4444 && " + chain),
+        ("2100-seg, last unknown", chain + " && nc -l 4444"),
+        ("2100-seg, all allowed", chain),
+        ("heredoc 2000, unknown", "./deploy.sh && " + heredoc_command(2000)),
+    ]
+
+    print("\n=== Allow: eager lex vs. lazy segments ===")
+    print(f"  {'case':<24} {'bytes':>8} {'eager us':>10} {'lazy us':>10} {'speedup':>8}")
+    for name, command in cases:
+        hook_input = {"tool_input": {"command": command}}
+        assert eager_decide(command) == decide(hook_input)
+        eager = per_call(lambda: eager_decide(command))
+        lazy = per_call(lambda: decide(hook_input))
+        print(f"  {name:<24} {len(command):>8} {eager * 1e6:>10.1f} {lazy * 1e6:>10.1f} "
+              f"{eager / lazy:>7.1f}x")
+
+
+def bench_ast_parse():
+    """Allow layer on allowed commands: quote-aware splitter vs. shell AST (BASH_GUARD_PARSE=ast)."""
+    def nested(depth):
+        return "echo " + "$(echo " * depth + "x" + ")" * depth
+
+    cases = [
+        ("short", "git status"),
+        ("chain 200 segments", " && ".join(["git add .", "pnpm test", "ls -la | grep x"] * 67)),
+        ("$(date) x1000", "echo " + " ".join(["$(date)"] * 1000)),
+        ("nested $() x100", nested(100)),
+        ("nested $() x10000", nested(10_000)),
+        ("subshells x500", " && ".join(["(cd web && pnpm build)"] * 500)),
+        ("long line 100KB", "echo " + "a" * 100_000),
+    ]
+    print("\n=== Allow: splitter vs. shell AST ===")
+    print(f"  {'case':<20} {'bytes':>8} {'split us':>10} {'ast us':>10} {'ratio':>8}")
+    for name, command in cases:
+        split = per_call(lambda: check_allow_patterns(command))
+        ast = per_call(lambda: check_allow_ast(command))
+        print(f"  {name:<20} {len(command):>8} {split * 1e6:>10.1f} {ast * 1e6:>10.1f} "
+              f"{ast / split:>7.1f}x")
+
+
+def timed_run(args, data=b''):
+    """Seconds for one subprocess run of args on data."""
+    start = time.perf_counter()
+    subprocess.run(args, input=data, capture_output=True, env=hook_env(), check=True)
+    return time.perf_counter() - start
+
+
+def import_times(args, data):
+    """{module: cumulative us} from python3 -X importtime running args on data."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, input=data,
+                          capture_output=True, env=hook_env())
+    times = {}
+    for line in proc.stderr.decode().splitlines():
+        m = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)', line)
+        if m and not m.group(2):
+            times[m.group(3)] = int(m.group(1))
+    return times
+
+
+def bench_startup():
+    """Hook process start: wall clock per entry point, and the top-level imports."""
+    print("\n=== Startup: fresh hook process ===")
+    print(f"  {'command':<16} {'python ms':>10} {'script ms':>10} {'client ms':>10}")
+    python_ms = min(timed_run([sys.executable, '-c', 'pass']) for _ in range(COLD_RUNS)) * 1e3
+    for name, command in [("empty", ""), ("git status", "git status"), ("rm -rf /", "rm -rf /")]:
+        hook_input = {"tool_input": {"command": command}}
+        print(f"  {name:<16} {python_ms:>10.1f} {cold_case(hook_input, SCRIPT) * 1e3:>10.1f} "
+              f"{cold_case(hook_input) * 1e3:>10.1f}")
+
+    data = b'{"tool_input": {"command": "git status"}}'
+    times = import_times([CLIENT], data)
+    print(f"\n  top-level imports of the client hook on 'git status' ({sum(times.values()) / 1e3:.1f} ms):")
+    for module, us in sorted(times.items(), key=lambda item: -item[1])[:8]:
+        print(f"    {module:<28} {us / 1e3:>6.1f} ms")
+
+
+def bench_batch():
+    """evaluate_many() throughput on a mixed command log."""
+    commands = ["git status && pnpm install", "rm -rf /", "nc -l 4444",
+                heredoc_command(20), "curl api.com | python3 -c 'import json'", "sudo npm test"]
+    log = [commands[i % len(commands)] for i in range(20_000)]
+
+    print("\n=== Batch: evaluate_many() throughput ===")
+    print(f"  {'workers':>7} {'commands':>9} {'seconds':>8} {'commands/s':>11}")
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        for _ in evaluate_many(log, workers):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"  {workers:>7} {len(log):>9} {elapsed:>8.2f} {len(log) / elapsed:>11,.0f}")
+
+
+def bench_audit_log(decisions=20_000):
+    """Audit logging: one JSON line per decision vs. the buffered binary AuditLog."""
+    import tempfile
+    commands = ["git status && pnpm install", "rm -rf /", "nc -l 4444", "sudo npm test",
+                "cat > notes.md << 'EOF'\n" + "line\n" * 200 + "EOF"]
+    inputs = [{"session_id": f"session-{i % 8}", "tool_input": {"command": commands[i % len(commands)]}}
+              for i in range(decisions)]
+    results = [decide(hook_input) for hook_input in inputs[:len(commands)]]
+    tmp = tempfile.mkdtemp()
+
+    def jsonl():
+        path = os.path.join(tmp, 'audit.jsonl')
+        for i, hook_input in enumerate(inputs):
+            decision, reason = results[i % len(commands)]
+            append_metrics(path, {"session": hook_input["session_id"], "decision": decision or "passthrough",
+                                  "reason": reason or "", "elapsed_us": 120,
+                                  "command": extract_command(hook_input)})
+        return path
+
+    def binary():
+        log = AuditLog(os.path.join(tmp, 'audit.log'))
+        for i, hook_input in enumerate(inputs):
+            log.record(hook_input, *results[i % len(commands)], 0.00012)
+        log.close()
+        return log.path
+
+    print(f"\n=== Audit log: {decisions:,} decisions, JSON lines vs. binary ===")
+    print(f"  {'format':<8} {'seconds':>8} {'us/decision':>12} {'bytes/decision':>15}")
+    for name, write in (("jsonl", jsonl), ("binary", binary)):
+        start = time.perf_counter()
+        path = write()
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(p) for p in (path, path + '.idx') if os.path.exists(p))
+        print(f"  {name:<8} {elapsed:>8.2f} {elapsed / decisions * 1e6:>12.1f} {size / decisions:>15.1f}")
+
+
+def bench_oversized_input(sizes_mb=(10, 50)):
+    """Huge heredoc hook inputs: decoded whole vs. the bounded chunked path."""
+    import tempfile
+    import tracemalloc
+    tmp = tempfile.mkdtemp()
+    line = "print('x = \"%d\"' % i)\n"
+    print(f"\n=== Oversized input: heredoc hook inputs, limit {INPUT_LIMIT >> 20} MB ===")
+    print(f"  {'MB':>4} {'path':<8} {'seconds':>8} {'peak MB':>8}  decision")
+    for mb in sizes_mb:
+        path = os.path.join(tmp, f'{mb}.json')
+        command = "cat > big.py << 'EOF'\n" + line * ((mb << 20) // len(line)) + "EOF\n"
+        with open(path, 'w') as f:
+            json.dump({"tool_input": {"command": command}}, f)
+        del command
+        for name, limit in (("whole", os.path.getsize(path)), ("chunked", INPUT_LIMIT)):
+            with open(path, 'rb') as f:
+                tracemalloc.start()
+                start = time.perf_counter()
+                decision, _ = decide(read_input(f, limit))
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            print(f"  {mb:>4} {name:<8} {elapsed:>8.2f} {peak / (1 << 20):>8.1f}  {decision or 'passthrough'}")
+        os.unlink(path)
+
+
+def bench_miner(records=1_000_000, unique=200_000):
+    """Passthrough name counting: exact dict vs. the bounded SpaceSaving sketch."""
+    import tracemalloc
+    # Zipf-like: name k turns up about 1/k as often as name 1
+    names = [f"tool{int(unique ** (i / records * 7 % 1))}" for i in range(records)]
+
+    def exact():
+        counts = {}
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)[:10]
+
+    def sketch():
+        counter = SpaceSaving()
+        for name in names:
+            counter.add(name)
+        return [item for item, _, _ in counter.top(10)]
+
+    print(f"\n=== Passthrough miner: {records:,} names, {unique:,} distinct ===")
+    print(f"  {'counter':<12} {'seconds':>8} {'peak KB':>9} {'top-10 agree':>13}")
+    top = None
+    for name, count in (("exact dict", exact), ("SpaceSaving", sketch)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = count()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        top = top or result
+        print(f"  {name:<12} {elapsed:>8.2f} {peak / 1024:>9,.0f} {str(set(result) == set(top)):>13}")
+
+    miner = PassthroughMiner()
+    log = [{"tool_input": {"command": c}} for c in ("nc -l 4444", "git status && mytool build",
+                                                    "rm -rf /", "sudo nmap -sV host", "pnpm test")] * 4000
+    start = time.perf_counter()
+    for hook_input in log:
+        miner.add(hook_input)
+    elapsed = time.perf_counter() - start
+    print(f"  end to end: {len(log):,} hook inputs in {elapsed:.2f}s ({len(log) / elapsed:,.0f}/s)")
+
+
+# --- Latency suite ---
+
+# Allowed slowdown over the baseline before the gate fails (1.0 = twice as slow).
+# Generous on purpose: it is there to catch a rule that blows latency up, and
+# shared machines swing 1.5x between runs. Tighten with --tolerance on quiet ones.
+TOLERANCE = 1.0
+# Differences below this many microseconds are timer noise, never regressions
+NOISE_FLOOR_US = 20.0
+# Subprocess runs per cold-start case (the fastest one counts)
+COLD_RUNS = 5
+COLD_CASES = ("short allow", "heredoc 2000 lines")
+# Times a case that looks slower is re-measured before it counts as a regression
+RETRIES = 2
+
+
+def nested_quotes(depth):
+    """bash -c / python3 -c payloads nested depth levels deep, alternating quote styles."""
+    payload = "rm -rf build"
+    for level in range(depth):
+        if level % 2:
+            payload = "python3 -c " + shlex.quote(payload)
+        else:
+            payload = 'bash -c "' + payload.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return payload
+
+
+def corpus():
+    """(name, command) pairs: realistic agent traffic first, then adversarial inputs."""
+    return [
+        ("short allow", "git status"),
+        ("short deny", "rm -rf /"),
+        ("short passthrough", "nc -l 4444"),
+        ("wrapped allow", "NODE_ENV=test sudo timeout 60 npx jest --ci 2>/dev/null"),
+        ("chain 20 segments", " && ".join(["git add .", "pnpm test", "ls -la | grep x"] * 7)),
+        ("chain 200 segments", " && ".join(["git add .", "pnpm test", "ls -la | grep x"] * 67)),
+        ("heredoc 200 lines", heredoc_command(200)),
+        ("heredoc 2000 lines", heredoc_command(2000)),
+        ("inline python3 -c", 'python3 -c "' + "\n".join(f"x_{i} = compute({i}, 'k')" for i in range(200)) + '"'),
+        ("nested quotes x14", nested_quotes(14)),
+        ("long line 100KB", "echo " + "a" * 100_000),
+        ("interpreter soup 100KB", "echo " + "python bash sh node -c " * 4_000),
+        ("unclosed quote 100KB", "echo '" + "x && y; " * 12_500),
+        ("heredoc starts x2000", "cat <<EOF\n" * 2_000),
+    ]
+
+
+def calibrate():
+    """Seconds for a fixed pure-Python workload.
+
+    Measured right next to each case, so results can be compared across
+    machines and across load changes on a shared one.
+    """
+    return min(per_call(lambda: sum(i * i for i in range(10_000)), 0.02) for _ in range(3))
+
+
+def warm_case(hook_input, repeats=5):
+    """Best-of-repeats in-process decide() time."""
+    return min(per_call(lambda: decide(hook_input), 0.05) for _ in range(repeats))
+
+
+def stage_case(hook_input, runs, repeats=5):
+    """Best-of-repeats mean time per decide() stage, from the Stopwatch spans."""
+    stages = {}
+    for _ in range(repeats):
+        totals = {}
+        for _ in range(runs):
+            watch = Stopwatch()
+            decide(hook_input, watch)
+            for name, seconds in watch.spans.items():
+                totals[name] = totals.get(name, 0.0) + seconds / runs
+        for name, seconds in totals.items():
+            stages[name] = min(stages.get(name, seconds), seconds)
+    return stages
+
+
+def hook_env():
+    """Environment for a hook subprocess: no daemon, built-in rules, bytecode caching on."""
+    env = {k: v for k, v in os.environ.items()
+           if not k.startswith('BASH_GUARD_') and k != 'PYTHONDONTWRITEBYTECODE'}
+    env['BASH_GUARD_RULES'] = ''
+    env['BASH_GUARD_SOCKET'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'no-daemon.sock')
+    return env
+
+
+def cold_case(hook_input, entry=CLIENT):
+    """Fastest full hook run as a fresh subprocess, as Claude Code invokes it.
+
+    entry is the plugin's hook command (the client, evaluating in-process)
+    by default, or SCRIPT for a manual single-file install.
+    """
+    data = json.dumps(hook_input).encode()
+    return min(timed_run([sys.executable, entry], data) for _ in range(COLD_RUNS))
+
+
+def run_suite(cold=True, only=None):
+    """Measure every corpus case (or just those named in only).
+
+    Returns the machine-readable results dict.
+    """
+    results = {}
+    calibration = {}
+    cases = [(name, command) for name, command in corpus() if only is None or name in only]
+    print("\n=== Latency suite ===")
+    print(f"  {'case':<24} {'bytes':>8} {'decide us':>10}  slowest stage")
+    for name, command in cases:
+        hook_input = {"tool_name": "Bash", "tool_input": {"command": command}}
+        cal = calibrate()
+        best = warm_case(hook_input)
+        results[f"warm/{name}"] = best * 1e6
+        calibration[f"warm/{name}"] = cal * 1e6
+        cal = calibrate()
+        stages = stage_case(hook_input, runs=max(3, min(200, int(0.05 / best))))
+        for stage, seconds in stages.items():
+            results[f"stage/{name}/{stage}"] = seconds * 1e6
+            calibration[f"stage/{name}/{stage}"] = cal * 1e6
+        slowest = max(stages.items(), key=lambda item: item[1], default=("-", 0.0))
+        print(f"  {name:<24} {len(command):>8} {best * 1e6:>10.1f}  {slowest[0]} ({slowest[1] * 1e6:.1f} us)")
+
+    if cold:
+        print(f"\n  {'cold start (subprocess)':<24} {'bytes':>8} {'hook ms':>10} {'script ms':>10}")
+        for name, command in [case for case in cases if case[0] in COLD_CASES]:
+            hook_input = {"tool_name": "Bash", "tool_input": {"command": command}}
+            cal = calibrate()
+            seconds = cold_case(hook_input)
+            script_seconds = cold_case(hook_input, SCRIPT)
+            results[f"cold/{name}"] = seconds * 1e6
+            results[f"cold-script/{name}"] = script_seconds * 1e6
+            calibration[f"cold/{name}"] = calibration[f"cold-script/{name}"] = cal * 1e6
+            print(f"  {name:<24} {len(command):>8} {seconds * 1e3:>10.1f} {script_seconds * 1e3:>10.1f}")
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration_us": {key: round(us, 2) for key, us in calibration.items()},
+        "results_us": {key: round(us, 2) for key, us in results.items()},
+    }
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    """Keys whose calibration-normalized time grew by more than tolerance.
+
+    Returns a list of (key, baseline_us, current_us), with the baseline
+    scaled to the speed this run measured next to the same case.
+    """
+    regressions = []
+    for key, base_us in baseline["results_us"].items():
+        now_us = current["results_us"].get(key)
+        if now_us is None or key not in baseline["calibration_us"]:
+            continue
+        expected_us = base_us * current["calibration_us"][key] / baseline["calibration_us"][key]
+        if now_us > expected_us * (1 + tolerance) and now_us - expected_us > NOISE_FLOOR_US:
+            regressions.append((key, expected_us, now_us))
+    return regressions
+
+
+def keep_fastest(results, retry):
+    """Merge a re-measurement into results, keeping the faster calibrated time per key."""
+    for key, us in retry["results_us"].items():
+        cal = retry["calibration_us"][key]
+        if key not in results["results_us"] or \
+                us / cal < results["results_us"][key] / results["calibration_us"][key]:
+            results["results_us"][key] = us
+            results["calibration_us"][key] = cal
+
+
+def suite_main(args):
+    results = run_suite(cold=not args.no_cold)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Shared machines are noisy: only a slowdown that reproduces counts
+        for _ in range(RETRIES):
+            regressions = compare(results, baseline, args.tolerance)
+            if not regressions:
+                break
+            names = {key.split('/')[1] for key, _, _ in regressions}
+            print(f"\nRe-measuring {len(names)} slower-looking cases: {', '.join(sorted(names))}")
+            retry = run_suite(cold=any(key.startswith('cold/') for key, _, _ in regressions), only=names)
+            keep_fastest(results, retry)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"\n{'='*50}")
+    if regressions:
+        print(f"{len(regressions)} latency regressions (> {args.tolerance:.0%} over baseline):")
+        for key, expected_us, now_us in regressions:
+            print(f"  {key}: {expected_us:.1f} -> {now_us:.1f} us ({now_us / expected_us:.1f}x)")
+        return 1
+    print(f"No latency regressions (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=USAGE.strip().split('\n')[0])
+    parser.add_argument('--suite', action='store_true',
+                        help='run the latency suite and compare against the baseline')
+    parser.add_argument('--json', metavar='FILE', help='write suite results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', default=BASELINE,
+                        help='baseline results (default: tests/bench_baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f'allowed slowdown before failing (default: {TOLERANCE})')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store this run as the new baseline instead of comparing')
+    parser.add_argument('--no-cold', action='store_true', help='skip the subprocess cold-start cases')
+    args = parser.parse_args()
+
+    if args.suite:
+        sys.exit(suite_main(args))
+    bench_deny_matcher()
+    bench_literal_scan()
+    bench_allow_index()
+    bench_lexer()
+    bench_inline_extraction()
+    bench_lazy_allow()
+    bench_ast_parse()
+    bench_startup()
+    bench_batch()
+    bench_audit_log()
+    bench_miner()
+    bench_oversized_input()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Property-based fuzzing for aiorg-bash-guard plugin.
+
+    python3 tests/fuzz_bash_guard.py                  # 20,000 random commands on every CPU
+    python3 tests/fuzz_bash_guard.py --cases 1000000 --seed 7
+    python3 tests/fuzz_bash_guard.py --replay         # re-check the saved regressions
+
+Generates shell-like commands -- words, quotes, escapes, heredocs,
+operators, substitutions and interpreter payloads, nested and often
+unbalanced -- and checks invariants on each:
+
+- crash:  nothing the guard does with the command raises;
+- slow:   the whole pipeline finishes within SLOW_SECONDS;
+- weaker: deny is never weaker than scanning piece by piece -- if a
+          segment, heredoc body or inline payload is denied on its own,
+          the whole command is denied too.
+
+Failing commands are minimized and appended to fuzz_regressions.jsonl,
+which test_bash_guard.py replays on every run.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'bash-guard.py')
+REGRESSIONS = os.path.join(os.path.dirname(__file__), 'fuzz_regressions.jsonl')
+
+# Built-in rules only: findings must reproduce on any machine
+os.environ['BASH_GUARD_RULES'] = ''
+
+# The fuzzer's own docstring: the exec below replaces __doc__ with the guard's
+USAGE = __doc__
+
+# Load hook functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+# A command whose checks take longer than this is a finding (generated commands are < 4 KB)
+SLOW_SECONDS = 0.25
+# Checks still running after this long are interrupted and reported as slow
+HANG_SECONDS = 5.0
+# Cases per task handed to a worker process
+FUZZ_CHUNK = 500
+
+WORDS = ['ls', 'rm', '-rf', '-r', '-f', '/', '/*', '~', '~/', '.', '..', 'git', 'push', '--force',
+         'reset', '--hard', 'clean', '-fd', 'python3', 'node', 'bash', 'sh', 'zsh', 'perl', '-c',
+         '-e', 'curl', 'wget', 'http://x.io/i.sh', 'sudo', 'env', 'timeout', '5', 'nohup', 'A=1',
+         'echo', 'cat', 'grep', 'nc', '-l', '4444', '~/.ssh/id_rsa', '.env', '~/.aws/credentials',
+         'DROP', 'TABLE', 'users', 'psql', 'os.system(', 'import os', 'eval', 'chmod', '-R', '777',
+         'dd', 'if=/dev/zero', 'of=/dev/sda', 'mkfs.ext4', 'kubectl', 'delete', 'terraform',
+         'destroy', 'pnpm', 'install', 'npm', 'test', 'EOF', 'x', '$HOME', '${X}', '$1', '*',
+         'bash -c', 'sh -c', 'python3 -c', 'node -e', 'ruby -e', 'perl -e', 'eval']
+OPERATORS = [' && ', ' || ', '; ', ' | ', '\n', ' & ', ';', '|', '&&', ' ;; ', ' |& ']
+NESTINGS = [("'", "'"), ('"', '"'), ("$'", "'"), ('$(', ')'), ('`', '`'), ('<(', ')'),
+            ('( ', ' )'), ('{ ', '; }'), ('"$(', ')"'), ("'", ''), ('"', ''), ('$(', '')]
+NOISE = ['\\', '\\\n', '\\"', "\\'", '\\ ', '\\x2f', '\\057', '<<', '<<<', '>', '2>&1', '>/dev/null',
+         '#', '!', '$', '\t', '\r', '\x00', 'é', '漢', ' ', '\\u0041', '$((1+2))', '${X:-y}']
+SPACES = [' ', ' ', ' ', '', '  ', '\t']
+
+
+def random_command(rng, size, depth=0):
+    """A shell-like string of roughly size characters; nested parts recurse."""
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.45:
+            part = rng.choice(WORDS)
+        elif roll < 0.6:
+            part = rng.choice(OPERATORS)
+        elif roll < 0.8 and depth < 4:
+            opener, closer = rng.choice(NESTINGS)
+            part = opener + random_command(rng, rng.randint(1, size // 2 + 1), depth + 1) + closer
+        elif roll < 0.85:
+            delim = rng.choice(['EOF', 'PY', 'END'])
+            quote = rng.choice(['', "'", '"', '\\'])
+            body = random_command(rng, rng.randint(1, size // 2 + 1), depth + 1)
+            closing = rng.choice([delim, '  ' + delim, delim + 'X', ''])
+            part = f"{rng.choice(['cat', 'python3', 'bash', 'cat > f'])} <<{rng.choice(['', '-', ' '])}" \
+                   f"{quote}{delim}{quote.strip(chr(92))}\n{body}\n{closing}\n"
+        else:
+            part = rng.choice(NOISE)
+        parts.append(part)
+        parts.append(rng.choice(SPACES))
+        length += len(part) + 1
+    return ''.join(parts)
+
+
+def case_command(seed, index, size):
+    """The command of case index in the run with this seed -- the same on every machine."""
+    rng = random.Random(f"{seed}:{index}")
+    return random_command(rng, rng.randint(1, size))
+
+
+def pieces(command):
+    """The parts of command the deny layer must also catch when they stand alone."""
+    seen = set()
+    for kind, text in lex(command):
+        if kind in (SEGMENT, HEREDOC, INLINE) and text not in seen:
+            seen.add(text)
+            yield kind, text
+    for text in split_shell_commands(collapse_heredocs(command)):
+        if text not in seen:
+            seen.add(text)
+            yield SEGMENT, text
+    # Commands nested in $(...), backticks, subshells and groups
+    for kind, segments, children in parse_shell(command) or ():
+        for text in segments:
+            if text not in seen:
+                seen.add(text)
+                yield kind, text
+
+
+def exercise(command):
+    """Run every scanner and both allow modes over command; return the deny verdict."""
+    split_shell_commands(command)
+    collapse_heredocs(command)
+    for i, ch in enumerate(command[:200]):
+        if ch in '\'"':
+            find_matching_quote(command, i + 1, ch)
+    list(iter_inline_code(command))
+    parse_shell(command)
+    check_allow_ast(command)
+    decide({"tool_input": {"command": command}})
+    return check_deny_patterns(command)[0]
+
+
+def check_invariants(command):
+    """Return a list of (kind, detail) findings for command; empty if it holds up."""
+    start = time.perf_counter()
+    try:
+        denied = run_with_budget(HANG_SECONDS, exercise, command)
+    except BudgetExceeded:
+        return [('slow', f"still running after {HANG_SECONDS:.0f}s")]
+    except Exception as e:
+        return [('crash', f"{type(e).__name__}: {e}")]
+    elapsed = time.perf_counter() - start
+    if elapsed > SLOW_SECONDS:
+        return [('slow', f"{elapsed * 1000:.0f} ms")]
+
+    if denied:
+        return []
+    for kind, text in pieces(command):
+        is_denied, pattern = check_deny_patterns(text)
+        if is_denied:
+            return [('weaker', f"{kind} {text[:80]!r} is denied alone ({pattern})")]
+    return []
+
+
+def minimize(command, kind):
+    """Shrink command while it still shows a finding of this kind (delta debugging).
+
+    Removes ever smaller runs of characters, keeping each removal that
+    preserves the finding, until no single character can go.
+    """
+    def fails(text):
+        return any(k == kind for k, _ in check_invariants(text))
+
+    step = max(1, len(command) // 2)
+    while True:
+        i = 0
+        while i < len(command):
+            candidate = command[:i] + command[i + step:]
+            if candidate and fails(candidate):
+                command = candidate
+            else:
+                i += step
+        if step == 1:
+            return command
+        step = max(1, step // 2)
+
+
+def fuzz_chunk(task):
+    """Worker: check cases [first, first + count) of a run; return the failing ones."""
+    seed, first, count, size = task
+    found = []
+    for index in range(first, first + count):
+        command = case_command(seed, index, size)
+        for kind, detail in check_invariants(command):
+            found.append((index, command, kind, detail))
+    return found
+
+
+def load_regressions(path=REGRESSIONS):
+    """Saved findings as dicts (kind, command, detail, seed, case); [] if there are none."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_regression(record, path=REGRESSIONS):
+    """Append a minimized finding unless the same command is already saved."""
+    if any(r['command'] == record['command'] for r in load_regressions(path)):
+        return False
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return True
+
+
+def replay(path=REGRESSIONS):
+    """Re-check every saved finding; return how many still fail."""
+    failing = 0
+    records = load_regressions(path)
+    for record in records:
+        found = check_invariants(record['command'])
+        if found:
+            failing += 1
+            print(f"  FAIL {record['kind']}: {record['command'][:60]!r}: {found[0][1]}")
+    print(f"{len(records) - failing}/{len(records)} saved regressions pass")
+    return failing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=USAGE.strip().split('\n')[0])
+    parser.add_argument('--cases', type=int, default=20_000, help='commands to generate (default: 20000)')
+    parser.add_argument('--seed', type=int, help='run seed (default: the current time); printed to reproduce a run')
+    parser.add_argument('--size', type=int, default=400, help='longest command in characters (default: 400)')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes (0 = one per CPU; default: 0)')
+    parser.add_argument('--no-save', action='store_true', help=f'do not append findings to {os.path.basename(REGRESSIONS)}')
+    parser.add_argument('--replay', action='store_true', help='only re-check the saved regressions')
+    args = parser.parse_args()
+
+    report_lint()
+    if args.replay:
+        sys.exit(1 if replay() else 0)
+
+    seed = args.seed if args.seed is not None else int(time.time())
+    workers = args.workers or os.cpu_count() or 1
+    tasks = [(seed, first, min(FUZZ_CHUNK, args.cases - first), args.size)
+             for first in range(0, args.cases, FUZZ_CHUNK)]
+    print(f"Fuzzing {args.cases:,} commands (seed {seed}, {workers} workers)")
+
+    # Before the workers fork, so they share the compiled rules
+    compile_rules()
+    start = time.perf_counter()
+    found = []
+    if workers == 1:
+        for task in tasks:
+            found.extend(fuzz_chunk(task))
+    else:
+        import multiprocessing
+        with multiprocessing.Pool(workers) as pool:
+            for result in pool.imap_unordered(fuzz_chunk, tasks):
+                found.extend(result)
+    elapsed = time.perf_counter() - start
+    print(f"  {args.cases:,} commands in {elapsed:.1f}s ({args.cases / elapsed:,.0f}/s), "
+          f"{len(found)} findings")
+
+    # One minimized example per kind and detail is enough to act on
+    seen = set()
+    for index, command, kind, detail in sorted(found):
+        small = minimize(command, kind)
+        findings = check_invariants(small)
+        key = (kind, findings[0][1] if findings else detail)
+        if key in seen:
+            continue
+        seen.add(key)
+        print(f"  {kind}: case {index}: {small!r}")
+        print(f"        {key[1]}")
+        if not args.no_save:
+            save_regression({"kind": kind, "command": small, "detail": key[1], "seed": seed, "case": index})
+    sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
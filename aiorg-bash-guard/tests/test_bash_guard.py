@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
 """Tests for aiorg-bash-guard plugin."""
 
+import contextlib
+import importlib.util
+import io
+import json
+import marshal
 import os
+import shlex
+import signal
+import socket
+import subprocess
 import sys
+import tempfile
+import time
 
 SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'bash-guard.py')
+CLIENT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'bash-guard-client.py')
+
+# Built-in rules only: a developer's own rule files must not change results
+os.environ['BASH_GUARD_RULES'] = ''
 
 # Load hook functions directly
 with open(SCRIPT) as f:
@@ -33,6 +48,29 @@ def test(name, command, expected):
     return status == "PASS"
 
 
+def reference_deny(command):
+    """Original one-re.search-per-rule deny loop, kept as the parity oracle."""
+    for pattern in ZERO_ACCESS_PATHS:
+        if re.search(pattern, command, re.IGNORECASE):
+            return True, f"zero-access path ({pattern})"
+    for pattern in DENY_PATTERNS:
+        if re.search(pattern, command, re.IGNORECASE):
+            return True, pattern
+    inline_code = extract_inline_code(command)
+    if inline_code:
+        for pattern in DENY_PATTERNS:
+            if re.search(pattern, inline_code, re.IGNORECASE):
+                return True, f"inline code: {pattern}"
+    return False, None
+
+
+def run_hook(script, command, env=None):
+    """Run a hook script as Claude Code would; return its stdout bytes."""
+    hook_input = json.dumps({"tool_name": "Bash", "tool_input": {"command": command}})
+    return subprocess.run([sys.executable, script], input=hook_input.encode(),
+                          capture_output=True, env=env, timeout=30).stdout
+
+
 def main():
     passed = 0
     failed = 0
@@ -44,6 +82,15 @@ def main():
         else:
             failed += 1
 
+    def check(name, ok):
+        nonlocal passed, failed
+        if ok:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+
     # ======================================================
     # LAYER 1: DENY PATTERNS
     # ======================================================
@@ -281,6 +328,1033 @@ EOF"""
     t("safe + unknown",    "git status && nc -l 4444",     "passthrough")
     t("redirect dev null", "git status 2>/dev/null",       "allow")
 
+    # ======================================================
+    # MATCHER ENGINE
+    # ======================================================
+
+    def same(name, command):
+        nonlocal passed, failed
+        expected = reference_deny(command)
+        got = check_deny_patterns(command)
+        if got == expected:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+            print(f"        command:  {command[:100]}")
+            print(f"        expected: {expected}")
+            print(f"        got:      {got}")
+
+    print("\n=== Combined matcher matches per-pattern loop ===")
+    same("benign",            "git status && pnpm install")
+    same("single deny",       "terraform destroy")
+    same("later rule first",  "redis-cli FLUSHALL && rm -rf /")
+    same("zero-access wins",  "terraform destroy ~/.aws/credentials")
+    same("two zero-access",   "cat firebase-adminsdk.json .ssh/id_rsa")
+    same("case insensitive",  "drop database prod")
+    same("unicode case fold", "cat \u017ferviceAccount.json && \u212aubectl delete namespace x")
+    same("inline code",       "python3 -c 'import os; os.system(\"mkfs.ext4 /dev/sda\")'")
+    same("empty",             "")
+    same("many segments",     " && ".join(["git status"] * 200 + ["gh repo delete x"]))
+    same("mixed case literal", "CAT ~/.SSH/Id_rsa")
+    same("literal, no match", "echo terraform && echo -rf")
+    same("kelvin in path",    "cat ~/.Kube/config")
+    same("long s in path",    "cat ~/.ſſh/id_rsa")
+    same("dotted I",          "İterraform destroy")
+    same("non-ascii benign",  "echo café && git status")
+
+    print("\n=== Required literals ===")
+    check("plain run",         required_literals(r'\.ssh/') == ('.ssh/',))
+    check("longest run",       required_literals(r'\brm\s+-rf\s+/') == ('-rf',))
+    check("lowercased",        required_literals('DROP DATABASE', re.I) == ('drop database',))
+    check("one per branch",    required_literals(r'\|\s*(bash|sh)\b') == ('bash', 'sh'))
+    check("branch beats short", required_literals(r'x(abcd|efgh)') == ('abcd', 'efgh'))
+    check("repeat at least 1", required_literals(r'(ab)+') == ('ab',))
+    check("optional skipped",  required_literals(r'(ab)?') is None)
+    check("branch w/o literal", required_literals(r'(abc|\d+)') is None)
+    check("non-ascii skipped", required_literals('é') is None)
+    check("no literal",        required_literals(r'\w+\s*') is None)
+
+    print("\n=== Literal scan ===")
+    patterns = [r'\bfoo\d', r'(bar|baz)z', r'\d{3}', r'qu+x']
+    scan = PatternSet(patterns, re.IGNORECASE)
+    oracle = lambda text: next((p for p in patterns if re.search(p, text, re.I)), None)
+    for text in ["", "nothing here", "FOO1", "xfoo1", "barz foo1", "123", "QUUX", "ba z",
+                 "bazź", "Kquux", "föo1 barz"]:
+        check(f"matches loop: {text!r}", scan.first_match(text) == oracle(text))
+    lazy = PatternSet(patterns[:2] + patterns[3:], re.I)
+    lazy.first_match("ls -la")
+    check("benign runs no regex", lazy.compiled == [None, None, None])
+    lazy.first_match("echo barz")
+    check("only candidates run",  [c is not None for c in lazy.compiled] == [False, True, False])
+    restored = PatternSet.from_state(marshal.loads(marshal.dumps(lazy.state())))
+    check("state round trip",  (restored.literals, restored.source) == (lazy.literals, lazy.source)
+          and restored.first_match("xx BAZZ") == lazy.first_match("xx BAZZ") == r'(bar|baz)z')
+
+    def allow_same(name, segment):
+        nonlocal passed, failed
+        expected = any(re.search(p, segment) for p in ALLOW_PATTERNS)
+        got = ALLOW_INDEX.matches(segment)
+        if got == expected:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+            print(f"        segment:  {segment[:100]}")
+            print(f"        expected: {expected}")
+            print(f"        got:      {got}")
+
+    print("\n=== Allow index matches allow regexes ===")
+    allow_same("plain name",        "git status")
+    allow_same("name prefix only",  "gitx status")
+    allow_same("\\b after word",     "git-lfs pull")
+    allow_same("optional char",     "python script.py")
+    allow_same("optional char 3",   "python3.11 -m venv .venv")
+    allow_same("not optional",      "python4 x")
+    allow_same("compound name",     "docker-compose up")
+    allow_same("compound redis",    "redis-cli ping")
+    allow_same("redis alone",       "redis x")
+    allow_same("g++ no boundary",   "g++ main.c")
+    allow_same("g++ boundary",      "g++main.c")
+    allow_same("sha256sum",         "sha256sum file")
+    allow_same("systemctl status",  "systemctl status nginx")
+    allow_same("systemctl restart", "systemctl restart nginx")
+    allow_same("dot source",        ". ./env.sh")
+    allow_same("escaped source",    "\\source ./env.sh")
+    allow_same("comment",           "# note")
+    allow_same("test bracket",      "[ -f x ]")
+    allow_same("rm cleanup",        "rm -rf dist")
+    allow_same("rm single",         "rm file.txt")
+    allow_same("unknown",           "nc -l 4444")
+    allow_same("unicode word",      "ls\u00e9 x")
+    allow_same("empty",             "")
+
+    # ======================================================
+    # LEXER
+    # ======================================================
+
+    def kinds(command, kind):
+        return [text for k, text in lex(command) if k == kind]
+
+    print("\n=== Lexer tokens ===")
+    check("segments",          kinds("git add . && git commit -m 'a && b' | tail", SEGMENT)
+          == ["git add .", "git commit -m 'a && b'", "tail"])
+    check("operators",         kinds("a && b || c; d | e\nf", OPERATOR) == ["&&", "||", ";", "|", "\n"])
+    check("escaped operator",  kinds("echo a\\;b", SEGMENT) == ["echo a\\;b"])
+    check("heredoc body",      kinds("cat > f << 'EOF'\nx && y\n  EOF\nls", HEREDOC) == ["x && y"])
+    check("heredoc segments",  kinds("cat > f << 'EOF'\nx && y\nEOF\nls", SEGMENT) == ["cat > f", "ls"])
+    check("unclosed heredoc",  kinds("python3 <<EOF\nprint(1)", HEREDOC) == ["print(1)"])
+    check("inline payloads",   kinds("python3 -c 'a' && node -e \"b\"", INLINE) == ["a", "b"])
+    check("nested payload",    kinds("bash -c 'python3 -c \"x\"'", INLINE) == ['python3 -c "x"', 'x'])
+    check("multiline quote",   kinds('python3 -c "\nimport os\n" | jq .', SEGMENT)
+          == ['python3 -c "\nimport os\n"', "jq ."])
+    check("split wrapper",     split_shell_commands("a; b") == ["a", "b"])
+    check("collapse wrapper",  collapse_heredocs("cat <<EOF\nbody\nEOF\nls") == "cat\nls")
+    t("second payload denied", "python3 -c 'print(1)' && bash -c 'rm -rf /'", "deny")
+
+    print("\n=== Nested inline code ===")
+    check("word: quotes joined",   shell_word("a'b c'\"d e\" f", 0) == ("ab cd e", 11))
+    check("word: double escapes",  shell_word(r'"\"x\" \$HOME \n"', 0)[0] == r'"x" $HOME \n')
+    check("word: ANSI-C",          shell_word(r"$'a\x2fb\057\n\'c'", 0)[0] == "a/b/\n'c")
+    check("word: escaped space",   shell_word(r"rm\ -rf\ / && ls", 0) == ("rm -rf /", 10))
+    check("word: unterminated",    shell_word("'abc", 0) == ("abc", 4))
+    check("breadth first",         list(iter_inline_code("bash -c 'sh -c \"a\"' && node -e 'b'"))
+                                   == ['sh -c "a"', 'b', 'a'])
+    chain = " && ".join(f"python3 -c 'print({i})'" for i in range(2000))
+    check("every call in a chain", len(list(iter_inline_code(chain))) == 2000)
+    payload = "rm -rf /"
+    for level in range(INLINE_DEPTH + 2):
+        payload = "bash -c " + shlex.quote(payload)
+    check("depth limit",           len(list(iter_inline_code(payload))) == INLINE_DEPTH
+                                   and len(list(iter_inline_code(payload, depth=2))) == 2)
+    t("escaped nested quotes",     r'bash -c "bash -c \"rm -rf /\""',          "deny")
+    t("ANSI-C payload",            r"bash -c $'rm -rf \x2f'",                  "deny")
+    t("escaped-space payload",     r"sh -c rm\ -rf\ /",                       "deny")
+    t("three interpreters deep",   r"""sh -c "python3 -c \"import os; os.system('bash -c \\\"rm -rf /\\\"')\"" """, "deny")
+    check("nested benign payloads", not check_deny_patterns(
+        "bash -c 'python3 -c \"print(1)\"' && node -e 'console.log(2)'")[0])
+
+    lazy = "nc -l 4444 && git status && cat <<EOF\nbody\nEOF\npython3 -c 'x'"
+    check("generator matches lex",  list(iter_tokens(lazy)) == lex(lazy))
+    check("generator without inline", list(iter_tokens(lazy, inline=False)) == lex(lazy)[:-1])
+    tokens = iter_tokens(lazy)
+    check("allow stops early",      not check_allow_patterns(lazy, tokens)
+                                    and next(tokens) == (OPERATOR, "&&"))
+    t("deny after unknown segment", "nc -l 4444 && " + "ls && " * 2000 + "rm -rf /", "deny")
+    t("inline deny after unknown", "nc -l 4444 && python3 -c \"os.system('rm -rf /')\"", "deny")
+    check("heredoc bodies skipped", list(iter_tokens(lazy, bodies=False))
+                                    == [tok for tok in lex(lazy) if tok[0] != HEREDOC])
+
+    # ======================================================
+    # OVERSIZED INPUT
+    # ======================================================
+
+    class GeneratedInput(io.RawIOBase):
+        """Hook input made of head + body * count + tail, produced as it is read."""
+
+        def __init__(self, head, body, count, tail):
+            self.parts = iter([head] + [body] * count + [tail])
+            self.buf = b''
+
+        def readable(self):
+            return True
+
+        def readinto(self, b):
+            if not self.buf:
+                self.buf = next(self.parts, b'')
+            n = min(len(b), len(self.buf))
+            b[:n] = self.buf[:n]
+            self.buf = self.buf[n:]
+            return n
+
+    def heredoc_input(line, size, tail=''):
+        """A hook input writing a size-byte heredoc of line, then running tail."""
+        body = json.dumps(line)[1:-1].encode()
+        block = body * (65536 // len(body))
+        head = b'{"session_id": "s1", "cwd": "/tmp/p", "tool_input": {"command": ' + \
+            json.dumps("cat > big.py << 'EOF'\n")[:-1].encode()
+        tail = json.dumps("EOF\n" + tail)[1:].encode() + b'}}'
+        return io.BufferedReader(GeneratedInput(head, block, size // len(block), tail))
+
+    def traced_peak(fn, *args):
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            result = fn(*args)
+            return result, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def joined(hook_input):
+        # A surrogate pair split between two chunks comes back as its two halves
+        return ''.join(hook_input.chunks()).encode('utf-16', 'surrogatepass').decode('utf-16')
+
+    print("\n=== Oversized input ===")
+    small = json.dumps({"session_id": "s1", "cwd": "/p", "tool_input": {"command": "ls -la"}}).encode()
+    check("small input decoded whole", read_input(io.BytesIO(small)) == json.loads(small))
+    check("malformed input is empty", read_input(io.BytesIO(b'{"tool_input": ')) == {})
+    big = json.dumps({"session_id": "s1", "cwd": "/p", "tool_input": {"command": "ls " + "x" * 9000}}).encode()
+    oversized = read_input(io.BytesIO(big), limit=100)
+    check("oversized input kept lazy",  isinstance(oversized, OversizedInput)
+          and oversized.get('cwd') == "/p" and oversized.get('session_id') == "s1")
+    check("oversized preview",          ("ls " + "x" * 9000).startswith(extract_command(oversized))
+                                        and extract_command(oversized).startswith("ls x"))
+    commands = ['plain', 'q"uo\\te\\', 'tab\t\nnl\r', 'é漢😀 \x01 ', 'a' * 50 + '\\u0041']
+    saved = SCAN_CHUNK
+    try:
+        decoded = []
+        for chunk in (1, 2, 3, 5, 7, 11):
+            globals()['SCAN_CHUNK'] = chunk
+            for command in commands:
+                for ascii_only in (True, False):
+                    raw = json.dumps({"tool_input": {"command": command}, "after": "x"},
+                                     ensure_ascii=ascii_only).encode()
+                    decoded.append(joined(read_input(io.BytesIO(raw), limit=30)) == command)
+        check("chunk boundaries decode exactly", all(decoded))
+        raw = json.dumps({"tool_input": {"command": "x" * 1000 + "; rm -rf / ;" + "y" * 1000}}).encode()
+        check("deny across chunk boundary",
+              decide(read_input(io.BytesIO(raw), limit=64))[0] == "deny")
+    finally:
+        globals()['SCAN_CHUNK'] = saved
+    check("no command string scanned raw",
+          decide(read_input(io.BytesIO(b'{"tool_input": {"cmd": "rm -rf / ; ' + b'x' * 200 + b'"}}'),
+                            limit=64))[0] == "deny")
+    stream = io.BytesIO(big)
+    decision, reason = decide(read_input(stream, limit=100))
+    check("oversized asks",              decision == "ask" and "Input truncated" in reason
+                                         and str(len(big)) in reason)
+    check("oversized input drained",     stream.read() == b'')
+    decision, reason = decide(read_input(heredoc_input("x\n", 1 << 20, "rm -rf /"), limit=4096))
+    check("oversized deny says chunks",  decision == "deny" and "checked in chunks" in reason)
+    for name, tail in [("oversized write to /etc", "cp x /etc/hosts"),
+                       ("oversized write to ~/.bashrc", "echo x >> ~/.bashrc"),
+                       ("oversized path from cwd", "touch ../../etc/hosts")]:
+        decision, reason = decide(read_input(heredoc_input("x\n", 1 << 20, tail), limit=4096))
+        check(name,                      decision == "deny" and "path (" in reason)
+    check("hook reports truncation",     b'"ask"' in run_hook(SCRIPT, "ls " + "x" * 200,
+                                                             dict(os.environ, BASH_GUARD_MAX_INPUT='64')))
+    check("client reports truncation",  b'"ask"' in run_hook(CLIENT, "ls " + "x" * 200,
+                                                             dict(os.environ, BASH_GUARD_MAX_INPUT='64')))
+    line = "print('x = \"%d\"' % i)\n"
+
+    def client_run(size, tail=''):
+        """Hook output and peak RSS (MB) of the client on a size-byte heredoc input."""
+        probe = ("import resource, runpy, sys; sys.argv = sys.argv[1:]; "
+                 "runpy.run_path(sys.argv[0], run_name='__main__'); "
+                 "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)")
+        env = dict(os.environ, BASH_GUARD_SOCKET=os.path.join(tempfile.mkdtemp(), 'none.sock'))
+        proc = subprocess.Popen([sys.executable, '-c', probe, CLIENT], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        stream = heredoc_input(line, size, tail)
+        try:
+            while True:
+                block = stream.read(1 << 20)
+                if not block:
+                    break
+                proc.stdin.write(block)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        out = proc.stdout.read()
+        err = proc.stderr.read().decode()
+        proc.wait(timeout=120)
+        return out, int(err.split()[-1]) >> 10 if sys.platform != 'darwin' else int(err.split()[-1]) >> 20
+
+    small_out, small_rss = client_run(5 << 20)
+    big_out, big_rss = client_run(40 << 20, "rm -rf /")
+    check(f"client streams big input ({small_rss} -> {big_rss} MB)",
+          b'"ask"' in small_out and big_rss < small_rss + 16)
+    check("client decides past the budget", b'"deny"' in big_out and b'checked in chunks' in big_out)
+    (decision, _), peak = traced_peak(lambda: decide(read_input(heredoc_input(line, 10 << 20))))
+    check(f"10 MB decided in bounded memory ({peak >> 20} MB)",
+          decision == "ask" and peak < INPUT_LIMIT + 8 * SCAN_CHUNK)
+    sizes = {}
+    for mb in (10, 100):
+        hook_input = read_input(heredoc_input(line, mb << 20, "rm -rf /"))
+        total, sizes[mb] = traced_peak(lambda: sum(map(len, hook_input.chunks())))
+    check(f"100 MB decoded in the memory of 10 MB ({sizes[100] >> 20} MB)",
+          sizes[100] < sizes[10] + SCAN_CHUNK and total > 80 << 20)
+
+    # ======================================================
+    # SHELL AST (BASH_GUARD_PARSE=ast)
+    # ======================================================
+
+    def ast_decision(command):
+        os.environ['BASH_GUARD_PARSE'] = 'ast'
+        try:
+            return decide({"tool_input": {"command": command}})[0] or "passthrough"
+        finally:
+            del os.environ['BASH_GUARD_PARSE']
+
+    def a(name, command, expected):
+        check(name, ast_decision(command) == expected)
+
+    print("\n=== Protected paths ===")
+
+    def guard(command, cwd=None):
+        """decide() for command run from cwd: the decision, or 'passthrough'."""
+        return decide({"tool_input": {"command": command}, "cwd": cwd})[0] or "passthrough"
+
+    home = os.path.expanduser('~')
+    check("components normalized",     path_components("//a/./b//../c/") == ["a", "c"]
+                                       and path_components("../x/../../y") == ["y"]
+                                       and path_components("../../b", ["a"]) == ["b"]
+                                       and path_components("/../A") == ["a"])
+    for name, command, cwd, expected_decision in [
+            ("dotdot spelling",        "cat ~/.ssh/../.ssh/id_rsa",      None,             "deny"),
+            ("$HOME spelling",         "ls $HOME/.aws",                  None,             "deny"),
+            ("${HOME} quoted",         'cat "${HOME}"/.aws/credentials', None,             "deny"),
+            ("quotes inside a word",   'cat ~/.s"s"h/id_rsa',            None,             "deny"),
+            ("duplicate slashes",      "cat //etc//shadow",              None,             "deny"),
+            ("case folded",            "ls ~/.AWS",                      None,             "deny"),
+            ("relative to cwd",        "cat id_rsa",                     home + "/.ssh",   "deny"),
+            ("climbs out of cwd",      "ls ../../.ssh",                  "/home/u/proj",   "deny"),
+            ("cd moves cwd",           "cd /etc && touch hosts",         None,             "deny"),
+            (".. stops at /",          "touch ../../../etc/hosts",       "/home/u",        "deny"),
+            ("cd .. at /",             "cd / && cd .. && touch etc/hosts", "/home/u",      "deny"),
+            ("cd .. past /",           "cd ../../.. && touch etc/hosts", "/home/u",        "deny"),
+            ("inline payload",         "bash -c 'cat $HOME/.aws'",       None,             "deny"),
+            ("read-only readable",     "cat /etc/hosts",                 None,             "allow"),
+            ("read-only redirect",     "echo x > /etc/hosts",            None,             "deny"),
+            ("read-only sed -i",       "sed -i s/a/b/ /etc/hosts",       None,             "deny"),
+            ("read-only sed stdout",   "sed s/a/b/ /etc/hosts",          None,             "allow"),
+            ("read-only copy target",  "cp -r src /usr/lib/x",           None,             "deny"),
+            ("read-only tee",          "tee -a ~/.zshrc < x",            None,             "deny"),
+            ("no-delete rm",           "rm -rf .git",                    None,             "deny"),
+            ("no-delete mv",           "mv ~/.claude /tmp",              None,             "deny"),
+            ("no-delete writable",     "mkdir -p ~/.claude/x",           None,             "allow"),
+            ("no-delete inside ok",    "rm -rf .git/objects/ab",         None,             "passthrough"),
+            ("delete holding one",     "cd ~ && rm -r .claude",          None,             "deny"),
+            ("bare cd goes home",      "cd && rm -r .claude",            "/tmp",           "deny"),
+            ("escape inside a word",   "cat /e\\tc/sha\\dow",            None,             "deny"),
+            ("home subdir from home",  "rm -rf foo",                     home,             "passthrough"),
+            ("no path, not lexed",     "git status",                     None,             "allow"),
+            ("user name with NUL",     "cat ~a\x00b/x",                  None,             "allow")]:
+        check(name,                    guard(command, cwd) == expected_decision)
+    check("reason names location",     decide({"tool_input": {"command": "ls $HOME/.aws"}})[1]
+                                       == "Blocked: zero-access path (.aws/)")
+    check("gate skips plain commands", not PROTECTED_PATHS.may_name("npm test", "/tmp/p")
+                                       and PROTECTED_PATHS.may_name("npm test", home))
+    start = time.perf_counter()
+    check("long cd .. chain",          guard(" && ".join(["cd .."] * 5000) + " && touch etc/hosts", "/home/u")
+                                       == "deny" and time.perf_counter() - start < 1.0)
+    many = PathTrie([('zero-access', [f"/srv/app{i}/secret" for i in range(5000)] + ['.ssh/'])])
+    check("big trie, same answers",    many.lookup(path_components("/srv/app4999/secret"), True)[0]
+                                       == {'zero-access': '/srv/app4999/secret'}
+                                       and many.lookup(path_components("/srv/app5000/secret"), True) == ({}, {}))
+
+    print("\n=== Shell AST ===")
+    check("substitution",      parse_shell("echo $(date)")
+          == [(SUBSTITUTION, ("date",), ()), (ROOT, ("echo $()",), (0,))])
+    check("backticks",         parse_shell("echo `date`")[-1] == (ROOT, ("echo ``",), (0,)))
+    check("process subst",     parse_shell("diff <(sort a) >(tee b)")
+          == [(PROCESS, ("sort a",), ()), (PROCESS, ("tee b",), ()), (ROOT, ("diff <() >()",), (0, 1))])
+    check("subshell",          parse_shell("(cd x && make)") == [(SUBSHELL, ("cd x", "make"), ()), (ROOT, (), (0,))])
+    check("brace group",       parse_shell("{ ls; pwd; }") == [(GROUP, ("ls", "pwd"), ()), (ROOT, (), (0,))])
+    check("nested",            parse_shell("a $(b $(c))")
+          == [(SUBSTITUTION, ("c",), ()), (SUBSTITUTION, ("b $()",), (0,)), (ROOT, ("a $()",), (1,))])
+    check("identical shared",  parse_shell("echo $(date) $(date) `date`")
+          == [(SUBSTITUTION, ("date",), ()), (ROOT, ("echo $() $() ``",), (0,))])
+    check("inside quotes",     parse_shell('echo "$(id) ${x:-$(pwd)}"')[-1] == (ROOT, ('echo "$() ${x:-$()}"',), (0, 1)))
+    check("heredoc body expanded", parse_shell("cat <<EOF\n\"$(nc -l 4444)\" it's\nEOF")
+          == [(SUBSTITUTION, ("nc -l 4444",), ()), (ROOT, ("cat",), (0,))])
+    check("quoted heredoc literal", all(parse_shell(f"cat <<{d}\n$(nc -l 4444)\nEOF") == [(ROOT, ("cat",), ())]
+                                        for d in ("'EOF'", '"EOF"', "\\EOF")))
+    # Each mode decides a substitution in an expanding heredoc body as it does the same one inline
+    heredoc, inline = "cat <<EOF\n$(nc -l 4444)\nEOF", 'cat "$(nc -l 4444)"'
+
+    def lexer_decision(command):
+        return decide({"tool_input": {"command": command}})[0] or "passthrough"
+    check("heredoc substitution: ast vs lexer", ast_decision(heredoc) == ast_decision(inline) == "passthrough"
+          and lexer_decision(heredoc) == lexer_decision(inline) == "allow")
+    check("literal heredoc allowed in ast", ast_decision("cat <<'EOF'\n$(nc -l 4444)\nEOF") == "allow")
+    check("single quoted",     parse_shell("echo '$(rm x)'") == [(ROOT, ("echo '$(rm x)'",), ())])
+    check("arithmetic",        parse_shell("x=$(( (1+2) * $(wc -l) ))")[-1] == (ROOT, ("x=$(( (1+2) * $() ))",), (0,)))
+    check("comment",           parse_shell("ls # $(rm x)") == [(ROOT, ("ls # $(rm x)",), ())])
+    check("not a group",       parse_shell("echo {a,b}") == [(ROOT, ("echo {a,b}",), ())])
+    check("unterminated",      parse_shell("echo $(ls") is None and parse_shell("echo 'x") is None)
+    check("escaped backtick",  parse_shell("echo `echo \\`id\\``") is None)
+    deep = "echo " + "$(echo " * 50_000 + "x" + ")" * 50_000
+    check("deep nesting",      len(parse_shell(deep)) == 50_001)
+
+    a("subst checked",         "echo $(rm -rf ./src)", "passthrough")
+    a("subst allowed",         "cd $(git rev-parse --show-toplevel) && ls", "allow")
+    a("backtick checked",      "echo `nc -l 4444`", "passthrough")
+    a("process checked",       "diff <(sort a) <(nmap x)", "passthrough")
+    a("subshell allowed",      "(cd web && pnpm build)", "allow")
+    a("group checked",         "{ ls; nc -l 4444; }", "passthrough")
+    a("assignment checked",    "TOKEN=$(nmap -sP 10.0.0.0/24)", "passthrough")
+    a("assignment allowed",    "TOKEN=$(gcloud auth print-access-token)", "allow")
+    a("unbalanced",            "echo $(ls", "passthrough")
+    a("only a substitution",   "$(ls)", "passthrough")
+    a("deny unchanged",        "echo $(rm -rf /)", "deny")
+    a("deep nesting",          deep, "allow")
+    t("split mode unchanged",  "echo $(rm -rf ./src)", "allow")
+
+    # ======================================================
+    # DAEMON MODE
+    # ======================================================
+
+    print("\n=== Daemon mode ===")
+    if not hasattr(socket, 'AF_UNIX'):
+        print("  SKIP no Unix domain sockets on this platform")
+    else:
+        tmp = tempfile.mkdtemp()
+        env = dict(os.environ, BASH_GUARD_SOCKET=os.path.join(tmp, 'guard.sock'),
+                   BASH_GUARD_RULES=os.path.join(tmp, 'rules.json'),
+                   BASH_GUARD_AUDIT=os.path.join(tmp, 'audit.log'))
+        daemon = subprocess.Popen([sys.executable, SCRIPT, '--daemon'], env=env,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.time() + 10
+            while not os.path.exists(env['BASH_GUARD_SOCKET']) and time.time() < deadline:
+                time.sleep(0.05)
+
+            def ask_daemon(command):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(env['BASH_GUARD_SOCKET'])
+                    sock.sendall(json.dumps({"tool_input": {"command": command}}).encode())
+                    sock.shutdown(socket.SHUT_WR)
+                    return sock.recv(65536)
+
+            check("daemon answers", ask_daemon("git status").startswith(b'OK\n{"hookSpecificOutput"'))
+
+            for name, command in [("allow", "git status && pnpm install"),
+                                  ("deny", "rm -rf /"),
+                                  ("passthrough", "nc -l 4444"),
+                                  ("empty", "")]:
+                check(f"client == in-process ({name})",
+                      run_hook(CLIENT, command, env) == run_hook(SCRIPT, command))
+
+            with open(env['BASH_GUARD_RULES'], 'w') as f:
+                json.dump({"allow": [r"^nc\b"]}, f)
+            check("daemon reloads rule files", ask_daemon("nc -l 4444").startswith(b'OK\n')
+                  and b'"allow"' in ask_daemon("nc -l 4444"))
+            time.sleep(AUDIT_FLUSH_INTERVAL * 2)
+            check("idle daemon flushes audit",
+                  sum(r[0] == 'D' for r in iter_audit(env['BASH_GUARD_AUDIT'])) == 7)
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+        check("socket removed on exit", not os.path.exists(env['BASH_GUARD_SOCKET']))
+        check("client falls back without daemon",
+              run_hook(CLIENT, "rm -rf /", env) == run_hook(SCRIPT, "rm -rf /"))
+
+        # Rule files come from $CLAUDE_PROJECT_DIR in both modes, even with
+        # the session's cwd in a subdirectory that has none of its own
+        project = os.path.join(tmp, 'project')
+        os.makedirs(os.path.join(project, '.claude'))
+        os.makedirs(os.path.join(project, 'sub'))
+        with open(os.path.join(project, '.claude', 'bash-guard.json'), 'w') as f:
+            json.dump({"allow": [r"^nc\b"]}, f)
+        env = {k: v for k, v in env.items() if k != 'BASH_GUARD_RULES'}
+        env.update(HOME=tmp, CLAUDE_PLUGIN_ROOT=tmp, CLAUDE_PROJECT_DIR=project)
+        hook_input = json.dumps({"tool_name": "Bash", "cwd": os.path.join(project, 'sub'),
+                                 "tool_input": {"command": "nc -l 4444"}}).encode()
+
+        def run_in(script):
+            return subprocess.run([sys.executable, script], input=hook_input, capture_output=True,
+                                  env=env, cwd=os.path.join(project, 'sub'), timeout=30).stdout
+
+        daemon = subprocess.Popen([sys.executable, SCRIPT, '--daemon'], env=env,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.time() + 10
+            while not os.path.exists(env['BASH_GUARD_SOCKET']) and time.time() < deadline:
+                time.sleep(0.05)
+            in_process = run_in(SCRIPT)
+            check("daemon uses the client's project",
+                  b'"allow"' in in_process and run_in(CLIENT) == in_process)
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+    # ======================================================
+    # BATCH MODE
+    # ======================================================
+
+    print("\n=== Batch mode ===")
+    commands = ["git status && pnpm install", "rm -rf /", "nc -l 4444", "",
+                "cat > f << 'EOF'\nrm -rf /\nEOF", "python3 -c 'import os'"]
+    expected = [decide({"tool_input": {"command": c}}) for c in commands]
+    check("evaluate_many == decide",    list(evaluate_many(commands)) == expected)
+    check("evaluate_many hook inputs",  list(evaluate_many({"tool_input": {"command": c}} for c in commands))
+          == expected)
+    check("evaluate_many small chunks", list(evaluate_many(iter(commands * 3), chunksize=2)) == expected * 3)
+    check("evaluate_many workers",      list(evaluate_many(commands * 3, workers=2, chunksize=2))
+          == expected * 3)
+    check("raw line",                   parse_batch_line("rm -rf /\n") == {"tool_input": {"command": "rm -rf /"}})
+    check("command object line",        parse_batch_line('{"command": "ls"}') == {"tool_input": {"command": "ls"}})
+    check("brace group is raw",         parse_batch_line("{ a; b; }") == {"tool_input": {"command": "{ a; b; }"}})
+
+    lines = [json.dumps({"tool_input": {"command": c}}) for c in commands if c] + ["", "git log", "sudo reboot"]
+    for workers in ("1", "2"):
+        proc = subprocess.run([sys.executable, SCRIPT, '--batch', '--workers', workers],
+                              input="\n".join(lines) + "\n", capture_output=True, text=True)
+        results = [json.loads(line) for line in proc.stdout.splitlines()]
+        check(f"cli one line per command (workers={workers})",
+              [r["command"] for r in results] == [c for c in commands if c] + ["git log", "sudo reboot"])
+        check(f"cli decisions (workers={workers})",
+              [r["decision"] for r in results]
+              == [d or "passthrough" for (d, _), c in zip(expected, commands) if c]
+              + ["allow", "passthrough"])
+        check(f"cli throughput summary (workers={workers})",
+              "7 commands" in proc.stderr and "commands/s" in proc.stderr)
+
+    # ======================================================
+    # DECISION CACHE
+    # ======================================================
+
+    print("\n=== Decision cache ===")
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'cache', 'decisions.sqlite3')
+    cache = DecisionCache(path)
+    inputs = [{"tool_input": {"command": c}} for c in commands]
+    check("miss == decide",            [cache.decide(h) for h in inputs] == expected)
+    check("hit == decide",             [cache.decide(h) for h in inputs] == expected)
+    check("passthrough is cached",     cache.get("nc -l 4444") == (None, None))
+    check("keyed by cwd",              cache.decide({"tool_input": {"command": "rm -rf foo"}, "cwd": "/tmp"})
+                                       == (None, None)
+                                       and cache.decide({"tool_input": {"command": "rm -rf foo"},
+                                                         "cwd": os.path.expanduser("~/.ssh")})[0] == "deny")
+    check("file private",              os.stat(path).st_mode & 0o077 == 0)
+    cache.close()
+
+    cache = DecisionCache(path)
+    check("survives reopen",           cache.get("rm -rf /") == expected[1])
+    cache.fingerprint = "older rules"
+    cache.put("sudo reboot", "allow", "stale")
+    check("stale rules never insert",  cache.get("sudo reboot") is None)
+    cache.close()
+    cache = DecisionCache(path)
+    cache.db.execute("UPDATE meta SET value = 'older rules'")
+    cache.close()
+    cache = DecisionCache(path)
+    check("rule change clears",        cache.get("rm -rf /") is None)
+    cache.close()
+    copy = os.path.join(tmp, 'bash-guard.py')
+    with open(SCRIPT, 'rb') as src, open(copy, 'wb') as dst:
+        dst.write(src.read())
+    probe = ("import sys; ns = {'__file__': sys.argv[1]}; "
+             "exec(open(sys.argv[1]).read().split('if __name__')[0], ns); print(ns['rules_fingerprint']())")
+
+    def script_fingerprint():
+        return subprocess.run([sys.executable, '-c', probe, copy], capture_output=True, text=True).stdout
+    before = script_fingerprint()
+    os.utime(copy, ns=(time.time_ns(), os.stat(copy).st_mtime_ns + 10**9))
+    check("script change clears",      before and script_fingerprint() != before)
+
+    cache = DecisionCache(os.path.join(tmp, 'small.sqlite3'), max_entries=10, max_bytes=1000)
+    for i in range(25):
+        cache.put(f"echo {i}", "allow", "")
+    entries, size = cache.db.execute("SELECT entries, bytes FROM totals").fetchone()
+    check("entry cap",                 0 < entries <= 10 and cache.get("echo 24") is not None
+                                       and cache.get("echo 0") is None)
+    check("totals track rows",         (entries, size) == cache.db.execute(
+                                           "SELECT COUNT(*), SUM(size) FROM decisions").fetchone())
+    cache.put("x" * 2000, "allow", "")
+    check("byte cap",                  cache.db.execute("SELECT bytes FROM totals").fetchone()[0] <= 1000)
+    cache.close()
+
+    os.chmod(path, 0o666)
+    try:
+        DecisionCache(path)
+        check("refuses shared file", False)
+    except PermissionError:
+        check("refuses shared file", True)
+
+    env = dict(os.environ, BASH_GUARD_CACHE=os.path.join(tmp, 'hook', 'c.sqlite3'))
+    check("hook skips short commands",
+          run_hook(SCRIPT, "git status", env) == run_hook(SCRIPT, "git status")
+          and not os.path.exists(env['BASH_GUARD_CACHE']))
+    long_command = "cat > f << 'EOF'\n" + "x = 1\n" * CACHE_MIN_LENGTH + "EOF\nrm -rf /"
+    check("hook caches long commands",
+          run_hook(SCRIPT, long_command, env) == run_hook(SCRIPT, long_command)
+          == run_hook(SCRIPT, long_command, env) and os.path.exists(env['BASH_GUARD_CACHE']))
+
+    procs = []
+    for i in range(6):
+        hook_input = json.dumps({"tool_input": {"command": long_command + f" # {i % 3}"}}).encode()
+        proc = subprocess.Popen([sys.executable, SCRIPT], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        procs.append((proc, hook_input))
+    results = [proc.communicate(hook_input, timeout=60) for proc, hook_input in procs]
+    check("concurrent hooks",          all(out == results[0][0] and not err for out, err in results))
+
+    # ======================================================
+    # METRICS
+    # ======================================================
+
+    print("\n=== Metrics ===")
+    check("watch never changes decisions",
+          [decide(h, Stopwatch()) for h in inputs] == expected)
+    watch = Stopwatch()
+    decide({"tool_input": {"command": "git add . && npm test | tail -5"}}, watch)
+    check("allow spans",               set(watch.spans) == {"lex", "deny.zero_access", "deny.patterns",
+                                                            "deny.inline", "deny.paths", "allow"})
+    check("one lap per segment",       len(watch.segments) == 3)
+    watch = Stopwatch()
+    decide({"tool_input": {"command": "rm -rf /"}}, watch)
+    check("deny stops timing early",   "allow" not in watch.spans and not watch.segments)
+    record = watch.record("rm -rf /", "deny")
+    check("record fields",             record["decision"] == "deny" and record["bytes"] == 8
+                                       and record["total_us"] >= sum(record["spans_us"].values()))
+    check("passthrough record",        Stopwatch().record("nc -l 1", None)["decision"] == "passthrough")
+    check("percentiles",               [percentile(list(range(1, 101)), q) for q in (50, 95, 99, 100)]
+                                       == [50, 95, 99, 100] and percentile([7], 50) == 7)
+
+    metrics = os.path.join(tmp, 'metrics', 'metrics.jsonl')
+    env = dict(os.environ, BASH_GUARD_METRICS=metrics)
+    check("hook output unchanged",
+          run_hook(SCRIPT, "git status", env) == run_hook(SCRIPT, "git status"))
+    run_hook(SCRIPT, "rm -rf /", env)
+    with open(metrics, 'a') as f:
+        f.write('{"torn line\n')
+    with open(metrics) as f:
+        records = [json.loads(line) for line in f if line.startswith('{"ts"')]
+    check("one record per hook",       [r["decision"] for r in records] == ["allow", "deny"])
+    check("read_input timed",          all("read_input" in r["spans_us"] for r in records))
+    proc = subprocess.run([sys.executable, SCRIPT, '--stats', metrics], capture_output=True, text=True)
+    check("stats report",              proc.returncode == 0 and "2 decisions" in proc.stdout
+                                       and "p99 us" in proc.stdout and "rm -rf /" in proc.stdout)
+
+    # ======================================================
+    # AUDIT LOG
+    # ======================================================
+
+    print("\n=== Audit log ===")
+    audit_file = os.path.join(tmp, 'audit', 'audit.log')
+    audit = AuditLog(audit_file)
+    for command, session in [("git status", "s1"), ("rm -rf /", "s1"), ("nc -l 1", "s2"), ("nc -l 1", "s2")]:
+        hook_input = {"session_id": session, "tool_input": {"command": command}}
+        audit.record(hook_input, *decide(hook_input), 0.00125)
+    check("buffered until flush",      not os.path.exists(audit_file))
+    audit.close()
+    records = list(iter_audit(audit_file))
+    strings = {(r[1], r[3]) for r in records if r[0] == 'S'}
+    rows = [r for r in records if r[0] == 'D']
+    check("one record per decision",   [r[1] for r in rows] == ["allow", "deny", None, None])
+    check("record fields",             rows[0][3] == 1250 and rows[2][4] == audit_id("nc -l 1", 8)
+                                       and rows[0][6] == audit_id("s1", 4) != rows[2][6])
+    check("texts stored once",         len(strings) == sum(r[0] == 'S' for r in records)
+                                       and (AUDIT_COMMAND, "nc -l 1") in strings
+                                       and (AUDIT_RULE, "Matched safe pattern") in strings)
+    check("passthrough has no rule",   rows[2][5] == bytes(4))
+    check("files private",             os.stat(audit_file).st_mode & 0o077 == 0
+                                       and os.stat(audit_file + '.idx').st_mode & 0o077 == 0)
+
+    size = os.path.getsize(audit_file)
+    audit = AuditLog(audit_file)
+    audit.record({"session_id": "s2", "tool_input": {"command": "nc -l 1"}}, None, None, 0.001)
+    audit.close()
+    check("known text: 26-byte record", os.path.getsize(audit_file) - size == 26)
+    with open(audit_file, 'ab') as f:
+        f.write(b'D\x01\x02')
+    check("torn tail ignored",         sum(r[0] == 'D' for r in iter_audit(audit_file)) == 5)
+
+    audit = AuditLog(os.path.join(tmp, 'audit', 'small.log'), max_bytes=300)
+    for i in range(40):
+        audit.record({"tool_input": {"command": f"make target-{i % 7}"}}, None, None, 0.0)
+        audit.flush()
+    audit.close()
+    segments = audit_segments(audit.path)
+
+    def self_contained(segment):
+        known = {r[2] for r in iter_audit(segment) if r[0] == 'S'}
+        return all(r[4] in known for r in iter_audit(segment) if r[0] == 'D')
+
+    check("size rotation",             len(segments) > 2 and segments[-1] == audit.path
+                                       and all(os.path.getsize(s) < 300 + 100 for s in segments[:-1]))
+    check("segments carry their texts", all(self_contained(s) for s in segments))
+    check("rotation loses nothing",    sum(r[0] == 'D' for s in segments for r in iter_audit(s)) == 40)
+
+    writer = ("import sys; ns = {'__file__': sys.argv[1]}; "
+              "exec(open(sys.argv[1]).read().split('if __name__')[0], ns); "
+              "log = ns['AuditLog'](sys.argv[2], max_bytes=4096); "
+              "[log.record({'session_id': sys.argv[3], 'tool_input': {'command': f'ls {i % 50}'}}, "
+              "'allow', 'ok', 0.0) or (i % 17 or log.flush()) for i in range(500)]; log.close()")
+    shared_log = os.path.join(tmp, 'audit', 'shared.log')
+    procs = [subprocess.Popen([sys.executable, '-c', writer, SCRIPT, shared_log, f"w{n}"],
+                              stderr=subprocess.PIPE) for n in range(4)]
+    errors = [proc.communicate(timeout=60)[1] for proc in procs]
+    rows = [r for s in audit_segments(shared_log) for r in iter_audit(s) if r[0] == 'D']
+    check("concurrent writers",        not any(errors) and len(rows) == 2000
+                                       and len({r[6] for r in rows}) == 4)
+
+    env = dict(os.environ, BASH_GUARD_AUDIT=os.path.join(tmp, 'audit', 'hook.log'))
+    check("hook output unchanged",
+          run_hook(SCRIPT, "rm -rf /", env) == run_hook(SCRIPT, "rm -rf /"))
+    run_hook(CLIENT, "nc -l 4444", env)
+    run_hook(CLIENT, "nc -l 4444", env)
+    proc = subprocess.run([sys.executable, SCRIPT, '--audit', env['BASH_GUARD_AUDIT']],
+                          capture_output=True, text=True)
+    check("audit report",              proc.returncode == 0 and "3 decisions" in proc.stdout
+                                       and "rm\\s+-rf" in proc.stdout and "2  nc -l 4444" in proc.stdout
+                                       and "2  nc" in proc.stdout.split("command name")[1])
+    proc = subprocess.run([sys.executable, SCRIPT, '--audit', audit.path],
+                          capture_output=True, text=True)
+    check("audit summary line",        proc.stdout.splitlines()[0] == f"40 decisions from 0 sessions "
+                                       f"in {len(segments)} file(s) at {audit.path}")
+
+    # ======================================================
+    # PASSTHROUGH MINER
+    # ======================================================
+
+    print("\n=== Passthrough miner ===")
+    sketch = SpaceSaving(20)
+    # Five frequent items interleaved with a long tail of one-offs
+    stream = [f"hot{i % 5}" if i % 8 < 5 else f"cold{i}" for i in range(8000)]
+    for item in stream:
+        sketch.add(item)
+    truth = {item: stream.count(item) for item in set(stream)}
+    check("sketch memory bounded",     len(sketch.counts) == len(sketch.heap) == 20)
+    check("heavy hitters kept",        {item for item, _, _ in sketch.top(5)} == {f"hot{i}" for i in range(5)})
+    check("count bounds",              all(count - error <= truth[item] <= count
+                                           for item, count, error in sketch.top()))
+    check("sketch total",              sketch.total == len(stream))
+
+    check("command name",              [command_name(c) for c in ("sudo /usr/bin/nmap -sV x 2>/dev/null",
+                                                                   "FOO=1 ./bin/mytool run", "nohup nice nc -l 1")]
+                                       == ["nmap", "mytool", "nc"])
+    check("name rule boundaries",      re.match(name_rule("deploy.sh"), "deploy.sh --prod")
+                                       and not re.match(name_rule("deploy.sh"), "deploy.shx")
+                                       and re.match(name_rule("g++"), "g++ -o x")
+                                       and not re.match(name_rule("g++"), "g++x"))
+    corpus = load_test_corpus(os.path.join(os.path.dirname(__file__), 'test_bash_guard.py'))
+    check("test corpus read",          ("rm -rf /", "deny") in corpus and ("nmap -sS 192.168.1.0/24", "passthrough")
+                                       in corpus and all(len(case) == 2 for case in corpus))
+
+    miner = PassthroughMiner()
+    for command in ["git status && mytool build", "mytool test", "./bin/mytool lint", "nc -l 4444",
+                    "nc -l 4445", "rm -rf ./src", "rm -rf ./src", "git status", "rm -rf /", "",
+                    "sudo nmap -sV localhost && nc -z host 22", "$CMD run", "$CMD run"]:
+        miner.add({"tool_input": {"command": command}})
+    check("decision counts",           miner.decisions == {"allow": 2, "deny": 1, "passthrough": 10})
+    check("names ranked",              [item for item, _, _ in miner.names.top(2)] == ["mytool", "nc"]
+                                       and miner.names.counts["nc"] == 3 and miner.names.counts["nmap"] == 1)
+    check("only-blocker counts",       miner.sole == {"mytool": 3, "nc": 2, "rm": 2, "$CMD": 2})
+    check("examples kept",             miner.examples["rm"] == ["rm -rf ./src"]
+                                       and len(miner.examples["mytool"]) == MINE_EXAMPLES)
+    index = ALLOW_INDEX
+    results = {name: (rule, conflicts) for name, _, _, _, rule, conflicts in miner.candidates(corpus)}
+    check("candidates checked",        results["mytool"] == (r"^(mytool)\b", [])
+                                       and ("rm -rf /", "deny") in results["rm"][1]
+                                       and ("nc -l 4444", "passthrough") in results["nc"][1]
+                                       and results["$CMD"] == (None, []) and "nmap" not in results)
+    check("allow rules restored",      ALLOW_INDEX is index and not check_allow_patterns("mytool test"))
+
+    miner = PassthroughMiner()
+    for i in range(8):
+        for command in ["truncate -s0 /etc/hosts", f"install x /usr/bin/x{i}", "sed -i s/a/b/ /etc/hosts"]:
+            miner.add({"cwd": "/tmp", "tool_input": {"command": command}})
+    check("miner agrees with decide()", miner.decisions == {"allow": 0, "deny": 24, "passthrough": 0}
+                                       and not miner.names.counts and not miner.candidates(corpus))
+
+    miner = PassthroughMiner(capacity=50)
+    for i in range(20_000):
+        miner.add({"tool_input": {"command": f"tool{i} --x" if i % 4 else f"hot{i % 3} run"}})
+    check("miner memory bounded",      len(miner.names.counts) == 50 and len(miner.sole) <= 50
+                                       and len(miner.examples) <= 50)
+    check("frequent names survive",    {item for item, _, _ in miner.names.top(3)} == {"hot0", "hot1", "hot2"})
+
+    mine_input = os.path.join(tmp, 'mine.txt')
+    with open(mine_input, 'w') as f:
+        f.write("mytool build\nmytool test\nnc -l 1\nnc -l 2\n\n")
+    proc = subprocess.run([sys.executable, SCRIPT, '--mine', mine_input], capture_output=True, text=True)
+    check("mine report",               proc.returncode == 0 and "passthrough 4" in proc.stdout
+                                       and "REJECTED" in proc.stdout
+                                       and proc.stdout.rstrip().endswith(r"allow = ['^(mytool)\b']"))
+    with open(mine_input, 'w') as f:
+        f.writelines(json.dumps({"cwd": "/tmp", "tool_input": {"command": command}}) + "\n"
+                     for i in range(8) for command in ["truncate -s0 /etc/hosts", f"install x /usr/bin/x{i}"])
+    proc = subprocess.run([sys.executable, SCRIPT, '--mine', mine_input], capture_output=True, text=True)
+    check("path-denied never proposed", proc.returncode == 0 and "deny 16, passthrough 0" in proc.stdout
+                                       and "truncate" not in proc.stdout and "install" not in proc.stdout)
+
+    # ======================================================
+    # REDOS SAFETY
+    # ======================================================
+
+    print("\n=== ReDoS safety ===")
+    severities = lambda pattern: {severity for severity, _ in lint_pattern(pattern)}
+    for pattern in [r'(a+)+b', r'rm (\S+/)*x', r'^(\w+\s?)*$']:
+        check(f"lint error: {pattern}",    "error" in severities(pattern))
+    for pattern in [r'rm (\S+/)?x', r'rm\s+-rf\s+/', r'^(?:-\S+\s+)*$', r'^(git|npm)\b']:
+        check(f"lint clean: {pattern}",    "error" not in severities(pattern))
+    check("lint warning: fork bomb",   severities(r':\(\)\s*\{.*:\|:.*\}') == {"warning"})
+    check("lint warning: \\d*>",       severities(r'\d*>') == {"warning"})
+    check("lint bad regex",            severities(r'(') == {"error"})
+    check("shipped rules lint clean",  not [f for f in lint_rules() if f[3] == "error"])
+
+    # Inputs that used to take seconds to minutes
+    for name, command in [("digit run", "echo " + "1" * 200_000),
+                          ("wrapper flags", "sudo " + "-E " * 50_000),
+                          ("rm path segments", "rm " + "a/" * 5_000 + "!")]:
+        start = time.perf_counter()
+        decide({"tool_input": {"command": command}})
+        check(f"fast: {name}",             time.perf_counter() - start < 1.0)
+
+    fork_bomb = {"tool_input": {"command": ":(){ :|:" * 5_000}}
+    start = time.perf_counter()
+    check("budget cuts off",           decide_within(fork_bomb, 0.2) == (None, BUDGET_REASON))
+    check("budget cut off quickly",    time.perf_counter() - start < 2.0)
+    check("budget keeps decisions",    [decide_within(h, 5.0) for h in inputs] == expected)
+    check("budget 0 is off",           decide_within({"tool_input": {"command": "rm -rf /"}}, 0)[0] == "deny")
+    check("alarm restored",            signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0))
+
+    env = dict(os.environ, BASH_GUARD_BUDGET='0.2')
+    proc = subprocess.run([sys.executable, SCRIPT], input=json.dumps(fork_bomb).encode(),
+                          capture_output=True, env=env, timeout=30)
+    check("hook passes through",       proc.stdout == b"" and b"budget" in proc.stderr)
+    proc = subprocess.run([sys.executable, SCRIPT, '--lint'], capture_output=True, text=True)
+    check("--lint exits 0",            proc.returncode == 0 and "0 errors" in proc.stderr)
+
+    # ======================================================
+    # RULE FILES
+    # ======================================================
+
+    print("\n=== Rule files ===")
+    tmp = tempfile.mkdtemp()
+    rules_path = os.path.join(tmp, 'bash-guard.json')
+
+    def write_rules(rules):
+        with open(rules_path, 'w') as f:
+            json.dump(rules, f)
+        # Same-size rewrites within one mtime tick must still count as a change
+        os.utime(rules_path, ns=(time.time_ns(), time.time_ns() + len(json.dumps(rules))))
+
+    write_rules({"allow": [r"^(mytool|othertool)\b", r"(a+)+b"], "deny": [r"mytool\s+--nuke"],
+                 "zero_access": [r"\.vault-token"], "bogus": 1})
+    env = dict(os.environ, BASH_GUARD_RULES=rules_path, CLAUDE_PLUGIN_DATA=os.path.join(tmp, 'data'))
+    for name, command, expected_decision in [("file allow", "mytool build", b'"allow"'),
+                                             ("file deny", "mytool --nuke", b'"deny"'),
+                                             ("file zero-access", "cat ~/.vault-token", b'"deny"'),
+                                             ("built-in deny kept", "rm -rf /", b'"deny"'),
+                                             ("built-in allow kept", "git status", b'"allow"'),
+                                             ("rejected pattern", "aab", b'')]:
+        out = run_hook(SCRIPT, command, env)
+        check(name,                     expected_decision in out if expected_decision else out == b'')
+
+    cached = os.listdir(os.path.join(tmp, 'data'))
+    check("ruleset cached",            len(cached) == 1 and cached[0].endswith('.marshal'))
+    cached = os.path.join(tmp, 'data', cached[0])
+    check("ruleset cache private",     os.stat(cached).st_mode & 0o077 == 0)
+    proc = subprocess.run([sys.executable, SCRIPT, '--lint'], capture_output=True, text=True, env=env)
+    check("--lint reports file",       "'(a+)+b' rejected" in proc.stderr and "'bogus' ignored" in proc.stderr)
+    proc = subprocess.run([sys.executable, SCRIPT], input=b'{"tool_input": {"command": "ls"}}',
+                          capture_output=True, env=env)
+    check("cache hit skips validation", proc.stderr == b'')
+    write_rules({"allow": [r"^othertool\b"]})
+    check("edit reloads",              run_hook(SCRIPT, "mytool build", env) == b''
+                                       and b'"allow"' in run_hook(SCRIPT, "othertool", env))
+    os.chmod(cached, 0o666)
+    check("shared cache ignored",      read_ruleset(cached, None) is None)
+
+    def parse_quietly(path):
+        """parse_rule_file() result and what it reported on stderr."""
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            return parse_rule_file(path), err.getvalue()
+
+    write_rules({"deny": "x", "allow": [r"(\w+\s?)*$", "ok", 3]})
+    check("bad lists skipped",         parse_quietly(rules_path) == ({}, f"bash-guard: {rules_path}: "
+                                                                         "deny must be a list of strings, ignored\n"
+                                                                         f"bash-guard: {rules_path}: "
+                                                                         "allow must be a list of strings, ignored\n"))
+    write_rules({"allow": [r"(\w+\s?)*$", r"^ok\b"], "deny": ["("]})
+    rules, err = parse_quietly(rules_path)
+    check("bad patterns skipped",      rules == {"ALLOW_PATTERNS": [r"^ok\b"]}
+                                       and "exponential" in err and "does not compile" in err)
+    with open(rules_path, 'w') as f:
+        f.write('{"allow": [')
+    check("unreadable file skipped",   parse_quietly(rules_path)[0] == {})
+    try:
+        import tomllib  # noqa: F401 -- Python 3.11+
+        toml_path = os.path.join(tmp, 'bash-guard.toml')
+        with open(toml_path, 'w') as f:
+            f.write("allow = ['^mytool\\b']\n")
+        check("toml rule file",            parse_quietly(toml_path) == ({"ALLOW_PATTERNS": [r"^mytool\b"]}, ''))
+    except ImportError:
+        print("  SKIP no tomllib on this Python")
+
+    write_rules({"read_only_paths": ["~/notes.txt"], "no_delete_paths": ["", "data/"]})
+    rules, err = parse_quietly(rules_path)
+    check("location lists parsed",     rules == {"READ_ONLY_LOCATIONS": ["~/notes.txt"],
+                                                 "NO_DELETE_LOCATIONS": ["data/"]}
+                                       and "'' rejected" in err)
+    env['BASH_GUARD_RULES'] = rules_path
+    check("file read-only path",       b'"deny"' in run_hook(SCRIPT, "touch ~/notes.txt", env)
+                                       and b'"allow"' in run_hook(SCRIPT, "cat ~/notes.txt", env))
+
+    ruleset = build_ruleset([])
+    check("no files, built-ins only",  ruleset["DENY_PATTERNS"] == DENY_PATTERNS
+                                       and ruleset["ALLOW_PATTERNS"] == ALLOW_PATTERNS)
+    rebuilt = AllowIndex.from_state(ruleset["matchers"][2])
+    check("matcher state round-trips", all(rebuilt.matches(cmd) == ALLOW_INDEX.matches(cmd)
+                                           for cmd in ["git x", "g++ -O2", "rm -rf dist", "nc -l", "docker-compose up"]))
+    os.environ['BASH_GUARD_RULES'] = rules_path
+    try:
+        check("env replaces search",       rule_files() == [rules_path])
+        del os.environ['BASH_GUARD_RULES']
+        search = rule_files(tmp)
+        check("search order",              search[-2:] == [os.path.join(tmp, '.claude', name)
+                                                           for name in RULE_FILE_NAMES]
+                                           and len(search) == 6)
+    finally:
+        os.environ['BASH_GUARD_RULES'] = ''
+
+    ruleset["key"] = "k1"
+    path = os.path.join(tmp, 'cache', 'rules.marshal')
+    write_ruleset(path, ruleset)
+    check("ruleset round trip",        read_ruleset(path, "k1") == ruleset)
+    check("other key rejected",        read_ruleset(path, "k2") is None)
+    with open(path, 'rb') as f:
+        data = f.read()
+    for name, damaged in [("truncated", data[:len(data) // 2]), ("empty", b"")]:
+        with open(path, 'wb') as f:
+            f.write(damaged)
+        check(f"{name} file rejected",     read_ruleset(path, "k1") is None)
+
+    # ======================================================
+    # FUZZ HARNESS
+    # ======================================================
+
+    print("\n=== Fuzz harness ===")
+    fuzz_path = os.path.join(os.path.dirname(__file__), 'fuzz_bash_guard.py')
+    spec = importlib.util.spec_from_file_location('fuzz_bash_guard', fuzz_path)
+    fuzz = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fuzz)
+    proc = subprocess.run([sys.executable, fuzz_path, '--help'], capture_output=True, text=True)
+    check("fuzzer --help is its own",  "Property-based fuzzing" in proc.stdout)
+    check("cases reproducible",        fuzz.case_command(7, 42, 300) == fuzz.case_command(7, 42, 300)
+                                       and fuzz.case_command(7, 42, 300) != fuzz.case_command(7, 43, 300))
+    check("500 random commands hold",  fuzz.fuzz_chunk((0, 0, 500, 400)) == [])
+    check("saved regressions hold",    not any(fuzz.check_invariants(r['command'])
+                                               for r in fuzz.load_regressions()))
+
+    def planted(name, value, command):
+        original = getattr(fuzz, name)
+        setattr(fuzz, name, value)
+        try:
+            found = fuzz.check_invariants(command)
+            return found[0][0] if found else None, fuzz.minimize(command, found[0][0]) if found else None
+        finally:
+            setattr(fuzz, name, original)
+
+    def explode(command):
+        if '!' in command:
+            raise IndexError(command)
+        return []
+
+    kind, small = planted('split_shell_commands', explode, "git status && echo hi!")
+    check("crash found and minimized", kind == 'crash' and small == '!')
+    kind, _ = planted('SLOW_SECONDS', -1.0, "git status")
+    check("slow found",                kind == 'slow')
+    deny = fuzz.check_deny_patterns
+    kind, small = planted('check_deny_patterns', lambda text, watch=None:
+                          (False, None) if len(text) > 12 else deny(text), "echo a; rm -rf / ; ls")
+    check("weaker found and minimized", kind == 'weaker' and "rm -rf /" in small and len(small) < 16)
+
+    saved = os.path.join(tempfile.mkdtemp(), 'regressions.jsonl')
+    record = {"kind": "crash", "command": "echo '\u6f22", "detail": "x", "seed": 1, "case": 2}
+    check("regression saved once",     fuzz.save_regression(record, saved)
+                                       and not fuzz.save_regression(record, saved)
+                                       and fuzz.load_regressions(saved) == [record])
+    proc = subprocess.run([sys.executable, fuzz_path, '--cases', '600', '--seed', '1', '--workers', '2',
+                           '--no-save'], capture_output=True, text=True, timeout=120)
+    check("process pool run",          proc.returncode == 0 and "600 commands" in proc.stdout)
+
+    # ======================================================
+    # STARTUP
+    # ======================================================
+
+    print("\n=== Startup ===")
+    # As the plugin runs the hook: through the client, no daemon, bytecode cached
+    env = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+    env['BASH_GUARD_SOCKET'] = os.path.join(tempfile.mkdtemp(), 'guard.sock')
+    hook_input = b'{"tool_input": {"command": "git status"}}'
+    run_hook(CLIENT, "git status", env)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', CLIENT], input=hook_input,
+                          capture_output=True, env=env)
+    imported = {line.split('|')[-1].strip() for line in proc.stderr.decode().splitlines()
+                if line.startswith('import time:')}
+    check("hook under -X importtime",  b'"allow"' in proc.stdout and 'json' in imported)
+    for module in ('sqlite3', 'tomllib', 'pickle', 'socket', 'multiprocessing', 'argparse',
+                   'subprocess', 'threading', 'zlib', 'hashlib', 'importlib.util'):
+        check(f"hook skips import {module}", module not in imported)
+    guard_dir = os.path.dirname(os.path.abspath(SCRIPT))
+    if os.access(guard_dir, os.W_OK):
+        check("client caches bytecode",    os.path.exists(importlib.util.cache_from_source(os.path.abspath(SCRIPT))))
+
+    probe = ("import sys; ns = {'__file__': sys.argv[1]}; "
+             "exec(open(sys.argv[1]).read().split('if __name__')[0], ns); "
+             "ns['decide']({'tool_input': {'command': sys.argv[2]}}); "
+             "deny = ns['DENY_MATCHER']; "
+             "print(deny.literals is not None, sum(c is not None for c in deny.compiled), "
+             "deny.prefilter is not None, ns['ALLOW_INDEX'].residual.literals is not None)")
+    # (deny literals scanned, deny rules compiled, combined regex compiled, allow residual used)
+    for name, command, built in [("empty compiles no rules", "", "False 0 False False"),
+                                 ("allowed by name: no regex compiled", "git status", "True 0 False False"),
+                                 ("deny hit compiles one rule", "rm -rf /", "True 1 False False"),
+                                 ("unknown command reaches residual", "nc -l 4444", "True 0 False True"),
+                                 ("non-ASCII text uses combined regex", "echo \u00e9", "True 0 True False")]:
+        proc = subprocess.run([sys.executable, '-c', probe, SCRIPT, command], capture_output=True, text=True)
+        check(name,                        proc.stdout.strip() == built)
+
+    def cold_ms(args):
+        best = None
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run(args, input=hook_input, capture_output=True, env=env)
+            elapsed = (time.perf_counter() - start) * 1e3
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    print(f"  INFO cold 'git status': client {cold_ms([sys.executable, CLIENT]):.1f} ms, "
+          f"script {cold_ms([sys.executable, SCRIPT]):.1f} ms, "
+          f"bare python {cold_ms([sys.executable, '-c', 'pass']):.1f} ms")
+
     # ======================================================
     # SUMMARY
     # ======================================================
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Incremental git commit collector for aiorg-changelog.
+
+Walks only the commits added since the last run, classifies each one by
+its conventional-commit prefix (feat -> added, fix -> fixed, ...) and
+filters noise commits (wip, typo fixes, merges, version bumps) with the
+rules from commands/changelog.md. Classified commits are cached in an
+index file in the git directory, so later runs cost O(new commits) no
+matter how long the history is.
+
+The index covers the commits since the newest changelog.json entry (its
+"commit" hash) and is rebuilt when a new entry is published or the
+history it covers is rewritten.
+
+    changelog-collect.py           # summary of the pending commits
+    changelog-collect.py --json    # pending commits as JSON, for /changelog
+    changelog-collect.py --hook    # post-push reminder (see templates/hook-post-push.sh)
+
+https://github.com/aiorgdev/claude-plugins
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+# --- Configuration ---
+
+CHANGELOG_FILE = 'changelog.json'
+DEFAULT_BRANCH = 'main'
+# Stored in the git directory: it is a cache, never committed
+INDEX_FILE = 'aiorg-changelog-index.jsonl'
+# Bump when classify() changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+# Commits written to the index at a time while walking
+WRITE_BATCH = 1000
+
+# Conventional-commit prefix -> change type (docs only if significant: /changelog decides)
+PREFIX_TYPES = {
+    'feat': 'added',
+    'fix': 'fixed',
+    'refactor': 'changed',
+    'perf': 'changed',
+    'docs': 'changed',
+}
+
+# Skipped commits, checked in order: (reason, pattern on the subject)
+NOISE_RULES = [
+    ('merge', r'^Merge (branch|pull request|remote-tracking branch|tag)\b'),
+    ('wip', r'\b(wip|work in progress)\b'),
+    ('typo', r'\b(fix(e[sd])? typos?|typos? fix(e[sd])?|formatting)\b'),
+    ('version', r'^chore(\([^)]*\))?!?:\s*bump( the)? version\b'),
+    ('version', r'^(release|version|bump( version)?( to)?)?\s*v?\d+(\.\d+)+\S*$'),
+]
+
+CONVENTIONAL = re.compile(r'^(?P<prefix>[a-z]+)(?:\((?P<scope>[^)]*)\))?(?P<breaking>!)?:\s*(?P<text>.*)$',
+                          re.IGNORECASE)
+# Unprefixed subjects: the leading verb often says enough
+VERB_TYPES = [
+    ('added', r'^(add|adds|added|introduce|implement|support|create)\b'),
+    ('fixed', r'^(fix|fixes|fixed|resolve|resolves|correct|repair)\b'),
+    ('removed', r'^(remove|removes|removed|delete|drop|deprecate)\b'),
+    ('changed', r'^(improve|update|refactor|optimi[sz]e|speed up|rework|rename|change)\b'),
+]
+
+
+# --- Classification ---
+
+def compile_rules(rules):
+    return [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in rules]
+
+
+NOISE = compile_rules(NOISE_RULES)
+VERBS = compile_rules(VERB_TYPES)
+
+
+def classify(subject, parents=1):
+    """Classify one commit subject.
+
+    Returns a dict with "type" (added/fixed/changed/removed, or None when
+    /changelog has to infer it), the conventional "prefix" and "scope" if
+    any, "breaking" for a '!' prefix, and "noise" with the reason for a
+    commit that is skipped. Merge commits (parents > 1) are always noise.
+    """
+    result = {}
+    if parents > 1:
+        result['noise'] = 'merge'
+    else:
+        for reason, pattern in NOISE:
+            if pattern.search(subject):
+                result['noise'] = reason
+                break
+
+    m = CONVENTIONAL.match(subject)
+    if m:
+        prefix = m.group('prefix').lower()
+        result['prefix'] = prefix
+        if m.group('scope'):
+            result['scope'] = m.group('scope')
+        if m.group('breaking'):
+            result['breaking'] = True
+        result['type'] = PREFIX_TYPES.get(prefix)
+    else:
+        result['type'] = next((name for name, pattern in VERBS if pattern.search(subject)), None)
+    return result
+
+
+# --- Git ---
+
+class GitError(Exception):
+    """A git command failed (not a repository, unknown revision, ...)."""
+
+
+def git(args, cwd=None):
+    """Run git with args and return its stdout, stripped."""
+    proc = subprocess.run(['git'] + args, cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise GitError(proc.stderr.strip() or f"git {args[0]} failed")
+    return proc.stdout.strip()
+
+
+def repo_state(cwd=None):
+    """(git directory, HEAD hash or None for an empty repository, current branch name)."""
+    try:
+        git_dir, head, branch = git(['rev-parse', '--git-dir', 'HEAD', '--abbrev-ref', 'HEAD'],
+                                    cwd).split('\n')
+    except (GitError, ValueError):
+        # No commits yet: HEAD does not resolve
+        git_dir = git(['rev-parse', '--git-dir'], cwd)
+        head, branch = None, git(['symbolic-ref', '--short', '-q', 'HEAD'], cwd)
+    if cwd and not os.path.isabs(git_dir):
+        git_dir = os.path.join(cwd, git_dir)
+    return git_dir, head, branch
+
+
+def is_ancestor(commit, head, cwd=None):
+    return subprocess.run(['git', 'merge-base', '--is-ancestor', commit, head], cwd=cwd,
+                          capture_output=True).returncode == 0
+
+
+def iter_commits(revisions, cwd=None):
+    """Yield (hash, parent count, date, subject) oldest first, streamed from git log."""
+    proc = subprocess.Popen(['git', 'log', '--reverse', '--date=short', '--format=%H%x1f%P%x1f%cd%x1f%s']
+                            + revisions + ['--'], cwd=cwd, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True, encoding='utf-8', errors='replace')
+    try:
+        for line in proc.stdout:
+            commit, parents, date, subject = line.rstrip('\n').split('\x1f', 3)
+            yield commit, len(parents.split()), date, subject
+    finally:
+        proc.stdout.close()
+        if proc.wait() != 0:
+            raise GitError(f"git log {' '.join(revisions)} failed")
+
+
+# --- Changelog ---
+
+def load_changelog(path):
+    """Parsed changelog.json, or None if it does not exist or is not valid JSON."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def resolve_base(changelog, cwd=None):
+    """Hash of the commit the newest changelog entry covers up to, or None for all history.
+
+    Entries store the HEAD hash they were generated at as "commit". Older
+    entries without one fall back to the last commit on or before their date.
+    """
+    entries = (changelog or {}).get('entries') or []
+    if not entries or not isinstance(entries[0], dict):
+        return None
+    entry = entries[0]
+    try:
+        if entry.get('commit'):
+            return git(['rev-parse', '--verify', '-q', entry['commit'] + '^{commit}'], cwd)
+        if entry.get('date'):
+            return git(['rev-list', '-1', f"--before={entry['date']} 23:59:59", 'HEAD'], cwd) or None
+    except GitError:
+        pass
+    return None
+
+
+# --- Index ---
+
+class CommitIndex:
+    """Classified commits since a base commit, one JSON object per line.
+
+    The first line is a header ({"version": ..., "base": ...}); every other
+    line is one commit, oldest first, so the newest processed commit is
+    always the last line and new commits are appended. Only the header and
+    the tail are read to decide what is new.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def header(self):
+        """The header dict, or None if there is no usable index."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return header if isinstance(header, dict) and header.get('version') == INDEX_VERSION else None
+
+    def last_hash(self):
+        """Newest processed commit: the last line's hash, or the base while no commit is indexed.
+
+        Raises ValueError if the last line is torn (an interrupted write).
+        """
+        with open(self.path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            block = 4096
+            while True:
+                f.seek(max(0, size - block))
+                tail = f.read()
+                # The whole last line, unless the file is shorter than the block
+                if tail.count(b'\n') >= 2 or block >= size:
+                    break
+                block *= 4
+        if not tail.endswith(b'\n'):
+            raise ValueError("torn index")
+        last = json.loads(tail[:-1].rsplit(b'\n', 1)[-1])
+        return last['base'] if 'version' in last else last['hash']
+
+    def commits(self):
+        """Every commit record, oldest first (duplicates from racing runs dropped)."""
+        seen = set()
+        with open(self.path, encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('hash') not in seen:
+                    seen.add(record.get('hash'))
+                    yield record
+
+    def write(self, base, records, append=False):
+        """Append records, or (append=False) start the index over from base. Returns the count."""
+        count = 0
+        if not append:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"version": INDEX_VERSION, "base": base}) + '\n')
+                count = self.write_lines(f, records)
+            os.replace(tmp, self.path)
+            return count
+        with open(self.path, 'a', encoding='utf-8') as f:
+            return self.write_lines(f, records)
+
+    @staticmethod
+    def write_lines(f, records):
+        count = 0
+        batch = []
+        for record in records:
+            batch.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            if len(batch) >= WRITE_BATCH:
+                f.write('\n'.join(batch) + '\n')
+                count += len(batch)
+                batch.clear()
+        if batch:
+            f.write('\n'.join(batch) + '\n')
+            count += len(batch)
+        return count
+
+
+def commit_records(revisions, cwd=None):
+    for commit, parents, date, subject in iter_commits(revisions, cwd):
+        record = {"hash": commit, "date": date, "subject": subject}
+        record.update(classify(subject, parents))
+        yield record
+
+
+def collect(cwd=None, changelog=None):
+    """Bring the index up to date with HEAD.
+
+    Returns (index, stats): stats has "base", "head", "walked" (commits
+    read from git this run) and "rebuilt" (whether the index started over).
+    """
+    git_dir, head, _ = repo_state(cwd)
+    index = CommitIndex(os.path.join(git_dir, INDEX_FILE))
+    if changelog is None:
+        changelog = load_changelog(os.path.join(cwd or '.', CHANGELOG_FILE))
+    base = resolve_base(changelog, cwd)
+    stats = {"base": base, "head": head, "walked": 0, "rebuilt": False}
+
+    header = index.header()
+    if header is not None and header.get('base') == base:
+        try:
+            last = index.last_hash()
+            usable = True
+        except (OSError, ValueError, KeyError):
+            # Torn by an interrupted write
+            usable = False
+        if usable and last == head:
+            return index, stats
+        if usable and head is not None and (last is None or is_ancestor(last, head, cwd)):
+            stats['walked'] = index.write(base, commit_records([f'{last}..{head}' if last else head], cwd),
+                                          append=True)
+            return index, stats
+
+    # New entry published, history rewritten, or no usable index: start over
+    records = commit_records([f'{base}..{head}' if base else head], cwd) if head else []
+    stats['walked'] = index.write(base, records)
+    stats['rebuilt'] = True
+    return index, stats
+
+
+def pending(index):
+    """(meaningful commits, noise commit count) from the index, oldest first."""
+    commits = []
+    noise = 0
+    for record in index.commits():
+        if record.get('noise'):
+            noise += 1
+        else:
+            commits.append(record)
+    return commits, noise
+
+
+# --- Output ---
+
+def summarize(commits):
+    """Counts per change type, 'other' for commits /changelog has to infer."""
+    counts = {}
+    for record in commits:
+        kind = record.get('type') or 'other'
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+def describe(counts):
+    order = ['added', 'fixed', 'changed', 'removed', 'other']
+    return ', '.join(f"{counts[kind]} {kind}" for kind in order if counts.get(kind))
+
+
+def print_summary(commits, noise, stats):
+    print(f"{len(commits)} changes since {stats['base'][:12] if stats['base'] else 'the first commit'}"
+          f" ({noise} noise commits skipped; {stats['walked']} commits read this run)")
+    for record in commits:
+        print(f"  [{record.get('type') or 'other'}] {record['subject']}  ({record['hash'][:7]})")
+
+
+def hook_reminder(cwd=None):
+    """Text of the post-push reminder, or None when there is nothing to say."""
+    changelog_path = os.path.join(cwd or '.', CHANGELOG_FILE)
+    changelog = load_changelog(changelog_path)
+    main_branch = ((changelog or {}).get('config') or {}).get('mainBranch') or DEFAULT_BRANCH
+    _, _, branch = repo_state(cwd)
+    if branch != main_branch:
+        return None
+    if changelog is None:
+        return ("<additionalContext>\n## Changelog Not Initialized\n\n"
+                "You pushed to main but don't have a changelog yet.\n"
+                "Run `/changelog init` to set up changelog tracking.\n</additionalContext>")
+
+    index, stats = collect(cwd, changelog)
+    commits, noise = pending(index)
+    if not commits:
+        return None
+    since = "since the last entry" if stats['base'] else "in total"
+    skipped = f", {noise} noise commit{'s' if noise != 1 else ''} skipped" if noise else ""
+    changes = f"{len(commits)} change{'s' if len(commits) != 1 else ''}"
+    return (f"<additionalContext>\n## Changelog Reminder\n\n"
+            f"Pushed to {main_branch} with {changes} {since} "
+            f"({describe(summarize(commits))}{skipped}).\n\n"
+            "Ready to publish an update? Run:\n```\n/changelog\n```\n</additionalContext>")
+
+
+# --- Main ---
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='changelog-collect.py', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--json', action='store_true',
+                        help='print the pending commits and their classification as JSON')
+    parser.add_argument('--hook', action='store_true',
+                        help='print the post-push reminder (nothing off the main branch or when up to date)')
+    parser.add_argument('--rebuild', action='store_true', help='discard the index and walk again')
+    parser.add_argument('-C', dest='cwd', metavar='DIR', help='project directory (default: the current one)')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.hook:
+            reminder = hook_reminder(args.cwd)
+            if reminder:
+                print(reminder)
+            return 0
+        if args.rebuild:
+            git_dir, _, _ = repo_state(args.cwd)
+            try:
+                os.unlink(os.path.join(git_dir, INDEX_FILE))
+            except FileNotFoundError:
+                pass
+        index, stats = collect(args.cwd)
+    except GitError as e:
+        if args.hook:
+            # Never get in the way of a push outside a repository
+            return 0
+        print(f"changelog-collect: {e}", file=sys.stderr)
+        return 1
+
+    commits, noise = pending(index)
+    if args.json:
+        json.dump({"base": stats['base'], "head": stats['head'], "commits": commits,
+                   "counts": summarize(commits), "noise": noise}, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_summary(commits, noise, stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
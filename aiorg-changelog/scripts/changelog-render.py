@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Incremental CHANGELOG.md renderer for aiorg-changelog.
+
+Renders each changelog.json entry to a Markdown fragment once and caches
+it under a hash of the entry, so a release re-renders only the new or
+edited entries. CHANGELOG.md is then written by streaming the cached
+fragments, in entry order, into a temporary file that replaces the old
+one: the full document is never held in memory, and readers see either
+the old file or the new one. When neither the entries nor CHANGELOG.md
+changed since the last run, nothing is written at all.
+
+    changelog-render.py                   # regenerate CHANGELOG.md (/changelog sync)
+    changelog-render.py --add entry.json  # prepend an entry to changelog.json, then regenerate
+    changelog-render.py --add -           # ... reading the entry from stdin
+
+Both files are replaced atomically, and every run holds a lock while it
+reads and writes them, so concurrent runs never corrupt or drop entries.
+
+https://github.com/aiorgdev/claude-plugins
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+
+CHANGELOG_FILE = 'changelog.json'
+DEFAULT_MARKDOWN = 'CHANGELOG.md'
+# Stored in the git directory: it is a cache, never committed
+CACHE_DIR = 'aiorg-changelog-fragments'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'lock'
+# Bump when render_entry() output changes, so every fragment is rendered again
+RENDER_VERSION = 1
+
+HEADER = """# Changelog
+
+All notable changes to this project will be documented in this file.
+
+The format is based on [Keep a Changelog](https://keepachangelog.com/).
+
+---
+"""
+
+# Keep a Changelog section order; other change types follow in first-seen order
+SECTIONS = {
+    'added': 'Added',
+    'changed': 'Changed',
+    'deprecated': 'Deprecated',
+    'removed': 'Removed',
+    'fixed': 'Fixed',
+    'security': 'Security',
+}
+
+
+# --- Rendering ---
+
+def render_entry(entry):
+    """One entry as a Markdown fragment: heading, a section per change type, rule."""
+    heading = f"## {entry.get('date', '')}"
+    if entry.get('title'):
+        heading += f" - {entry['title']}"
+    groups = {}
+    for change in entry.get('changes') or []:
+        if isinstance(change, dict):
+            kind, text = (change.get('type') or 'changed').lower(), change.get('text', '')
+        else:
+            kind, text = 'changed', str(change)
+        groups.setdefault(kind, []).append(text)
+
+    lines = ['', heading, '']
+    for kind in [k for k in SECTIONS if k in groups] + [k for k in groups if k not in SECTIONS]:
+        lines.append(f"### {SECTIONS.get(kind) or kind.title()}")
+        lines.extend(f"- {text}" for text in groups[kind])
+        lines.append('')
+    lines.append('---')
+    return '\n'.join(lines) + '\n'
+
+
+def entry_key(entry):
+    """Cache key of an entry: a hash of its canonical JSON and RENDER_VERSION."""
+    data = json.dumps([RENDER_VERSION, entry], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+# --- Files ---
+
+def cache_dir(project='.'):
+    """Fragment cache directory: in the git directory, else under the per-user cache."""
+    import subprocess
+    proc = subprocess.run(['git', 'rev-parse', '--absolute-git-dir'], cwd=project,
+                          capture_output=True, text=True)
+    if proc.returncode == 0:
+        return os.path.join(proc.stdout.strip(), CACHE_DIR)
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    project_key = hashlib.sha1(os.path.abspath(project).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_home, 'aiorg-changelog', project_key)
+
+
+@contextmanager
+def atomic_write(path, durable=True):
+    """A file to write path's new content into; it replaces path when the block completes.
+
+    On an exception the old file is left untouched. durable=True syncs the
+    data to disk before the swap, so a crash cannot leave an empty file.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+            yield f
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def locked(directory):
+    """Hold an exclusive lock on directory's lock file (no lock where fcntl is missing)."""
+    os.makedirs(directory, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def file_state(path):
+    """What tells us a file changed behind our back, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def load_changelog(path):
+    """changelog.json as a dict. Raises OSError or ValueError."""
+    with open(path, encoding='utf-8') as f:
+        changelog = json.load(f)
+    if not isinstance(changelog, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    return changelog
+
+
+def write_changelog(path, changelog):
+    with atomic_write(path) as f:
+        json.dump(changelog, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+# --- Changelog ---
+
+def add_entry(project, entry):
+    """Insert entry into changelog.json, newest first, and return the updated changelog.
+
+    The entry goes above every entry of the same date or older. Call it
+    under locked(): the read-modify-write must not interleave with another.
+    """
+    path = os.path.join(project, CHANGELOG_FILE)
+    changelog = load_changelog(path)
+    entries = changelog.setdefault('entries', [])
+    date = entry.setdefault('date', time.strftime('%Y-%m-%d'))
+    position = next((i for i, other in enumerate(entries) if str(other.get('date', '')) <= date), len(entries))
+    entries.insert(position, entry)
+    write_changelog(path, changelog)
+    return changelog
+
+
+def render(project='.', changelog=None, cache=None):
+    """Bring the Markdown file up to date with changelog; returns stats.
+
+    Call it under locked(cache): pruning assumes no other run is reading fragments.
+    """
+    if changelog is None:
+        changelog = load_changelog(os.path.join(project, CHANGELOG_FILE))
+    cache = cache or cache_dir(project)
+    output = os.path.abspath(os.path.join(project, (changelog.get('config') or {}).get('markdownPath')
+                                          or DEFAULT_MARKDOWN))
+    entries = changelog.get('entries') or []
+    keys = [entry_key(entry) for entry in entries]
+    stats = {'path': output, 'entries': len(entries), 'rendered': 0, 'written': False, 'pruned': 0}
+
+    manifest_path = os.path.join(cache, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if (manifest.get('output') == output and manifest.get('keys') == keys
+            and manifest.get('state') == file_state(output)):
+        return stats
+
+    # Only entries without a cached fragment are rendered
+    os.makedirs(cache, exist_ok=True)
+    for key, entry in zip(keys, entries):
+        fragment = os.path.join(cache, key + '.md')
+        if not os.path.exists(fragment):
+            with atomic_write(fragment, durable=False) as f:
+                f.write(render_entry(entry))
+            stats['rendered'] += 1
+
+    # A prepend moves every byte, so the file is rewritten, but one fragment at a time
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with atomic_write(output) as out:
+        out.write(HEADER)
+        for key in keys:
+            with open(os.path.join(cache, key + '.md'), encoding='utf-8') as f:
+                shutil.copyfileobj(f, out)
+    stats['written'] = True
+
+    with atomic_write(manifest_path, durable=False) as f:
+        json.dump({"version": RENDER_VERSION, "output": output, "state": file_state(output), "keys": keys}, f)
+
+    # Fragments of deleted or edited entries
+    live = set(keys)
+    for name in os.listdir(cache):
+        if name.endswith('.md') and name[:-3] not in live:
+            try:
+                os.unlink(os.path.join(cache, name))
+                stats['pruned'] += 1
+            except OSError:
+                pass
+    return stats
+
+
+# --- Main ---
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='changelog-render.py', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--add', metavar='FILE',
+                        help='prepend the entry in FILE (a JSON object; - for stdin) to changelog.json first')
+    parser.add_argument('--json-only', action='store_true', help='update changelog.json only, skip the Markdown')
+    parser.add_argument('-C', dest='cwd', metavar='DIR', default='.',
+                        help='project directory (default: the current one)')
+    args = parser.parse_args(argv)
+
+    try:
+        entry = None
+        if args.add:
+            if args.add == '-':
+                entry = json.load(sys.stdin)
+            else:
+                with open(args.add, encoding='utf-8') as f:
+                    entry = json.load(f)
+            if not isinstance(entry, dict):
+                raise ValueError("the entry must be a JSON object")
+
+        cache = cache_dir(args.cwd)
+        with locked(cache):
+            if entry is not None:
+                changelog = add_entry(args.cwd, entry)
+            else:
+                changelog = load_changelog(os.path.join(args.cwd, CHANGELOG_FILE))
+            if args.json_only or (changelog.get('config') or {}).get('generateMarkdown') is False:
+                print(f"{CHANGELOG_FILE} has {len(changelog.get('entries') or [])} entries (Markdown skipped)")
+                return 0
+            stats = render(args.cwd, changelog, cache)
+    except FileNotFoundError as e:
+        print(f"changelog-render: {e.filename} not found"
+              + (" - run /changelog init first" if e.filename.endswith(CHANGELOG_FILE) else ""), file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"changelog-render: {e}", file=sys.stderr)
+        return 1
+
+    name = os.path.relpath(stats['path'], args.cwd)
+    if stats['written']:
+        print(f"{name} regenerated with {stats['entries']} entries "
+              f"({stats['rendered']} rendered, {stats['entries'] - stats['rendered']} cached)")
+    else:
+        print(f"{name} up to date ({stats['entries']} entries)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
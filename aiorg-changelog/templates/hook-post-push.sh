@@ -10,58 +10,12 @@
 #
 # Note: This is a reminder hook, not automatic generation.
 # Run /changelog manually when you're ready to publish updates.
+#
+# The work is done by scripts/changelog-collect.py: it counts the
+# meaningful commits since the last changelog entry (by commit hash,
+# noise filtered) and keeps an index in the git directory, so each push
+# only reads the commits it added.
 
-# Get the current branch
-CURRENT_BRANCH=$(git branch --show-current)
-
-# Get main branch from changelog config or default to main
-if [ -f "changelog.json" ]; then
-  MAIN_BRANCH=$(grep -o '"mainBranch"[[:space:]]*:[[:space:]]*"[^"]*"' changelog.json | cut -d'"' -f4)
-fi
-MAIN_BRANCH=${MAIN_BRANCH:-main}
-
-# Only run on main branch
-if [ "$CURRENT_BRANCH" != "$MAIN_BRANCH" ]; then
-  exit 0
-fi
-
-# Check if changelog.json exists
-if [ ! -f "changelog.json" ]; then
-  cat << 'REMINDER'
-<additionalContext>
-## Changelog Not Initialized
-
-You pushed to main but don't have a changelog yet.
-Run `/changelog init` to set up changelog tracking.
-</additionalContext>
-REMINDER
-  exit 0
-fi
-
-# Get last changelog entry date
-LAST_ENTRY_DATE=$(grep -o '"date"[[:space:]]*:[[:space:]]*"[^"]*"' changelog.json | head -1 | cut -d'"' -f4)
-
-if [ -z "$LAST_ENTRY_DATE" ]; then
-  # No entries yet
-  COMMITS_SINCE="all commits"
-else
-  # Count commits since last entry
-  COMMIT_COUNT=$(git log --oneline --since="$LAST_ENTRY_DATE" | wc -l | tr -d ' ')
-  COMMITS_SINCE="$COMMIT_COUNT commits since $LAST_ENTRY_DATE"
-fi
-
-# Only show reminder if there are commits
-if [ "$COMMITS_SINCE" != "0 commits since $LAST_ENTRY_DATE" ]; then
-  cat << REMINDER
-<additionalContext>
-## Changelog Reminder
-
-Pushed to $MAIN_BRANCH with $COMMITS_SINCE.
+PLUGIN_ROOT="${CLAUDE_PLUGIN_ROOT:-$HOME/.claude/plugins/aiorg-changelog}"
 
-Ready to publish an update? Run:
-\`\`\`
-/changelog
-\`\`\`
-</additionalContext>
-REMINDER
-fi
+exec python3 "$PLUGIN_ROOT/scripts/changelog-collect.py" --hook
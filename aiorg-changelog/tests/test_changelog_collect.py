@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Tests for the aiorg-changelog commit collector.
+
+Builds synthetic repositories with git fast-import (tens of thousands of
+commits in about a second) and checks classification, the incremental
+index and the post-push reminder.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'changelog-collect.py')
+
+# Load collector functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='T', GIT_AUTHOR_EMAIL='t@example.com',
+               GIT_COMMITTER_NAME='T', GIT_COMMITTER_EMAIL='t@example.com')
+
+# One of each kind of subject the collector has to tell apart
+SUBJECTS = [
+    "feat: add user dashboard",
+    "fix(auth): login redirect loop",
+    "perf: cache rendered pages",
+    "refactor!: drop the v1 API client",
+    "docs: explain rule files",
+    "chore: update deps",
+    "Add dark mode toggle",
+    "Remove legacy exporter",
+    "misc cleanup",
+    "wip",
+    "WIP: half done",
+    "fix typo in README",
+    "formatting",
+    "chore: bump version to 1.4.0",
+    "v1.4.0",
+]
+
+
+def make_repo(count, merges_every=0):
+    """A fresh repository whose main branch has count commits cycling through SUBJECTS.
+
+    Every merges_every-th commit (if set) is a merge of a one-commit side branch.
+    """
+    path = tempfile.mkdtemp()
+    subprocess.run(['git', 'init', '-q', '-b', 'main', path], check=True)
+    stream = []
+    mark = 0
+    main = None
+
+    def add(ref, subject, when, parents):
+        nonlocal mark
+        mark += 1
+        message = subject.encode()
+        stream.append(b'commit refs/heads/%s\nmark :%d\ncommitter T <t@example.com> %d +0000\ndata %d\n%s\n'
+                      % (ref, mark, 1700000000 + when, len(message), message))
+        for i, parent in enumerate(parents):
+            stream.append(b'%s :%d\n' % (b'merge' if i else b'from', parent))
+        return mark
+
+    for i in range(count):
+        parents = [main] if main else []
+        if merges_every and main and i % merges_every == 0:
+            # A one-commit side branch, merged back into main
+            side = add(b'side', "side change", i * 60, parents)
+            main = add(b'main', "Merge branch 'side'", i * 60 + 1, [main, side])
+        else:
+            main = add(b'main', SUBJECTS[i % len(SUBJECTS)], i * 60, parents)
+    subprocess.run(['git', 'fast-import', '--quiet'], input=b''.join(stream), cwd=path, check=True)
+    subprocess.run(['git', 'reset', '-q', '--hard'], cwd=path, check=True)
+    return path
+
+
+def commit(path, subject):
+    subprocess.run(['git', 'commit', '-q', '--allow-empty', '-m', subject], cwd=path, env=GIT_ENV, check=True)
+    return git(['rev-parse', 'HEAD'], path)
+
+
+def write_changelog(path, entries, main_branch='main'):
+    with open(os.path.join(path, CHANGELOG_FILE), 'w') as f:
+        json.dump({"config": {"mainBranch": main_branch}, "entries": entries}, f)
+
+
+def index_lines(path):
+    with open(os.path.join(repo_state(path)[0], INDEX_FILE)) as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    passed = 0
+    failed = 0
+
+    def check(name, ok):
+        nonlocal passed, failed
+        if ok:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+
+    repos = []
+
+    print("\n=== Classification ===")
+    check("feat -> added",            classify("feat: add user dashboard")["type"] == "added")
+    check("fix with scope -> fixed",  classify("fix(auth): login redirect loop")
+          == {"prefix": "fix", "scope": "auth", "type": "fixed"})
+    check("perf/refactor -> changed", classify("perf: x")["type"] == classify("refactor: x")["type"] == "changed")
+    check("breaking flag",            classify("refactor!: drop v1")["breaking"] is True)
+    check("docs -> changed",          classify("docs: explain rules")["type"] == "changed")
+    check("chore left to infer",      classify("chore: update deps") == {"prefix": "chore", "type": None})
+    check("leading verb inferred",    classify("Add dark mode")["type"] == "added"
+                                      and classify("Remove exporter")["type"] == "removed")
+    check("plain subject to infer",   classify("misc cleanup") == {"type": None})
+    for subject, reason in [("wip", "wip"), ("WIP: half done", "wip"), ("work in progress on auth", "wip"),
+                            ("fix typo in README", "typo"), ("typo fix", "typo"), ("formatting", "typo"),
+                            ("Merge branch 'x'", "merge"), ("Merge pull request #12 from a/b", "merge"),
+                            ("chore: bump version to 1.4.0", "version"), ("v1.4.0", "version"),
+                            ("1.4.0-rc.1", "version"), ("Release 2.0", "version")]:
+        check(f"noise: {subject}", classify(subject).get("noise") == reason)
+    check("merge by parents",         classify("Sync", parents=2).get("noise") == "merge")
+    check("not noise: wipe",          "noise" not in classify("feat: wipe caches on logout"))
+    check("not noise: version words", "noise" not in classify("feat: show version in footer"))
+
+    print("\n=== Synthetic repository (20,000 commits) ===")
+    path = make_repo(20_000, merges_every=97)
+    repos.append(path)
+    start = time.perf_counter()
+    index, stats = collect(path)
+    first = time.perf_counter() - start
+    commits, noise = pending(index)
+    total = int(git(['rev-list', '--count', 'HEAD'], path))
+    check(f"first run walks all ({stats['walked']} in {first:.2f}s)",
+          stats['walked'] == total and stats['rebuilt'])
+    check("every commit classified",  len(commits) + noise == total)
+    merges = int(git(['rev-list', '--count', '--merges', 'HEAD'], path))
+    check("merges skipped",           sum(1 for r in index.commits() if r.get('noise') == 'merge') == merges)
+    check("oldest first",             commits[0]['subject'] == SUBJECTS[0])
+
+    start = time.perf_counter()
+    index, stats = collect(path)
+    again = time.perf_counter() - start
+    check(f"up to date: nothing walked ({again * 1000:.0f} ms)", stats['walked'] == 0 and not stats['rebuilt']
+          and again < first / 5)
+    lines = index_lines(path)
+    for subject in ["feat: new exporter", "fix: exporter crash", "wip"]:
+        head = commit(path, subject)
+    start = time.perf_counter()
+    index, stats = collect(path)
+    incremental = time.perf_counter() - start
+    check(f"only new commits walked ({incremental * 1000:.0f} ms)",
+          stats['walked'] == 3 and not stats['rebuilt'] and stats['head'] == head)
+    check("index appended",           index_lines(path) == lines + 3)
+    commits, noise = pending(index)
+    check("new commits pending",      [c['subject'] for c in commits[-2:]] == ["feat: new exporter",
+                                                                               "fix: exporter crash"])
+
+    print("\n=== Changelog entries ===")
+    write_changelog(path, [{"date": "2024-12-19", "commit": head, "changes": []}])
+    index, stats = collect(path)
+    check("entry moves the base",     stats['base'] == head and stats['rebuilt'] and pending(index) == ([], 0))
+    after = commit(path, "feat: after the entry")
+    index, stats = collect(path)
+    check("walks past the entry only", stats['walked'] == 1
+          and [c['hash'] for c in pending(index)[0]] == [after])
+    write_changelog(path, [{"date": "1970-01-01"}])
+    check("legacy entry by date",     collect(path)[1]['base'] is None)
+    cutoff = time.strftime('%Y-%m-%d', time.gmtime(1700000000 + 10_000 * 60))
+    write_changelog(path, [{"date": cutoff}])
+    index, stats = collect(path)
+    check("date resolves to a commit", stats['base'] is not None
+          and 0 < stats['walked'] < total)
+    write_changelog(path, [{"commit": "0" * 40}])
+    check("unknown commit -> all history", collect(path)[1]['base'] is None)
+
+    print("\n=== Index recovery ===")
+    write_changelog(path, [{"commit": head}])
+    collect(path)
+    subprocess.run(['git', 'reset', '-q', '--hard', 'HEAD~1'], cwd=path, check=True)
+    rewritten = commit(path, "fix: rewritten history")
+    index, stats = collect(path)
+    check("rewritten history rebuilt", stats['rebuilt'] and [c['hash'] for c in pending(index)[0]] == [rewritten])
+    with open(index.path, 'a') as f:
+        f.write('{"hash": "torn')
+    index, stats = collect(path)
+    check("torn tail rebuilt",        stats['rebuilt'] and [c['hash'] for c in pending(index)[0]] == [rewritten])
+    with open(index.path, 'a') as f:
+        f.write(json.dumps({"hash": rewritten, "subject": "dup", "type": None}) + '\n')
+    check("racing duplicate dropped", [c['subject'] for c in pending(index)[0]] == ["fix: rewritten history"])
+    with open(index.path, 'r+') as f:
+        f.write('{"version": 0, "base": null}\n')
+    check("old index version rebuilt", collect(path)[1]['rebuilt'])
+    long_subject = "feat: " + "x" * 10_000
+    commit(path, long_subject)
+    collect(path)
+    check("long last line",           not collect(path)[1]['rebuilt'] and collect(path)[1]['walked'] == 0)
+
+    print("\n=== Post-push reminder ===")
+    empty = tempfile.mkdtemp()
+    repos.append(empty)
+    subprocess.run(['git', 'init', '-q', '-b', 'main', empty], check=True)
+    check("empty repository",         collect(empty)[1]['head'] is None and pending(collect(empty)[0]) == ([], 0))
+    check("not initialized",          "Changelog Not Initialized" in hook_reminder(empty))
+    small = make_repo(30)
+    repos.append(small)
+    write_changelog(small, [])
+    reminder = hook_reminder(small)
+    check("reminder counts changes",  "with 18 changes in total" in reminder
+                                      and "4 added" in reminder and "12 noise commits skipped" in reminder)
+    write_changelog(small, [{"commit": git(['rev-parse', 'HEAD'], small)}])
+    check("silent when up to date",   hook_reminder(small) is None)
+    write_changelog(small, [], main_branch='release')
+    check("silent off the main branch", hook_reminder(small) is None)
+    outside = tempfile.mkdtemp()
+    repos.append(outside)
+    proc = subprocess.run([sys.executable, SCRIPT, '--hook', '-C', outside], capture_output=True, text=True)
+    check("hook outside a repository", proc.returncode == 0 and proc.stdout == '')
+    proc = subprocess.run([sys.executable, SCRIPT, '--json', '-C', small], capture_output=True, text=True)
+    check("--json output",            proc.returncode == 0 and json.loads(proc.stdout)['counts']['added'] == 4)
+
+    for repo in repos:
+        shutil.rmtree(repo, ignore_errors=True)
+
+    print(f"\n{'=' * 50}")
+    print(f"Results: {passed}/{passed + failed} passed, {failed} failed")
+    if failed:
+        print("SOME TESTS FAILED")
+        sys.exit(1)
+    else:
+        print("ALL TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Tests for the aiorg-changelog Markdown renderer.
+
+Checks the CHANGELOG.md format against the one documented in
+commands/changelog.md, that only new or edited entries are rendered,
+that the file is streamed rather than built in memory, and that
+concurrent runs never corrupt or drop entries.
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'changelog-render.py')
+
+# Load renderer functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+# The sync example from commands/changelog.md
+EXAMPLE_ENTRIES = [
+    {"date": "2024-12-19", "title": "Dashboard and bug fixes", "commit": "4f2c9e1",
+     "narrative": "This week we shipped the user dashboard you've been asking for.",
+     "changes": [{"type": "added", "text": "User dashboard with analytics"},
+                 {"type": "fixed", "text": "Login redirect issue"},
+                 {"type": "added", "text": "Profile settings page"}]},
+    {"date": "2024-12-15", "title": "Initial release",
+     "changes": [{"type": "added", "text": "Landing page"},
+                 {"type": "added", "text": "User authentication"}]},
+]
+EXAMPLE_MARKDOWN = """# Changelog
+
+All notable changes to this project will be documented in this file.
+
+The format is based on [Keep a Changelog](https://keepachangelog.com/).
+
+---
+
+## 2024-12-19 - Dashboard and bug fixes
+
+### Added
+- User dashboard with analytics
+- Profile settings page
+
+### Fixed
+- Login redirect issue
+
+---
+
+## 2024-12-15 - Initial release
+
+### Added
+- Landing page
+- User authentication
+
+---
+"""
+
+
+def make_project(entries, config=None):
+    """A git repository holding a changelog.json with these entries."""
+    path = tempfile.mkdtemp()
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    write_changelog(os.path.join(path, CHANGELOG_FILE), {"config": config or {"mainBranch": "main"},
+                                                         "entries": entries})
+    return path
+
+
+def make_entries(count, changes=3, text_length=40):
+    """count weekly entries, newest first."""
+    entries = []
+    for i in range(count):
+        day = count - i
+        entries.append({"date": f"{2000 + day // 365:04d}-{day % 12 + 1:02d}-{day % 28 + 1:02d}",
+                        "title": f"Release {day}",
+                        "changes": [{"type": ['added', 'fixed', 'changed'][j % 3],
+                                     "text": f"Change {day}.{j} " + "x" * text_length}
+                                    for j in range(changes)]})
+    return entries
+
+
+def full_render(entries):
+    """The document rendered the slow way, for comparison."""
+    return HEADER + ''.join(render_entry(entry) for entry in entries)
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def main():
+    passed = 0
+    failed = 0
+
+    def check(name, ok):
+        nonlocal passed, failed
+        if ok:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+
+    projects = []
+
+    print("\n=== Format ===")
+    path = make_project(EXAMPLE_ENTRIES)
+    projects.append(path)
+    markdown = os.path.join(path, DEFAULT_MARKDOWN)
+    render(path)
+    check("documented example",       read(markdown) == EXAMPLE_MARKDOWN)
+    check("no entries: init template", HEADER + ''.join(render_entry(e) for e in []) == full_render([]))
+    odd = render_entry({"date": "2025-01-02", "changes": [{"type": "security", "text": "s"},
+                                                          {"type": "performance", "text": "p"},
+                                                          "plain text", {"type": "Added", "text": "a"}]})
+    check("untitled heading",         odd.startswith("\n## 2025-01-02\n\n"))
+    check("section order",            [line for line in odd.split('\n') if line.startswith('###')]
+          == ["### Added", "### Changed", "### Security", "### Performance"])
+    check("plain string change",      "### Changed\n- plain text\n" in odd)
+    check("no changes",               render_entry({"date": "2025-01-03", "title": "Quiet"})
+          == "\n## 2025-01-03 - Quiet\n\n---\n")
+    check("same entry, same key",     entry_key(dict(EXAMPLE_ENTRIES[0])) == entry_key(EXAMPLE_ENTRIES[0]))
+    check("key ignores key order",    entry_key({"a": 1, "b": 2}) == entry_key({"b": 2, "a": 1}))
+    check("key sees every field",     entry_key({"date": "x", "title": "a"}) != entry_key({"date": "x", "title": "b"}))
+
+    print("\n=== Incremental rendering (5,000 entries) ===")
+    entries = make_entries(5000)
+    path = make_project(entries)
+    projects.append(path)
+    markdown = os.path.join(path, DEFAULT_MARKDOWN)
+    cache = cache_dir(path)
+    stats = render(path)
+    check("first run renders all",    stats['rendered'] == 5000 and stats['written'])
+    check("matches a full render",    read(markdown) == full_render(entries))
+    check("cache in the git dir",     cache == os.path.join(path, '.git', CACHE_DIR)
+          and len(glob.glob(os.path.join(cache, '*.md'))) == 5000)
+    before = file_state(markdown)
+    stats = render(path)
+    check("unchanged: nothing written", not stats['written'] and stats['rendered'] == 0
+          and file_state(markdown) == before)
+
+    changelog = add_entry(path, {"date": "2099-01-01", "title": "Newest",
+                                 "changes": [{"type": "added", "text": "Time travel"}]})
+    stats = render(path, changelog)
+    check("prepend renders one",      stats['rendered'] == 1 and stats['written'])
+    check("prepended on top",         read(markdown).startswith(HEADER + "\n## 2099-01-01 - Newest\n"))
+    changelog = add_entry(path, {"date": "1999-01-01", "title": "Backfilled", "changes": []})
+    check("older entry sorted by date", changelog['entries'][-1]['title'] == "Backfilled")
+    changelog = add_entry(path, {"date": "2099-01-01", "title": "Same day", "changes": []})
+    check("same date goes on top",    [e['title'] for e in changelog['entries'][:2]] == ["Same day", "Newest"])
+    check("both rendered",            render(path, changelog)['rendered'] == 2)
+
+    changelog['entries'][100]['title'] = "Edited"
+    stats = render(path, changelog)
+    check("edit renders one",         stats['rendered'] == 1 and stats['pruned'] == 1)
+    del changelog['entries'][200]
+    stats = render(path, changelog)
+    check("delete renders none",      stats['rendered'] == 0 and stats['written'] and stats['pruned'] == 1)
+    check("still a full render",      read(markdown) == full_render(changelog['entries']))
+    check("fragments pruned",         len(glob.glob(os.path.join(cache, '*.md'))) == len(changelog['entries']))
+    check("no temp files left",       not glob.glob(os.path.join(cache, '*.tmp'))
+          and not glob.glob(os.path.join(path, '*.tmp')))
+
+    print("\n=== Recovery ===")
+    with open(markdown, 'w') as f:
+        f.write("hand edited\n")
+    stats = render(path, changelog)
+    check("edited Markdown rewritten", stats['written'] and stats['rendered'] == 0
+          and read(markdown) == full_render(changelog['entries']))
+    os.unlink(markdown)
+    check("deleted Markdown rewritten", render(path, changelog)['written'] and os.path.exists(markdown))
+    for fragment in glob.glob(os.path.join(cache, '*.md'))[:10]:
+        os.unlink(fragment)
+    stats = render(path, changelog)
+    check("up to date: fragments unread", stats['rendered'] == 0 and not stats['written'])
+    with open(markdown, 'a') as f:
+        f.write("x")
+    stats = render(path, changelog)
+    check("missing fragments rendered",  stats['rendered'] == 10 and read(markdown) == full_render(changelog['entries']))
+    with open(os.path.join(cache, MANIFEST_FILE), 'w') as f:
+        f.write("{torn")
+    check("torn manifest",            render(path, changelog)['written'])
+    changelog['config']['markdownPath'] = 'docs/CHANGES.md'
+    stats = render(path, changelog)
+    check("markdownPath honored",     stats['written'] and stats['rendered'] == 0
+          and read(os.path.join(path, 'docs', 'CHANGES.md')) == full_render(changelog['entries']))
+
+    class Interrupted(Exception):
+        pass
+    target = os.path.join(path, 'kept.txt')
+    with open(target, 'w') as f:
+        f.write("old")
+    try:
+        with atomic_write(target) as f:
+            f.write("half")
+            raise Interrupted
+    except Interrupted:
+        pass
+    check("interrupted write keeps old", read(target) == "old" and not glob.glob(target + '.*.tmp'))
+
+    print("\n=== Streaming ===")
+    entries = make_entries(2000, changes=40, text_length=80)
+    path = make_project(entries)
+    projects.append(path)
+    changelog = load_changelog(os.path.join(path, CHANGELOG_FILE))
+    render(path, changelog)
+    size = os.path.getsize(os.path.join(path, DEFAULT_MARKDOWN))
+    changelog['entries'].insert(0, {"date": "2099-01-01", "title": "Newest", "changes": []})
+    tracemalloc.start()
+    stats = render(path, changelog)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    check(f"peak {peak >> 10} KB for a {size >> 20} MB file", stats['written'] and peak < size / 8)
+
+    print("\n=== Concurrent runs ===")
+    path = make_project(make_entries(50))
+    projects.append(path)
+    procs = []
+    for i in range(16):
+        entry = json.dumps({"date": "2099-01-01", "title": f"Concurrent {i}", "changes": []})
+        proc = subprocess.Popen([sys.executable, SCRIPT, '--add', '-', '-C', path], stdin=subprocess.PIPE,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        proc.stdin.write(entry)
+        proc.stdin.close()
+        procs.append(proc)
+    errors = [proc.stderr.read() for proc in procs if proc.wait() != 0]
+    changelog = load_changelog(os.path.join(path, CHANGELOG_FILE))
+    titles = {e['title'] for e in changelog['entries']}
+    check("every run succeeded",      not errors)
+    check("no entry lost",            len(changelog['entries']) == 66
+                                      and all(f"Concurrent {i}" in titles for i in range(16)))
+    check("Markdown matches the JSON", read(os.path.join(path, DEFAULT_MARKDOWN)) == full_render(changelog['entries']))
+
+    print("\n=== Command line ===")
+    path = tempfile.mkdtemp()
+    projects.append(path)
+    proc = subprocess.run([sys.executable, SCRIPT, '-C', path], capture_output=True, text=True)
+    check("no changelog",             proc.returncode == 1 and "run /changelog init" in proc.stderr)
+    path = make_project([], config={"generateMarkdown": False})
+    projects.append(path)
+    proc = subprocess.run([sys.executable, SCRIPT, '-C', path], capture_output=True, text=True)
+    check("generateMarkdown false",   proc.returncode == 0 and not os.path.exists(os.path.join(path, DEFAULT_MARKDOWN)))
+    path = make_project(EXAMPLE_ENTRIES[1:])
+    projects.append(path)
+    proc = subprocess.run([sys.executable, SCRIPT, '--add', '-', '--json-only', '-C', path],
+                          input=json.dumps(EXAMPLE_ENTRIES[0]), capture_output=True, text=True)
+    check("--json-only",              proc.returncode == 0 and not os.path.exists(os.path.join(path, DEFAULT_MARKDOWN))
+          and len(load_changelog(os.path.join(path, CHANGELOG_FILE))['entries']) == 2)
+    proc = subprocess.run([sys.executable, SCRIPT, '-C', path], capture_output=True, text=True)
+    check("sync message",             proc.stdout.strip() == "CHANGELOG.md regenerated with 2 entries (2 rendered, 0 cached)"
+          and read(os.path.join(path, DEFAULT_MARKDOWN)) == EXAMPLE_MARKDOWN)
+    proc = subprocess.run([sys.executable, SCRIPT, '--add', '-', '-C', path], input='["not", "an", "entry"]',
+                          capture_output=True, text=True)
+    check("bad entry rejected",       proc.returncode == 1 and "JSON object" in proc.stderr)
+
+    for project in projects:
+        shutil.rmtree(project, ignore_errors=True)
+
+    print(f"\n{'=' * 50}")
+    print(f"Results: {passed}/{passed + failed} passed, {failed} failed")
+    if failed:
+        print("SOME TESTS FAILED")
+        sys.exit(1)
+    else:
+        print("ALL TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1026 @@
+#!/usr/bin/env python3
+"""
+Indexed task engine for aiorg-todo.
+
+Parses the TODO.md team board -- one "## Name" section per person, each
+with Active / Backlog / Done subsections of task lines:
+
+    - [ ] [Category] Description | Priority: Level | Due: Date
+
+and keeps a sidecar index of where each person's section starts and
+ends, with per-person counts by due date and priority. With a valid
+index, showing or editing one person's tasks reads and parses only that
+section. An edit renders only the sections it changed; every other byte
+is copied into a new file, never parsed, which then replaces TODO.md in
+one rename, so readers see the old board or the new one, never half.
+
+Edits are queued, and applied under an advisory lock by whichever
+process holds it: concurrent runs are grouped into one pass and one
+write, and none is lost. batch applies many operations -- a bulk
+import, or closing a dozen tasks -- the same way.
+
+The index is trusted while TODO.md's size, mtime and inode are the ones
+it recorded. Otherwise the file is split into sections again and only
+those whose hash changed are parsed, so a hand edit or a git pull costs
+only the sections it touched.
+
+    todo-engine.py                                  # my Active tasks, sorted (/todo)
+    todo-engine.py add "Fix login" --priority High --due Today
+    todo-engine.py done 2 5                         # by number in the list, or by text
+    todo-engine.py assign @Alex "Review the PR"
+    todo-engine.py all                              # every person's Active tasks
+    todo-engine.py batch ops.jsonl                  # many operations, one write (- for stdin)
+
+https://github.com/aiorgdev/claude-plugins
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date
+
+# --- Configuration ---
+
+TODO_FILE = 'TODO.md'
+USER_FILE = '.claude-user'
+# Stored in the git directory: it is a cache, never committed
+INDEX_DIR = 'aiorg-todo'
+# Bump when parsing or the index layout changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+# Seconds to wait for another process's write before giving up, and how often to retry
+LOCK_TIMEOUT = 10.0
+LOCK_POLL = 0.005
+# Seconds a result waits for a requester that never came back for it
+RESULT_TTL = 3600
+# Bytes of unchanged sections copied at a time when TODO.md is rewritten
+COPY_CHUNK = 1024 * 1024
+
+SUBSECTIONS = ['Active', 'Backlog', 'Done']
+CATEGORIES = ['Dev', 'Marketing', 'Product', 'Review', 'Admin']
+PRIORITIES = ['High', 'Medium', 'Low']
+DUE_DATES = ['Today', 'Tomorrow', 'This Week', 'Next Week']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Polish spellings of the words the board is sorted by
+ALIASES = {
+    'aktywne': 'Active', 'zrobione': 'Done',
+    'wysoki': 'High', 'wysoka': 'High', 'pilne': 'High',
+    'średni': 'Medium', 'średnia': 'Medium', 'niski': 'Low', 'niska': 'Low',
+    'dziś': 'Today', 'dzisiaj': 'Today', 'jutro': 'Tomorrow',
+    'w tym tygodniu': 'This Week', 'w przyszłym tygodniu': 'Next Week',
+    'poniedziałek': 'Monday', 'wtorek': 'Tuesday', 'środa': 'Wednesday', 'czwartek': 'Thursday',
+    'piątek': 'Friday', 'sobota': 'Saturday', 'niedziela': 'Sunday',
+}
+
+# Show groups by due date, in sort order
+DUE_GROUPS = ['Due Today', 'Tomorrow', 'This Week', 'Next Week', 'Later', 'No Due Date']
+
+SECTION_HEADING = re.compile(rb'^## (.*?)[ \t]*\r?$', re.M)
+SUBHEADING = re.compile(r'^### (.*?)\s*$')
+TASK_LINE = re.compile(r'^- \[([ xX])\] (?:\[([^\]\n]*)\] )?(.*?)\s*$')
+FIELD = re.compile(r'^([A-Z][\w ]*?): (.*)$')
+
+
+def canonical(word, choices=None):
+    """word in its English board spelling (Polish and odd casing accepted)."""
+    word = ' '.join(word.split())
+    word = ALIASES.get(word.lower(), word)
+    for choice in choices or SUBSECTIONS + PRIORITIES + DUE_DATES + WEEKDAYS:
+        if choice.lower() == word.lower():
+            return choice
+    return word
+
+
+class TaskError(Exception):
+    """An operation that cannot be carried out, with a message for the user."""
+
+
+class BoardChanged(TaskError):
+    """TODO.md was changed by a writer that doesn't take the lock while we edited it."""
+
+
+class BoardLocked(TaskError):
+    """Another process held the write lock for longer than LOCK_TIMEOUT."""
+
+
+# --- Tasks ---
+
+class Task:
+    """One task line, with the indented lines under it.
+
+    Parsed tasks keep their original text and are written back byte for
+    byte; only new or modified tasks are rendered.
+    """
+
+    __slots__ = ('done', 'category', 'text', 'fields', 'raw', 'extra')
+
+    def __init__(self, text, category=None, done=False, fields=None):
+        self.done = done
+        self.category = category
+        self.text = text
+        self.fields = fields or {}
+        self.raw = None
+        self.extra = []
+
+    @classmethod
+    def parse(cls, line):
+        """A Task from a board line, or None if it is not a task line."""
+        m = TASK_LINE.match(line)
+        if not m:
+            return None
+        parts = m[3].split(' | ')
+        # Fields are the trailing "Key: Value" parts; a " | " before them is part of the text
+        first = len(parts)
+        while first > 1 and FIELD.match(parts[first - 1]):
+            first -= 1
+        fields = dict(FIELD.match(part).groups() for part in parts[first:])
+        task = cls(' | '.join(parts[:first]), m[2], m[1] != ' ', fields)
+        task.raw = line
+        return task
+
+    @property
+    def priority(self):
+        value = self.fields.get('Priority')
+        return canonical(value, PRIORITIES) if value else None
+
+    @property
+    def due(self):
+        value = self.fields.get('Due')
+        return canonical(value, DUE_DATES + WEEKDAYS) if value else None
+
+    def render(self):
+        if self.raw is not None:
+            return self.raw + ''.join(self.extra)
+        line = f"- [{'x' if self.done else ' '}] "
+        if self.category:
+            line += f"[{self.category}] "
+        line += ' | '.join([self.text] + [f"{key}: {value}" for key, value in self.fields.items()])
+        return line + '\n' + ''.join(self.extra)
+
+    def label(self):
+        """The task as shown to the user: [Priority] [Category] Description."""
+        parts = [f"[{self.priority}]"] if self.priority else []
+        if self.category:
+            parts.append(f"[{self.category}]")
+        return ' '.join(parts + [self.text])
+
+    def as_dict(self):
+        return {"done": self.done, "category": self.category, "text": self.text, "priority": self.priority,
+                "due": self.due, "fields": self.fields}
+
+
+def due_rank(due, today=None):
+    """Index into DUE_GROUPS: Today < Tomorrow < This Week < Next Week < later < no date."""
+    if not due:
+        return 5
+    if due in DUE_DATES:
+        return DUE_DATES.index(due)
+    if due in WEEKDAYS:
+        return 2
+    try:
+        days = (date.fromisoformat(due) - (today or date.today())).days
+    except ValueError:
+        return 4
+    return 0 if days <= 0 else 1 if days == 1 else 2 if days < 7 else 3 if days < 14 else 4
+
+
+def priority_rank(priority):
+    # Unset counts as Medium, the default /todo add uses
+    return PRIORITIES.index(priority) if priority in PRIORITIES else 1
+
+
+def sort_key(name, today=None):
+    """Sort key for the tasks of a subsection (None: the subsection keeps its order)."""
+    if name == 'Active':
+        return lambda task: (due_rank(task.due, today), priority_rank(task.priority))
+    if name == 'Backlog':
+        return lambda task: priority_rank(task.priority)
+    return None
+
+
+# --- Sections ---
+
+class Section:
+    """One person's part of the board: from its "## Name" line up to the next one.
+
+    Lines are kept as read: text() of an unmodified section is the bytes
+    it was parsed from. Trailing blank lines and "---" rules stay at the
+    end when subsections or tasks are added.
+    """
+
+    def __init__(self, user, text):
+        self.user = user
+        if text and not text.endswith('\n'):
+            # The last line of a file without a final newline: lines are added after it
+            text += '\n'
+        lines = text.splitlines(keepends=True)
+        end = len(lines)
+        while end > 1 and lines[end - 1].strip() in ('', '---'):
+            end -= 1
+        self.tail = lines[end:]
+        self.head = []
+        # [name, heading line, items]; items are Tasks and other lines, in file order
+        self.parts = []
+        items = self.head
+        for line in lines[:end]:
+            m = SUBHEADING.match(line)
+            if m:
+                items = []
+                self.parts.append([canonical(m[1]), line, items])
+                continue
+            if line[:1] in (' ', '\t') and line.strip() and items and isinstance(items[-1], Task):
+                items[-1].extra.append(line)
+                continue
+            items.append((Task.parse(line) if self.parts else None) or line)
+
+    @classmethod
+    def new(cls, user):
+        return cls(user, f"## {user}\n\n### Active\n\n\n### Backlog\n\n\n### Done\n\n")
+
+    def end_with_rule(self):
+        """End the section with a "---" rule and a blank line, as when another follows it."""
+        end = len(self.tail)
+        while end and not self.tail[end - 1].strip():
+            end -= 1
+        if end and self.tail[end - 1].strip() == '---':
+            self.tail[end:] = ['\n']
+        else:
+            self.tail[end:] = ['\n', '---\n', '\n']
+
+    def text(self):
+        out = [self.render_items(self.head)]
+        for _, heading, items in self.parts:
+            out.append(heading)
+            out.append(self.render_items(items))
+        out.extend(self.tail)
+        return ''.join(out)
+
+    @staticmethod
+    def render_items(items):
+        return ''.join(item.render() if isinstance(item, Task) else item for item in items)
+
+    def part(self, name, create=False):
+        """Items of subsection name; create=True adds a missing one in SUBSECTIONS order."""
+        for part in self.parts:
+            if part[0] == name:
+                return part[2]
+        if not create:
+            return None
+        rank = SUBSECTIONS.index(name) if name in SUBSECTIONS else len(SUBSECTIONS)
+        position = len(self.parts)
+        for i, part in enumerate(self.parts):
+            if part[0] in SUBSECTIONS and SUBSECTIONS.index(part[0]) > rank:
+                position = i
+                break
+        before = self.parts[position - 1][2] if position else self.head
+        if before and not (isinstance(before[-1], str) and not before[-1].strip()):
+            before.append('\n')
+        items = [] if position == len(self.parts) else ['\n']
+        self.parts.insert(position, [name, f"### {name}\n", items])
+        return items
+
+    def tasks(self, name):
+        return [item for item in self.part(name) or () if isinstance(item, Task)]
+
+    def add(self, task, name='Active', first=False, today=None):
+        """Add task to subsection name (created if missing) and re-sort it."""
+        items = self.part(name, create=True)
+        slots = [i for i, item in enumerate(items) if isinstance(item, Task)]
+        if first and slots:
+            items.insert(slots[0], task)
+        else:
+            items.insert(slots[-1] + 1 if slots else 0, task)
+        self.sort(name, today)
+
+    def remove(self, task):
+        for _, _, items in self.parts:
+            for i, item in enumerate(items):
+                if item is task:
+                    del items[i]
+                    return
+        raise ValueError("task not in section")
+
+    def sort(self, name, today=None):
+        """Stable-sort the tasks of subsection name in place; other lines keep their positions."""
+        key = sort_key(name, today)
+        items = self.part(name)
+        if key is None or not items:
+            return
+        slots = [i for i, item in enumerate(items) if isinstance(item, Task)]
+        for i, task in zip(slots, sorted((items[i] for i in slots), key=key)):
+            items[i] = task
+
+    def summary(self):
+        """Task counts per subsection, and Active counts per due date and priority."""
+        counts = {"tasks": {}, "due": {}, "priority": {}}
+        for name, _, items in self.parts:
+            for item in items:
+                if not isinstance(item, Task):
+                    continue
+                counts["tasks"][name] = counts["tasks"].get(name, 0) + 1
+                if name == 'Active':
+                    due = item.due or ''
+                    counts["due"][due] = counts["due"].get(due, 0) + 1
+                    priority = item.priority or ''
+                    counts["priority"][priority] = counts["priority"].get(priority, 0) + 1
+        return counts
+
+
+def split_sections(data, offset=0):
+    """(user, start, end) of each "## Name" section in data, offsets shifted by offset."""
+    starts = [(m.start(), m[1].decode('utf-8', 'replace').strip()) for m in SECTION_HEADING.finditer(data)]
+    return [(user, offset + start, offset + (starts[i + 1][0] if i + 1 < len(starts) else len(data)))
+            for i, (start, user) in enumerate(starts)]
+
+
+# --- Board ---
+
+def index_path(todo_path):
+    """Sidecar index file for todo_path: in the git directory, else under the per-user cache."""
+    import subprocess
+    todo_path = os.path.abspath(todo_path)
+    key = hashlib.sha1(todo_path.encode('utf-8')).hexdigest()[:16]
+    proc = subprocess.run(['git', 'rev-parse', '--absolute-git-dir'], cwd=os.path.dirname(todo_path),
+                          capture_output=True, text=True)
+    if proc.returncode == 0:
+        return os.path.join(proc.stdout.strip(), INDEX_DIR, key + '.json')
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'aiorg-todo', key + '.json')
+
+
+def file_state(st):
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+class Board:
+    """TODO.md plus its sidecar index.
+
+    The index is a list of sections -- user, byte range, content hash and
+    summary() counts -- in file order. load() validates it and section()
+    reads one section's bytes; neither takes the lock, since writers only
+    ever swap in a whole new file. Every change goes through commit().
+    """
+
+    def __init__(self, path=TODO_FILE, index_file=None):
+        self.path = os.path.abspath(path)
+        self.index_file = index_file or index_path(self.path)
+        base = os.path.splitext(self.index_file)[0]
+        self.lock_file = base + '.lock'
+        self.queue_dir = base + '.queue'
+        self.index = None
+        # Sections parsed by the last load() (0 when the index was valid)
+        self.parsed = 0
+        # Requests applied by the last write this process made
+        self.batched = 0
+
+    def load(self, f=None):
+        """The validated index, refreshing it from TODO.md if the file changed.
+
+        With f, an open TODO.md, the index describes that file exactly,
+        even if it has been replaced since it was opened.
+        """
+        st = os.fstat(f.fileno()) if f else os.stat(self.path)
+        index = self.index
+        if index is None:
+            try:
+                with open(self.index_file, encoding='utf-8') as index_f:
+                    index = json.load(index_f)
+            except (OSError, ValueError):
+                index = None
+        if (index and index.get('version') == INDEX_VERSION and index.get('path') == self.path
+                and index.get('state') == file_state(st)):
+            self.index = index
+            self.parsed = 0
+            return index
+
+        if f is None:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+                st = os.fstat(f.fileno())
+        else:
+            f.seek(0)
+            data = f.read()
+        known = {(s['user'], s['sha1']): s['summary'] for s in (index or {}).get('sections', ())}
+        self.parsed = 0
+        sections = []
+        for user, start, end in split_sections(data):
+            chunk = data[start:end]
+            digest = hashlib.sha1(chunk).hexdigest()
+            summary = known.get((user, digest))
+            if summary is None:
+                summary = Section(user, chunk.decode('utf-8')).summary()
+                self.parsed += 1
+            sections.append({"user": user, "start": start, "end": end, "sha1": digest, "summary": summary})
+        self.index = {"version": INDEX_VERSION, "path": self.path, "state": file_state(st), "sections": sections}
+        self.save_index()
+        return self.index
+
+    def save_index(self):
+        """Write the index; a failure only costs the next run a re-parse."""
+        tmp = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, separators=(',', ':'))
+            os.replace(tmp, self.index_file)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    # --- Lookups ---
+
+    def users(self):
+        return [s['user'] for s in self.load()['sections']]
+
+    def meta(self, user):
+        """Index entry of user's section (names match case-insensitively), or None."""
+        return self.find(self.load(), user)
+
+    @staticmethod
+    def find(index, user):
+        wanted = user.casefold()
+        for meta in index['sections']:
+            if meta['user'].casefold() == wanted:
+                return meta
+        return None
+
+    def by_due(self, due):
+        """[(user, Active tasks due then)] for a due value ('' for no due date)."""
+        return [(s['user'], s['summary']['due'][due]) for s in self.load()['sections']
+                if s['summary']['due'].get(due)]
+
+    def by_priority(self, priority):
+        """[(user, Active tasks of that priority)] ('' for no priority)."""
+        return [(s['user'], s['summary']['priority'][priority]) for s in self.load()['sections']
+                if s['summary']['priority'].get(priority)]
+
+    def totals(self):
+        """Summed summary() counts over every section."""
+        totals = {"tasks": {}, "due": {}, "priority": {}}
+        for meta in self.load()['sections']:
+            for kind, counts in meta['summary'].items():
+                for key, count in counts.items():
+                    totals[kind][key] = totals[kind].get(key, 0) + count
+        return totals
+
+    def section(self, user):
+        """user's Section, parsed from its bytes alone, or None."""
+        with open(self.path, 'rb') as f:
+            meta = self.find(self.load(f), user)
+            return self.read_section(f, meta) if meta else None
+
+    @staticmethod
+    def read_section(f, meta):
+        f.seek(meta['start'])
+        return Section(meta['user'], f.read(meta['end'] - meta['start']).decode('utf-8'))
+
+    # --- Writes ---
+
+    @contextmanager
+    def locked(self, timeout=LOCK_TIMEOUT):
+        """Hold the board's write lock (no lock where fcntl is missing).
+
+        The lock is advisory: editors and git don't take it, which write()
+        catches. Raises BoardLocked after timeout seconds (None: wait).
+        """
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(self.lock_file, 'a') as f:
+            if timeout is None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            raise BoardLocked(f"{TODO_FILE} is being written by another process - try again")
+                        time.sleep(LOCK_POLL)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def commit(self, ops, today=None):
+        """Apply a list of operations in one write; returns a result dict per operation.
+
+        The request is queued before the lock is taken. Whoever holds the
+        lock applies every queued request in one pass and one write, and
+        leaves each requester its results: a crowd of concurrent /todo runs
+        costs one rewrite of TODO.md, not one each, and none is lost.
+        """
+        os.makedirs(self.queue_dir, exist_ok=True)
+        request = os.path.join(self.queue_dir, f"{time.time_ns():020d}-{os.getpid()}-{os.urandom(4).hex()}")
+        with open(request + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(ops, f, ensure_ascii=False)
+        os.replace(request + '.tmp', request + '.json')
+        try:
+            with self.locked():
+                results = self.take_result(request)
+                return results if results is not None else self.serve(request, today)
+        except BoardLocked:
+            try:
+                os.unlink(request + '.json')
+            except FileNotFoundError:
+                # A lock holder has claimed the request: its results are on the way
+                with self.locked(timeout=None):
+                    results = self.take_result(request)
+                if results is None:
+                    raise TaskError(f"The process writing {TODO_FILE} stopped - check whether the change was made")
+                return results
+            raise
+
+    def serve(self, request, today=None):
+        """Apply every queued request, leave the others their results, return request's. Call it under locked()."""
+        claimed = []
+        for name in sorted(os.listdir(self.queue_dir)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.queue_dir, name[:-5])
+            try:
+                os.rename(path + '.json', path + '.work')
+            except FileNotFoundError:
+                # Withdrawn by a requester that gave up waiting for the lock
+                continue
+            with open(path + '.work', encoding='utf-8') as f:
+                claimed.append((path, json.load(f)))
+
+        error = None
+        try:
+            results = self.apply([ops for _, ops in claimed], today)
+        except (TaskError, OSError) as e:
+            error = e
+            results = [[{"ok": False, "error": str(e)} for _ in ops] for _, ops in claimed]
+        self.batched = len(claimed)
+        mine = None
+        for (path, _), result in zip(claimed, results):
+            if path == request:
+                mine = result
+            else:
+                with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False)
+                os.replace(path + '.tmp', path + '.result')
+            os.unlink(path + '.work')
+        self.prune_queue()
+        if error is not None:
+            raise error
+        if mine is None:
+            raise TaskError(f"The process writing {TODO_FILE} stopped - check whether the change was made")
+        return mine
+
+    def take_result(self, request):
+        """The results another lock holder left for request, or None."""
+        try:
+            with open(request + '.result', encoding='utf-8') as f:
+                results = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.unlink(request + '.result')
+        return results
+
+    def prune_queue(self):
+        """Drop results nobody came back for, and requests a crashed writer claimed."""
+        cutoff = time.time() - RESULT_TTL
+        for name in os.listdir(self.queue_dir):
+            path = os.path.join(self.queue_dir, name)
+            try:
+                if name.endswith(('.result', '.work')) and os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def apply(self, requests, today=None, attempts=3):
+        """Run each request's operations in order, then write TODO.md once. Call it under locked().
+
+        Returns a list of results per request. If a writer that doesn't
+        take the lock changes the file meanwhile, everything is run again
+        on the new file.
+        """
+        for attempt in range(attempts):
+            with open(self.path, 'rb') as f:
+                changes = Changes(self, f, self.load(f))
+                results = [run_ops(changes, ops, today) for ops in requests]
+                try:
+                    if changes.dirty():
+                        self.write(f, changes)
+                    return results
+                except BoardChanged:
+                    self.index = None
+                    if attempt == attempts - 1:
+                        raise
+
+    def write(self, f, changes):
+        """Write the board with changes to a new file and swap it in for TODO.md.
+
+        Only edited and new sections are rendered; every other byte is
+        copied from f, the open old file, without being parsed.
+        """
+        index = changes.index
+        sections = index['sections']
+        # New sections go at the end, each after a "---" rule
+        if changes.created:
+            closed = changes.created[:-1]
+            if sections:
+                closed.append(changes.get(sections[-1]['user']))
+            for section in closed:
+                section.end_with_rule()
+        edited = changes.edited()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fresh = []
+        try:
+            with open(tmp, 'wb') as out:
+                position = 0
+
+                def copy(end):
+                    nonlocal position
+                    f.seek(position)
+                    while position < end:
+                        chunk = f.read(min(COPY_CHUNK, end - position))
+                        out.write(chunk)
+                        position += len(chunk)
+
+                for meta in sections:
+                    copy(meta['start'])
+                    start = out.tell()
+                    section = edited.get(meta['start'])
+                    if section is None:
+                        copy(meta['end'])
+                        fresh.append(dict(meta, start=start, end=out.tell()))
+                        continue
+                    fresh.append(self.write_section(out, section))
+                    position = meta['end']
+                copy(index['state'][0])
+                if changes.created and not sections:
+                    f.seek(max(0, position - 2))
+                    before = f.read()
+                    out.write(b'' if not before or before.endswith(b'\n\n') else
+                              b'\n' if before.endswith(b'\n') else b'\n\n')
+                for section in changes.created:
+                    fresh.append(self.write_section(out, section))
+                out.flush()
+                os.fsync(out.fileno())
+            if file_state(os.stat(self.path)) != index['state']:
+                raise BoardChanged(f"{TODO_FILE} changed while editing")
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.index = {"version": INDEX_VERSION, "path": self.path, "state": file_state(os.stat(self.path)),
+                      "sections": fresh}
+        self.save_index()
+
+    @staticmethod
+    def write_section(out, section):
+        data = section.text().encode('utf-8')
+        start = out.tell()
+        out.write(data)
+        return {"user": section.user, "start": start, "end": start + len(data),
+                "sha1": hashlib.sha1(data).hexdigest(), "summary": section.summary()}
+
+
+class Changes:
+    """The sections one pass over the board has read, edited or created."""
+
+    def __init__(self, board, f, index):
+        self.board = board
+        self.f = f
+        self.index = index
+        self.sections = {}
+        # Text of each existing section as read, and its start offset
+        self.original = {}
+        self.created = []
+        # Per request: Active lists as they stood when it started, for task numbers
+        self.listed = {}
+
+    def get(self, user, create=False):
+        """user's section, read on first use; create=True starts one for a new person."""
+        if not user:
+            raise TaskError("No user given")
+        key = user.casefold()
+        if key in self.sections:
+            return self.sections[key]
+        meta = Board.find(self.index, user)
+        if meta is not None:
+            section = Board.read_section(self.f, meta)
+            self.original[key] = (section.text(), meta['start'])
+        elif create:
+            section = Section.new(user)
+            self.created.append(section)
+        else:
+            raise TaskError(f"No section for {user} in {TODO_FILE}")
+        self.sections[key] = section
+        return section
+
+    def edited(self):
+        """{start offset: Section} of the existing sections whose text changed."""
+        return {start: self.sections[key] for key, (text, start) in self.original.items()
+                if self.sections[key].text() != text}
+
+    def dirty(self):
+        return bool(self.created) or bool(self.edited())
+
+    def pick(self, section, op, today=None):
+        """The Active task op['task'] means: a number in the list as the request found it, or text."""
+        query = str(op.get('task') or '')
+        listed = self.listed.get(section.user.casefold())
+        if query.strip().isdigit() and listed is not None:
+            task = find_task(listed, query)
+            if not any(item is task for item in section.tasks('Active')):
+                raise TaskError(f"Task #{query.strip()} was already moved by this batch")
+            return task
+        return find_task(active_tasks(section, today), query)
+
+
+# --- Operations ---
+
+def current_user(project='.'):
+    """The name in .claude-user, or None."""
+    try:
+        with open(os.path.join(project, USER_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def active_tasks(section, today=None):
+    """section's Active tasks in display order: by due date, then priority."""
+    return sorted(section.tasks('Active'), key=sort_key('Active', today))
+
+
+def find_task(tasks, query):
+    """The task a user means: a 1-based number in tasks, or text that matches one task."""
+    if query.strip().isdigit():
+        number = int(query)
+        if not 1 <= number <= len(tasks):
+            raise TaskError(f"No task #{number} (there are {len(tasks)})")
+        return tasks[number - 1]
+    wanted = query.casefold()
+    exact = [task for task in tasks if task.text.casefold() == wanted]
+    matches = exact or [task for task in tasks if wanted in task.text.casefold()]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        raise TaskError(f"No task matches {query!r}")
+    listing = '\n'.join(f"  {tasks.index(task) + 1}. {task.label()}" for task in matches)
+    raise TaskError(f"{len(matches)} tasks match {query!r}:\n{listing}")
+
+
+def new_task(text, category=None, priority=None, due=None):
+    fields = {"Priority": canonical(priority, PRIORITIES) if priority else 'Medium'}
+    if due:
+        fields["Due"] = canonical(due, DUE_DATES + WEEKDAYS)
+    if category:
+        category = canonical(category, CATEGORIES)
+    return Task(text, category, fields=fields)
+
+
+def op_add(changes, op, today):
+    """{"op": "add", "user", "text", "category"?, "priority"?, "due"?, "backlog"?} or {"op": "add", "user", "line"}."""
+    if op.get('line'):
+        task = Task.parse(op['line'].rstrip('\n') + '\n')
+        if task is None or task.done:
+            raise TaskError(f"Not an open task line: {op['line']!r}")
+    elif op.get('text'):
+        task = new_task(op['text'], op.get('category'), op.get('priority'), op.get('due'))
+    else:
+        raise TaskError("Nothing to add: give text or a task line")
+    changes.get(op.get('user'), create=True).add(task, 'Backlog' if op.get('backlog') else 'Active', today=today)
+    return f"Added: {describe_new(task)}"
+
+
+def op_done(changes, op, today):
+    """{"op": "done", "user", "task"}: move an Active task to Done, stamped with today's date."""
+    section = changes.get(op.get('user'))
+    task = changes.pick(section, op, today)
+    section.remove(task)
+    done = Task(task.text, task.category, done=True, fields={"Completed": (today or date.today()).isoformat()})
+    done.extra = task.extra
+    section.add(done, 'Done', first=True)
+    return f"Done: {describe_new(done)}"
+
+
+def op_assign(changes, op, today):
+    """{"op": "assign", "to", "text", ...} adds a task for a teammate; {"op": "assign", "to", "user", "task"} moves one."""
+    to_user = str(op.get('to') or '').lstrip('@')
+    if not to_user:
+        raise TaskError("Assign to whom? Give @Name")
+    if op.get('task'):
+        section = changes.get(op.get('user'))
+        if section.user.casefold() == to_user.casefold():
+            raise TaskError(f"The task is already {section.user}'s")
+        task = changes.pick(section, op, today)
+        section.remove(task)
+    elif op.get('text'):
+        task = new_task(op['text'], op.get('category'), op.get('priority'), op.get('due'))
+    else:
+        raise TaskError("Give the task to assign, or --task to reassign one of yours")
+    changes.get(to_user, create=True).add(task, today=today)
+    return f"Assigned to @{to_user}: {describe_new(task)}"
+
+
+OPERATIONS = {'add': op_add, 'done': op_done, 'assign': op_assign}
+
+
+def op_error(op):
+    """Why op cannot be run (a TaskError), or None: an object naming a known operation, with text fields."""
+    if not isinstance(op, dict):
+        return TaskError(f"Unknown operation: {op!r}")
+    for key, value in op.items():
+        if value is not None and not isinstance(value, str) and key != 'backlog':
+            return TaskError(f"{key!r} must be a string, not {value!r}")
+    if op.get('op') not in OPERATIONS:
+        return TaskError(f"Unknown operation: {op!r}")
+    return None
+
+
+def run_ops(changes, ops, today=None):
+    """Apply one request's operations in order; a failed one is reported and skipped."""
+    # Task numbers refer to the lists the request saw, not ones its own earlier operations changed
+    changes.listed = {}
+    errors = [op_error(op) for op in ops]
+    for op, error in zip(ops, errors):
+        if error is None and (op.get('task') or '').strip().isdigit():
+            try:
+                section = changes.get(op.get('user'))
+            except TaskError:
+                continue
+            changes.listed.setdefault(section.user.casefold(), active_tasks(section, today))
+    results = []
+    for op, error in zip(ops, errors):
+        try:
+            if error is not None:
+                raise error
+            results.append({"ok": True, "message": OPERATIONS[op['op']](changes, op, today)})
+        except TaskError as e:
+            results.append({"ok": False, "error": str(e)})
+    return results
+
+
+def parse_batch(lines, user=None):
+    """Operations from batch input: JSON objects (one per line, or a JSON array) or "- [ ]" task lines."""
+    text = ''.join(lines)
+    if text.lstrip().startswith('['):
+        ops = json.loads(text)
+    else:
+        ops = []
+        for number, line in enumerate(text.splitlines(), 1):
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            if stripped.startswith('- ['):
+                ops.append({"op": "add", "line": stripped})
+                continue
+            try:
+                ops.append(json.loads(stripped))
+            except ValueError:
+                raise TaskError(f"line {number}: not a JSON operation or a task line: {stripped[:60]!r}")
+    for op in ops:
+        if isinstance(op, dict) and user:
+            op.setdefault('user', user)
+    return ops
+
+
+# --- Output ---
+
+def describe_new(task):
+    """The task as confirmed to the user: [Category] Description | Priority: Level | Due: Date."""
+    parts = [f"[{task.category}] {task.text}" if task.category else task.text]
+    return ' | '.join(parts + [f"{key}: {value}" for key, value in task.fields.items()])
+
+
+def print_tasks(user, tasks, today=None):
+    print(f"## Your Tasks ({user})")
+    groups = {}
+    for task in tasks:
+        groups.setdefault(due_rank(task.due, today), []).append(task)
+    for rank in sorted(groups):
+        print(f"\n### {DUE_GROUPS[rank]} ({len(groups[rank])})")
+        for task in groups[rank]:
+            print(f"- {task.label()}")
+    high = sum(1 for task in tasks if task.priority == 'High')
+    due_today = len(groups.get(0, ()))
+    print(f"\n---\n{len(tasks)} active tasks | {high} high priority | {due_today} due today")
+
+
+def print_all(board, today=None):
+    print("## Team Tasks")
+    counts = []
+    for user in board.users():
+        tasks = active_tasks(board.section(user), today)
+        counts.append(f"{user} {len(tasks)}")
+        print(f"\n### {user} ({len(tasks)})")
+        for task in tasks:
+            due = f" | Due: {task.due}" if task.due else ''
+            print(f"- {task.label()}{due}")
+    totals = board.totals()
+    print(f"\n---\n{totals['tasks'].get('Active', 0)} active tasks | {', '.join(counts)}")
+
+
+def print_results(results, summary=False):
+    """Print each operation's outcome; returns the number that failed."""
+    failed = 0
+    for result in results:
+        if result['ok']:
+            print(result['message'])
+        else:
+            failed += 1
+            print(result['error'], file=sys.stderr)
+    if summary:
+        print(f"{len(results)} operations: {len(results) - failed} applied, {failed} failed")
+    return failed
+
+
+# --- Main ---
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='todo-engine.py', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-C', dest='cwd', metavar='DIR', default='.', help='project directory (default: the current one)')
+    parser.add_argument('--file', default=TODO_FILE, help=f'task board, relative to DIR (default: {TODO_FILE})')
+    parser.add_argument('--user', help=f'whose tasks (default: the name in {USER_FILE})')
+    parser.add_argument('--json', action='store_true', help='print tasks as JSON')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('show', help='my Active tasks, sorted (the default)')
+    commands.add_parser('all', help="every person's Active tasks")
+    for name in ('add', 'assign'):
+        sub = commands.add_parser(name, help='add a task' if name == 'add' else "add a task to a teammate's list")
+        if name == 'assign':
+            sub.add_argument('to', metavar='@NAME', help='teammate')
+            sub.add_argument('text', nargs='?', help='new task (omit with --task to reassign one of mine)')
+            sub.add_argument('--task', metavar='QUERY', help='reassign my task with this number or text')
+        else:
+            sub.add_argument('text', help='task description')
+            sub.add_argument('--backlog', action='store_true', help='add to Backlog instead of Active')
+        sub.add_argument('--category', help=f"one of {', '.join(CATEGORIES)}")
+        sub.add_argument('--priority', help='High, Medium (default) or Low')
+        sub.add_argument('--due', help='Today, Tomorrow, This Week, Next Week, a weekday or YYYY-MM-DD')
+    done = commands.add_parser('done', help='mark tasks done')
+    done.add_argument('query', nargs='+', help='task number (as listed by show) or text')
+    batch = commands.add_parser('batch', help='apply many operations in one write')
+    batch.add_argument('input', nargs='?', default='-',
+                       help='JSON operations, one per line or an array, or "- [ ]" task lines (default: stdin)')
+    args = parser.parse_args(argv)
+
+    board = Board(os.path.join(args.cwd, args.file))
+    command = args.command or 'show'
+    user = args.user or current_user(args.cwd)
+    try:
+        if not os.path.exists(board.path):
+            raise TaskError(f"{args.file} not found - run /todo setup first")
+        if user is None and command != 'all':
+            raise TaskError(f"{USER_FILE} not found - run /todo setup first")
+
+        if command == 'show':
+            section = board.section(user)
+            tasks = active_tasks(section) if section else []
+            if args.json:
+                print(json.dumps({"user": user, "tasks": [t.as_dict() for t in tasks]}, ensure_ascii=False))
+            else:
+                print_tasks(section.user if section else user, tasks)
+            return 0
+        if command == 'all':
+            if args.json:
+                print(json.dumps({u: [t.as_dict() for t in active_tasks(board.section(u))] for u in board.users()},
+                                 ensure_ascii=False))
+            else:
+                print_all(board)
+            return 0
+
+        if command == 'add':
+            ops = [{"op": "add", "user": user, "text": args.text, "category": args.category,
+                    "priority": args.priority, "due": args.due, "backlog": args.backlog}]
+        elif command == 'assign':
+            ops = [{"op": "assign", "user": user, "to": args.to, "text": args.text, "task": args.task,
+                    "category": args.category, "priority": args.priority, "due": args.due}]
+        elif command == 'done':
+            ops = [{"op": "done", "user": user, "task": query} for query in args.query]
+        else:
+            if args.input == '-':
+                ops = parse_batch(sys.stdin, user)
+            else:
+                with open(args.input, encoding='utf-8') as f:
+                    ops = parse_batch(f, user)
+        results = board.commit(ops)
+    except (TaskError, OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 1 if print_results(results, summary=command == 'batch') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
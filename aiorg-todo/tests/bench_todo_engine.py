@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Benchmarks for aiorg-todo task engine.
+
+    python3 tests/bench_todo_engine.py              # 10,000-task board, 40 people
+    python3 tests/bench_todo_engine.py --tasks 50000 --users 100
+
+Compares each /todo operation done the way the command did it before
+the engine -- read and parse the whole TODO.md, then rewrite all of it --
+with the indexed engine, on a generated board. Engine edits go through
+the queue and lock like any /todo run, so their cost is included.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'todo-engine.py')
+
+# Load engine functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+NAMES = ['Sarah', 'Mike', 'Alex', 'Kasia', 'Tomek', 'Priya', 'Chen', 'Ola', 'Jan', 'Maria']
+VERBS = ['Fix', 'Write', 'Review', 'Ship', 'Plan', 'Update', 'Check', 'Draft', 'Migrate', 'Test']
+THINGS = ['login bug', 'launch tweet', 'PR #{}', 'pricing page', 'onboarding emails', 'CI cache',
+          'Q3 roadmap', 'API docs', 'billing webhook', 'landing copy']
+DUES = DUE_DATES + ['Friday', '2025-12-20', None, None]
+
+
+def make_board(users=40, tasks=10_000, seed=1):
+    """TODO.md text with tasks spread over users sections (60% Active, 10% Backlog, 30% Done)."""
+    rng = random.Random(seed)
+    out = ["# Tasks\n\n> Team task board. Managed by Claude - just ask.\n\n---\n"]
+    per_user = tasks // users
+    for u in range(users):
+        name = NAMES[u % len(NAMES)] + (f" {u // len(NAMES) + 1}" if u >= len(NAMES) else '')
+        lines = {'Active': [], 'Backlog': [], 'Done': []}
+        for i in range(per_user + (1 if u < tasks % users else 0)):
+            text = f"{rng.choice(VERBS)} {rng.choice(THINGS).format(rng.randint(1, 999))} ({u}.{i})"
+            category = rng.choice(CATEGORIES)
+            roll = rng.random()
+            if roll < 0.3:
+                lines['Done'].append(f"- [x] [{category}] {text} | Completed: 2025-12-{rng.randint(1, 28):02d}\n")
+                continue
+            fields = f" | Priority: {rng.choice(PRIORITIES)}"
+            due = rng.choice(DUES)
+            if due:
+                fields += f" | Due: {due}"
+            lines['Active' if roll < 0.9 else 'Backlog'].append(f"- [ ] [{category}] {text}{fields}\n")
+        out.append(f"\n## {name}\n")
+        for part in SUBSECTIONS:
+            out.append(f"\n### {part}\n" + ''.join(lines[part]))
+        out.append("\n---\n")
+    return ''.join(out)
+
+
+def per_call(fn, min_time=0.2):
+    """Return mean seconds per call of fn(), running for at least min_time."""
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / runs
+
+
+def full_parse(path):
+    """What every /todo operation did before: read and parse the whole board."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, [Section(user, data[start:end].decode('utf-8')) for user, start, end in split_sections(data)]
+
+
+def full_show(path, user):
+    _, sections = full_parse(path)
+    section = next(s for s in sections if s.user == user)
+    return active_tasks(section)
+
+
+def full_edit(path, user, edit):
+    """Parse everything, edit one section, write every section back."""
+    data, sections = full_parse(path)
+    edit(next(s for s in sections if s.user == user))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data[:split_sections(data)[0][1]].decode('utf-8'))
+        f.write(''.join(s.text() for s in sections))
+
+
+def bench_board(users, tasks):
+    """Per-operation latency: full parse and rewrite vs. indexed engine."""
+    work = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work, TODO_FILE)
+        text = make_board(users, tasks)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        board = Board(path, index_file=os.path.join(work, 'index.json'))
+        middle = board.users()[users // 2]
+
+        print(f"\n=== {tasks:,} tasks, {users} people, {len(text.encode()) >> 10} KB ===")
+        print(f"  {'operation':<34} {'full parse ms':>14} {'engine ms':>10} {'speedup':>8}")
+
+        def row(name, full, engine):
+            print(f"  {name:<34} {full * 1e3:>14.2f} {engine * 1e3:>10.2f} {full / engine:>7.1f}x")
+
+        def cold_index():
+            os.unlink(board.index_file)
+            board.index = None
+            board.load()
+        row("build index (cold)", per_call(lambda: full_parse(path)), per_call(cold_index))
+
+        def warm_load():
+            board.index = None
+            board.load()
+        row("load index (warm, from disk)", per_call(lambda: full_parse(path)), per_call(warm_load))
+        row("show my tasks", per_call(lambda: full_show(path, middle)),
+            per_call(lambda: active_tasks(board.section(middle))))
+        row("team summary (due today)", per_call(lambda: full_parse(path)),
+            per_call(lambda: board.by_due('Today')))
+
+        counter = iter(range(10 ** 9))
+
+        def bench_task():
+            return new_task(f"Bench task {next(counter)}", 'Dev', 'High', 'Today')
+
+        def add_op(user):
+            return [{"op": "add", "user": user, "text": f"Bench task {next(counter)}", "category": 'Dev',
+                     "priority": 'High', "due": 'Today'}]
+        full = per_call(lambda: full_edit(path, middle, lambda section: section.add(bench_task())))
+        board.index = None
+        row("add task (middle section)", full, per_call(lambda: board.commit(add_op(middle))))
+        last = board.users()[-1]
+        full = per_call(lambda: full_edit(path, last, lambda section: section.add(bench_task())))
+        board.index = None
+        row("add task (last section)", full, per_call(lambda: board.commit(add_op(last))))
+
+        def complete_first(section):
+            task = active_tasks(section)[0]
+            section.remove(task)
+            done = Task(task.text, task.category, done=True, fields={"Completed": "2025-12-17"})
+            section.add(done, 'Done', first=True)
+        full = per_call(lambda: full_edit(path, middle, complete_first))
+        board.index = None
+        engine = per_call(lambda: board.commit([{"op": "done", "user": middle, "task": "1"}]))
+        row("complete task", full, engine)
+
+        # Closing 20 tasks, one /todo done each vs. one batch
+        people = board.users()[:20]
+
+        def full_bulk():
+            for user in people:
+                full_edit(path, user, complete_first)
+        engine = per_call(lambda: board.commit([{"op": "done", "user": user, "task": "1"} for user in people]))
+        row("complete 20 tasks (batch)", per_call(full_bulk), engine)
+
+        # Someone edits one section by hand: only that one is parsed again
+        def hand_edit():
+            with open(path, 'r+b') as f:
+                data = f.read()
+                f.seek(0)
+                f.write(data.replace(b'(0.0)', b'(0.0) ', 1) if b'(0.0) ' not in data
+                        else data.replace(b'(0.0) ', b'(0.0)', 1))
+                f.truncate()
+            board.load()
+        engine = per_call(hand_edit)
+        row("reload after a hand edit", per_call(lambda: full_parse(path)), engine)
+        print(f"  (sections parsed on that reload: {board.parsed} of {users})")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--tasks', type=int, default=10_000, help='tasks on the board (default: 10000)')
+    parser.add_argument('--users', type=int, default=40, help='people on the board (default: 40)')
+    args = parser.parse_args()
+    bench_board(args.users, args.tasks)
+
+
+if __name__ == "__main__":
+    main()
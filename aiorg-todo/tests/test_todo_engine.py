@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""Tests for the aiorg-todo task engine.
+
+Checks the TODO.md parser and sort rules from commands/todo.md, the
+sidecar index (validation, incremental re-parse, lookups), that edits
+render only the sections they change, and that queued edits are applied
+under the lock in one write, with none lost to a concurrent run.
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date
+
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'todo-engine.py')
+
+# Load engine functions directly
+with open(SCRIPT) as f:
+    code = f.read()
+exec(code.split('if __name__')[0])
+
+# The board generator the benchmarks use
+spec = importlib.util.spec_from_file_location('bench_todo_engine', os.path.join(os.path.dirname(__file__),
+                                                                                'bench_todo_engine.py'))
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+TODAY = date(2025, 12, 17)
+
+# The example board from README.md
+README_BOARD = """# Tasks
+
+> Team task board. Managed by Claude - just ask.
+
+---
+
+## Sarah
+
+### Active
+- [ ] [Dev] Fix login bug | Priority: High | Due: Today
+- [ ] [Marketing] Write launch tweet | Priority: Medium | Due: This Week
+
+### Done
+- [x] [Dev] Setup CI/CD | Completed: 2025-12-16
+
+---
+
+## Mike
+
+### Active
+- [ ] [Review] Check PR #42 | Priority: High | Due: Today
+"""
+
+
+def make_project(text):
+    path = tempfile.mkdtemp()
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    with open(os.path.join(path, TODO_FILE), 'w', encoding='utf-8') as f:
+        f.write(text)
+    with open(os.path.join(path, USER_FILE), 'w') as f:
+        f.write("Sarah\n")
+    return path
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def fresh_sections(board):
+    """The index a cold load builds, to compare with one kept up to date by edits."""
+    cold = Board(board.path, index_file=board.index_file + '.cold')
+    if os.path.exists(cold.index_file):
+        os.unlink(cold.index_file)
+    return cold.load()['sections']
+
+
+def run(project, *args):
+    return subprocess.run([sys.executable, SCRIPT, '-C', project] + list(args), capture_output=True, text=True)
+
+
+def main():
+    passed = 0
+    failed = 0
+
+    def check(name, ok):
+        nonlocal passed, failed
+        if ok:
+            passed += 1
+            print(f"  PASS {name}")
+        else:
+            failed += 1
+            print(f"  FAIL {name}")
+
+    projects = []
+
+    print("\n=== Parsing ===")
+    task = Task.parse("- [ ] [Dev] Fix login bug | Priority: High | Due: Today\n")
+    check("task fields",              (task.done, task.category, task.text, task.priority, task.due)
+          == (False, 'Dev', 'Fix login bug', 'High', 'Today'))
+    task = Task.parse("- [x] [Dev] Setup CI/CD | Completed: 2025-12-16\n")
+    check("done task",                task.done and task.fields == {"Completed": "2025-12-16"})
+    task = Task.parse("- [ ] Plain task\n")
+    check("no category or fields",    task.category is None and task.text == "Plain task" and task.priority is None)
+    task = Task.parse("- [ ] [Dev] Compare a | b output | Priority: Low\n")
+    check("pipe in description",      task.text == "Compare a | b output" and task.priority == 'Low')
+    task = Task.parse("- [ ] [Dev] Napisać testy | Priority: Wysoki | Due: Jutro\n")
+    check("Polish values",            task.priority == 'High' and task.due == 'Tomorrow')
+    check("not a task",               Task.parse("Some note\n") is None and Task.parse("  - [ ] nested\n") is None)
+    check("unchanged task verbatim",  Task.parse("- [ ]   [Dev] odd  spacing |Priority: High\n").render()
+          == "- [ ]   [Dev] odd  spacing |Priority: High\n")
+    check("new task rendered",        new_task("Write docs", 'dev', 'low', 'next week').render()
+          == "- [ ] [Dev] Write docs | Priority: Low | Due: Next Week\n")
+    messy = ("## Ola\nNotes about Ola's work.\n\n### Active\n- [ ] [Dev] A | Priority: Low\n"
+             "  - sub-step one\n  - sub-step two\nnot a task line\n- [ ] [Dev] B | Priority: High\n\n"
+             "### Aktywne later\n\n### Done\n\n---\n\n")
+    section = Section("Ola", messy)
+    check("round trip",               section.text() == messy)
+    check("README round trip",        all(Section(u, README_BOARD.encode()[s:e].decode()).text()
+                                          == README_BOARD.encode()[s:e].decode()
+                                          for u, s, e in split_sections(README_BOARD.encode())))
+    check("sub-steps belong to task", section.tasks('Active')[0].extra == ["  - sub-step one\n", "  - sub-step two\n"])
+    check("split sections",           [u for u, _, _ in split_sections(README_BOARD.encode())] == ["Sarah", "Mike"])
+    check("### is not a section",     split_sections(b"### Active\n## A\n### B\n") == [("A", 11, 22)])
+
+    print("\n=== Sorting ===")
+    check("due order",                [due_rank(d, TODAY) for d in ['Today', 'Tomorrow', 'This Week', 'Next Week', None]]
+          == [0, 1, 2, 3, 5])
+    check("weekday is this week",     due_rank('Friday', TODAY) == 2)
+    check("dates by distance",        [due_rank(d, TODAY) for d in ['2025-12-01', '2025-12-17', '2025-12-18',
+                                                                      '2025-12-20', '2025-12-28', '2026-02-01']]
+          == [0, 0, 1, 2, 3, 4])
+    check("unknown due before none",  due_rank('Someday', TODAY) == 4)
+    section.add(new_task("C", 'Dev', 'Medium', 'Today'), today=TODAY)
+    check("active: due, then priority", [t.text for t in section.tasks('Active')] == ["C", "B", "A"])
+    check("sub-steps move with task", section.text().index("- [ ] [Dev] A | Priority: Low\n  - sub-step one\n") > 0)
+    check("other lines stay put",     section.part('Active')[1] == "not a task line\n")
+    section.add(new_task("Low", priority='Low'), 'Backlog')
+    section.add(new_task("High", priority='High'), 'Backlog')
+    check("backlog by priority",      [t.text for t in section.tasks('Backlog')] == ["High", "Low"])
+    check("backlog made before Done", [p[0] for p in section.parts] == ['Active', 'Aktywne later', 'Backlog', 'Done'])
+    check("tail stays last",          section.text().endswith("### Done\n\n---\n\n"))
+    mike = Section("Mike", "## Mike\n\n### Active\n- [ ] [Review] Check PR #42 | Priority: High | Due: Today")
+    mike.add(Task("Check PR #42", 'Review', done=True, fields={"Completed": "2025-12-17"}), 'Done')
+    check("Done added, no final newline", mike.text() == "## Mike\n\n### Active\n- [ ] [Review] Check PR #42 | "
+          "Priority: High | Due: Today\n\n### Done\n- [x] [Review] Check PR #42 | Completed: 2025-12-17\n")
+
+    print("\n=== Index ===")
+    path = make_project(bench.make_board(users=20, tasks=2000))
+    projects.append(path)
+    board = Board(os.path.join(path, TODO_FILE))
+    board.load()
+    check("cold load parses all",     board.parsed == 20 and len(board.users()) == 20)
+    check("index in the git dir",     board.index_file.startswith(os.path.join(path, '.git', INDEX_DIR)))
+    board = Board(os.path.join(path, TODO_FILE))
+    board.load()
+    check("valid index: no parsing",  board.parsed == 0)
+    os.utime(board.path, ns=(1, 1))
+    board.load()
+    check("touched: hash reused",     board.parsed == 0 and board.index['state'][1] == 1)
+    text = read(board.path)
+    with open(board.path, 'w', encoding='utf-8') as f:
+        f.write(text.replace("(5.0)", "(5.0) edited", 1))
+    board.load()
+    check("hand edit parses one",     board.parsed == 1)
+    check("offsets match the file",   board.index['sections'] == fresh_sections(board))
+    _, sections = bench.full_parse(board.path)
+    summaries = [s.summary() for s in sections]
+    check("per-user counts",          [s['summary'] for s in board.index['sections']] == summaries)
+    today = sum(s['due'].get('Today', 0) for s in summaries)
+    check("due lookup",               sum(n for _, n in board.by_due('Today')) == today > 0)
+    check("priority lookup",          sum(n for _, n in board.by_priority('High'))
+          == sum(s['priority'].get('High', 0) for s in summaries))
+    check("totals",                   board.totals()['tasks']['Active']
+          == sum(s['tasks'].get('Active', 0) for s in summaries))
+    check("user lookup ignores case", board.meta(board.users()[3].upper())['user'] == board.users()[3])
+    with open(board.index_file, 'w') as f:
+        f.write("{torn")
+    board = Board(board.path)
+    board.load()
+    check("torn index rebuilt",       board.parsed == 20)
+
+    print("\n=== Edits ===")
+    user = board.users()[10]
+    before = read(board.path).encode()
+    target = board.meta(user)
+    results = board.commit([{"op": "add", "user": user, "text": "Engine test", "category": 'Dev',
+                             "priority": 'High', "due": 'Today'}], today=TODAY)
+    after = read(board.path).encode()
+    check("added",                    results == [{"ok": True, "message": "Added: [Dev] Engine test | "
+                                                   "Priority: High | Due: Today"}])
+    check("bytes before untouched",   after[:target['start']] == before[:target['start']])
+    check("bytes after copied as-is", after.endswith(before[target['end']:]))
+    check("index kept in step",       board.index['sections'] == fresh_sections(board))
+    active = active_tasks(board.section(user), TODAY)
+    position = [t.text for t in active].index("Engine test")
+    check("sorted in after its peers", all(sort_key('Active', TODAY)(t) == (0, 0) for t in active[:position + 1])
+          and sort_key('Active', TODAY)(active[position + 1]) != (0, 0))
+    results = board.commit([{"op": "done", "user": user, "task": "engine test"}], today=TODAY)
+    check("completed",                results[0]['message'] == "Done: [Dev] Engine test | Completed: 2025-12-17"
+          and board.section(user).tasks('Done')[0].render() == "- [x] [Dev] Engine test | Completed: 2025-12-17\n")
+    check("index after complete",     board.index['sections'] == fresh_sections(board))
+    n = len(board.users())
+    board.commit([{"op": "add", "user": "Newcomer", "text": "First task"}])
+    check("new person appended",      board.users()[-1] == "Newcomer" and len(board.users()) == n + 1)
+    check("after a rule",             read(board.path).endswith("\n\n---\n\n## Newcomer\n\n### Active\n"
+                                                                "- [ ] First task | Priority: Medium\n\n\n"
+                                                                "### Backlog\n\n\n### Done\n\n"))
+    check("index after append",       board.index['sections'] == fresh_sections(board))
+    first = board.users()[0]
+    moved = active_tasks(board.section(first), TODAY)[0]
+    inode = os.stat(board.path).st_ino
+    board.commit([{"op": "assign", "user": first, "to": "@Newcomer", "task": "1"}], today=TODAY)
+    check("reassigned in one write",  moved.text in [t.text for t in board.section("Newcomer").tasks('Active')]
+          and moved.text not in [t.text for t in board.section(first).tasks('Active')]
+          and os.stat(board.path).st_ino != inode and board.batched == 1)
+    check("index after reassign",     board.index['sections'] == fresh_sections(board))
+    before = read(board.path)
+    results = board.commit([{"op": "done", "user": first, "task": "no such task"}, {"op": "dance"},
+                            {"op": "add", "user": first}])
+    check("failures reported",        [r['ok'] for r in results] == [False, False, False]
+          and "Unknown operation" in results[1]['error'])
+    check("nothing to write",         read(board.path) == before)
+
+    try:
+        find_task(active_tasks(board.section(first)), "a")
+        check("ambiguous match refused", False)
+    except TaskError as e:
+        check("ambiguous match refused", "tasks match" in str(e))
+    try:
+        find_task([], "99")
+        check("bad number refused", False)
+    except TaskError as e:
+        check("bad number refused", "No task #99" in str(e))
+
+    print("\n=== Batches ===")
+    active = active_tasks(board.section(first), TODAY)
+    results = board.commit([{"op": "done", "user": first, "task": str(i)} for i in (1, 3, 2)]
+                           + [{"op": "done", "user": first, "task": "1"}], today=TODAY)
+    check("numbers as listed before", [r['ok'] for r in results] == [True, True, True, False]
+          and [t.text for t in board.section(first).tasks('Done')[:3]]
+          == [active[1].text, active[2].text, active[0].text])
+    check("number used twice refused", "already moved" in results[3]['error'])
+    inode = os.stat(board.path).st_ino
+    results = board.commit([{"op": "add", "user": "Bulk", "line": f"- [ ] [Dev] Imported {i} | Priority: Low"}
+                            for i in range(500)])
+    check("new people after rules",   "### Done\n\n---\n\n## Bulk\n" in read(board.path))
+    check("bulk import",              all(r['ok'] for r in results)
+          and len(board.section("Bulk").tasks('Active')) == 500 and board.batched == 1)
+    check("one write",                os.stat(board.path).st_ino != inode and board.parsed == 0)
+    check("index after batch",        board.index['sections'] == fresh_sections(board))
+    board.commit([{"op": "add", "user": "Pair A", "text": "a"}, {"op": "add", "user": "Pair B", "text": "b"}])
+    check("each new person ruled off", "### Done\n\n---\n\n## Pair A\n" in read(board.path)
+          and "### Done\n\n---\n\n## Pair B\n" in read(board.path))
+    before = read(board.path)
+    results = board.commit([{"op": "add", "user": "Bulk", "line": "- [x] Already done"},
+                            {"op": "add", "user": "Bulk", "line": "Not a task"}])
+    check("bad task lines refused",   not any(r['ok'] for r in results) and read(board.path) == before)
+    check("batch input",              parse_batch(["# comment\n", "\n", "- [ ] [Dev] A | Priority: High\n",
+                                                   '{"op": "done", "task": "2"}\n'], user="Sarah")
+          == [{"op": "add", "line": "- [ ] [Dev] A | Priority: High", "user": "Sarah"},
+              {"op": "done", "task": "2", "user": "Sarah"}])
+    check("batch JSON array",         parse_batch(['[{"op": "done", "user": "Mike", "task": "1"}]'], user="Sarah")
+          == [{"op": "done", "user": "Mike", "task": "1"}])
+    try:
+        parse_batch(["nonsense\n"])
+        check("bad batch line refused", False)
+    except TaskError as e:
+        check("bad batch line refused", "line 1" in str(e))
+
+    print("\n=== Queue and lock ===")
+    # Requests queued while the lock is held are all applied by the next holder, in one write
+    import fcntl
+    holder = open(board.lock_file, 'a')
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    waiting = []
+    for i in range(5):
+        request = os.path.join(board.queue_dir, f"{i:020d}-0-queued")
+        with open(request + '.json', 'w') as f:
+            json.dump([{"op": "add", "user": "Newcomer", "text": f"Queued {i}"}], f)
+        waiting.append(request)
+    fcntl.flock(holder, fcntl.LOCK_UN)
+    inode = os.stat(board.path).st_ino
+    results = board.commit([{"op": "add", "user": "Newcomer", "text": "Mine"}])
+    texts = [t.text for t in board.section("Newcomer").tasks('Active')]
+    check("queued requests applied",  board.batched == 6 and all(f"Queued {i}" in texts for i in range(5))
+          and results[0]['ok'])
+    check("results left for others",  all(board.take_result(r) == [{"ok": True, "message": f"Added: Queued {i} | "
+                                                                    "Priority: Medium"}] for i, r in enumerate(waiting)))
+    check("queue drained",            os.listdir(board.queue_dir) == [])
+
+    # A malformed request must not take down the writer serving everyone else's
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    request = os.path.join(board.queue_dir, f"{0:020d}-0-queued")
+    with open(request + '.json', 'w') as f:
+        json.dump([{"op": "add", "user": "Newcomer", "text": "Queued beside junk"}], f)
+    fcntl.flock(holder, fcntl.LOCK_UN)
+    results = board.commit(["x", {"op": "add", "user": ["Newcomer"], "text": "x"}, {"op": "done", "task": 2}])
+    check("malformed ops refused",    [r['ok'] for r in results] == [False, False, False]
+          and "'user' must be a string" in results[1]['error'])
+    check("queued beside junk served", board.take_result(request) == [{"ok": True, "message": "Added: Queued beside "
+                                                                       "junk | Priority: Medium"}]
+          and os.listdir(board.queue_dir) == [])
+
+    global LOCK_TIMEOUT
+    saved, LOCK_TIMEOUT = LOCK_TIMEOUT, 0.1
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    before = read(board.path)
+    try:
+        board.commit([{"op": "add", "user": "Newcomer", "text": "Too late"}])
+        check("lock timeout", False)
+    except BoardLocked as e:
+        check("lock timeout",         "try again" in str(e))
+    fcntl.flock(holder, fcntl.LOCK_UN)
+    holder.close()
+    LOCK_TIMEOUT = saved
+    check("timed-out request withdrawn", os.listdir(board.queue_dir) == [] and read(board.path) == before)
+
+    calls = []
+
+    def racing(changes, op, today):
+        # Someone saves TODO.md in an editor mid-write: everything is redone on the new file
+        if not calls:
+            with open(board.path, 'a') as f:
+                f.write("\n")
+        calls.append(1)
+        return op_add(changes, op, today)
+    OPERATIONS['race'] = racing
+    results = board.commit([{"op": "race", "user": "Newcomer", "text": "Raced"}])
+    check("retried on a change",      len(calls) == 2 and results[0]['ok']
+          and [t.text for t in board.section("Newcomer").tasks('Active')].count("Raced") == 1)
+
+    def always_racing(changes, op, today):
+        with open(board.path, 'a') as f:
+            f.write("\n")
+        return op_add(changes, op, today)
+    OPERATIONS['race'] = always_racing
+    try:
+        board.commit([{"op": "race", "user": "Newcomer", "text": "Never"}])
+        check("gives up on a busy file", False)
+    except BoardChanged:
+        check("gives up on a busy file", "Never" not in read(board.path))
+    del OPERATIONS['race']
+    check("no temporary files",       not [n for n in os.listdir(path) if n.endswith('.tmp')]
+          and os.listdir(board.queue_dir) == [])
+
+    print("\n=== Concurrent runs ===")
+    project = make_project(README_BOARD)
+    projects.append(project)
+    procs = [subprocess.Popen([sys.executable, SCRIPT, '-C', project, 'add', f"Concurrent {i}"],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for i in range(16)]
+    outputs = [(proc.wait(), proc.stdout.read()) for proc in procs]
+    board = Board(os.path.join(project, TODO_FILE))
+    texts = [t.text for t in board.section("Sarah").tasks('Active')]
+    check("every run succeeded",      all(code == 0 and out.startswith("Added: Concurrent") for code, out in outputs))
+    check("no task lost",             all(texts.count(f"Concurrent {i}") == 1 for i in range(16)) and len(texts) == 18)
+    check("Mike untouched",           "## Mike\n\n### Active\n- [ ] [Review] Check PR #42 | Priority: High | Due: Today\n"
+                                      in read(board.path))
+    check("queue drained",            os.listdir(board.queue_dir) == []
+          and not [n for n in os.listdir(project) if n.endswith('.tmp')])
+
+    print("\n=== Command line ===")
+    project = make_project(README_BOARD)
+    projects.append(project)
+    proc = run(project)
+    check("show",                     proc.returncode == 0 and proc.stdout.startswith("## Your Tasks (Sarah)\n")
+          and "2 active tasks | 1 high priority | 1 due today" in proc.stdout)
+    proc = run(project, 'add', 'Write docs', '--category', 'Dev', '--due', 'Tomorrow')
+    check("add",                      proc.stdout.strip() == "Added: [Dev] Write docs | Priority: Medium | Due: Tomorrow")
+    proc = run(project, 'done', '1')
+    check("done by number",           proc.stdout.strip().startswith("Done: [Dev] Fix login bug | Completed: "))
+    proc = run(project, 'assign', '@Alex', 'Review the PR', '--category', 'Review')
+    check("assign",                   proc.stdout.strip() == "Assigned to @Alex: [Review] Review the PR | Priority: Medium")
+    proc = run(project, '--json', 'all')
+    check("all as JSON",              proc.returncode == 0 and list(json.loads(proc.stdout)) == ["Sarah", "Mike", "Alex"])
+    check("Mike untouched",           "## Mike\n\n### Active\n- [ ] [Review] Check PR #42 | Priority: High | Due: Today\n"
+                                      in read(os.path.join(project, TODO_FILE)))
+    proc = subprocess.run([sys.executable, SCRIPT, '-C', project, 'batch'], capture_output=True, text=True,
+                          input="# bulk import\n- [ ] [Dev] One | Priority: Low\n- [ ] [Dev] Two | Priority: High\n"
+                                '{"op": "assign", "to": "@Mike", "text": "Pair on it"}\n')
+    check("batch",                    proc.returncode == 0 and proc.stdout.strip().endswith("3 operations: 3 applied, 0 failed")
+          and "- [ ] [Dev] One | Priority: Low\n" in read(os.path.join(project, TODO_FILE)))
+    proc = run(project, 'done', 'One', 'Two', 'nothing like it')
+    check("done several",             proc.returncode == 1 and proc.stdout.count("Done: ") == 2
+          and "No task matches" in proc.stderr)
+    proc = subprocess.run([sys.executable, SCRIPT, '-C', project, 'batch'], capture_output=True, text=True,
+                          input="not an operation\n")
+    check("bad batch input",          proc.returncode == 1 and "line 1" in proc.stderr)
+    proc = run(project, 'done', 'no such task')
+    check("no match",                 proc.returncode == 1 and "No task matches" in proc.stderr)
+    os.unlink(os.path.join(project, USER_FILE))
+    proc = run(project)
+    check("no .claude-user",          proc.returncode == 1 and "/todo setup" in proc.stderr)
+
+    for project in projects:
+        shutil.rmtree(project, ignore_errors=True)
+
+    print(f"\n{'=' * 50}")
+    print(f"Results: {passed}/{passed + failed} passed, {failed} failed")
+    if failed:
+        print("SOME TESTS FAILED")
+        sys.exit(1)
+    else:
+        print("ALL TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()